@@ -0,0 +1,656 @@
+"""
+Admission control for `/train`.
+
+Every job the gateway starts goes through one `AdmissionController`, which
+caps how many jobs run at once overall (`ADMISSION_MAX_RUNNING`) and per
+user (`ADMISSION_MAX_PER_USER`). A job that can't start right away waits in
+a queue; beyond `ADMISSION_MAX_WAITING` waiting jobs `/train` returns 429.
+
+Waiting jobs are admitted by priority class first (interactive before
+batch), then fair share: the user with the fewest running jobs goes next,
+and a user's own jobs start in the order they were submitted. Users already
+at their limit are skipped until one of their jobs finishes.
+
+A job admitted on submit keeps the job_id its backend returned. A job that
+had to wait gets a gateway job_id, and the Space's own id for it is kept in
+`backend_job_id`. Queue entries are stored in the database, so waiting jobs
+survive a gateway restart.
+
+A waiting job the backend refuses (a 4xx from the Space, an invalid local
+job) fails right away; one that hits a timeout or an unavailable backend is
+retried with backoff, `ADMISSION_START_RETRIES` times. Either way the jobs
+behind it keep being admitted.
+
+The limits hold across gateway workers. The database is the queue: every
+worker reloads it on each tick, so it can answer for any queued job and
+count every running one, but only the worker holding the admission lease
+(`is_leader`) starts waiting jobs and polls running ones. Other workers
+queue every submission for the leader. A job cancelled on one worker while
+another starts it is stopped on its backend, since queue state changes
+only from waiting. On startup a worker marks local jobs lost when the
+`adopt` hook passed to `start()` says their worker is gone.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi import HTTPException
+
+import models
+from upstream import UpstreamError
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+ADMISSION_MAX_RUNNING = int(os.getenv("ADMISSION_MAX_RUNNING", "16"))
+ADMISSION_MAX_PER_USER = int(os.getenv("ADMISSION_MAX_PER_USER", "4"))
+ADMISSION_MAX_WAITING = int(os.getenv("ADMISSION_MAX_WAITING", "1000"))
+# Assumed job duration for queue ETAs until some jobs have finished
+ADMISSION_DEFAULT_JOB_SECONDS = float(os.getenv("ADMISSION_DEFAULT_JOB_SECONDS", "600"))
+# Retries of a waiting job whose start failed transiently, with doubling backoff
+ADMISSION_START_RETRIES = int(os.getenv("ADMISSION_START_RETRIES", "5"))
+ADMISSION_RETRY_BACKOFF = float(os.getenv("ADMISSION_RETRY_BACKOFF", "2.0"))
+ADMISSION_RETRY_BACKOFF_MAX = float(os.getenv("ADMISSION_RETRY_BACKOFF_MAX", "60"))
+
+# Priority classes, admitted in this order
+PRIORITY_CLASSES = ("interactive", "batch")
+DEFAULT_USER = "anonymous"
+
+# A job's slot is released once it reports one of these
+TERMINAL_STATUSES = {"completed", "failed", "stopped"}
+
+# Finished jobs whose backend job_id is remembered without a database lookup
+BACKEND_ID_CACHE_SIZE = 10000
+
+# Weight of the latest finished job in the average job duration
+DURATION_SMOOTHING = 0.2
+
+StartFn = Callable[[Dict[str, Any], str, Optional[str]], Awaitable[str]]
+StopFn = Callable[[str, str], Awaitable[Any]]
+PollFn = Callable[[str], Awaitable[Dict[str, Any]]]
+AdoptFn = Callable[[str], Awaitable[bool]]
+LeaderFn = Callable[[], Awaitable[bool]]
+UpdateFn = Callable[[str, Dict[str, Any]], None]
+
+
+def retryable(error: Exception) -> bool:
+    """
+    Whether a job that failed to start may start on a later try: timeouts
+    and overloaded or unavailable backends, but not a request the backend
+    refused, which fails the same way every time
+    """
+    if isinstance(error, UpstreamError):
+        status = error.upstream_status
+    elif isinstance(error, HTTPException):
+        status = error.status_code
+    else:
+        return True
+    return status >= 500 or status in (408, 429)
+
+
+class QueueEntry:
+    """In-memory copy of one `QueuedJob` row"""
+
+    def __init__(self, row: models.QueuedJob):
+        self.id = row.id
+        self.job_id = row.job_id
+        self.run_id = row.run_id
+        self.user = row.user
+        self.priority = row.priority
+        self.backend = row.backend
+        self.payload = row.payload or {}
+        self.state = row.state
+        self.backend_job_id = row.backend_job_id
+        self.enqueued_at = row.enqueued_at
+        self.admitted_at = row.admitted_at
+        # Failed starts so far, and when the next try is due (time.monotonic)
+        self.attempts = 0
+        self.retry_at = 0.0
+
+    @property
+    def rank(self) -> int:
+        return PRIORITY_CLASSES.index(self.priority)
+
+
+class AdmissionController:
+    """
+    Owns the job queue. Submissions and stops change it from request
+    handlers; a background task syncs it with the database and, on the
+    leader, admits waiting jobs whenever a slot frees up and polls running
+    Space jobs nobody else is watching, so their slots are released when
+    they finish.
+    """
+
+    def __init__(self, session_factory, start_job: StartFn, poll_job: PollFn,
+                 stop_job: Optional[StopFn] = None, record_update: Optional[UpdateFn] = None,
+                 max_running: int = ADMISSION_MAX_RUNNING, max_per_user: int = ADMISSION_MAX_PER_USER,
+                 max_waiting: int = ADMISSION_MAX_WAITING, interval: float = 2.0,
+                 start_retries: int = ADMISSION_START_RETRIES, is_leader: Optional[LeaderFn] = None):
+        self.session_factory = session_factory
+        # Takes or renews the admission lease; without one this worker always admits
+        self.is_leader = is_leader
+        self.leader = is_leader is None
+        self.start_job = start_job
+        self.poll_job = poll_job
+        # Stops a backend job by (backend, backend_job_id), for jobs cancelled while starting
+        self.stop_job = stop_job
+        # Records a status payload for a job, e.g. the failure of one that never started
+        self.record_update = record_update
+        self.start_retries = start_retries
+        self.max_running = max_running
+        self.max_per_user = max_per_user
+        self.max_waiting = max_waiting
+        self.interval = interval
+        self.entries: Dict[str, QueueEntry] = {}  # waiting and running jobs, by gateway job_id
+        self.job_seconds = ADMISSION_DEFAULT_JOB_SECONDS
+        self.admitted = 0
+        self.rejected = 0
+        self.start_failures = 0
+        self._starting: Set[str] = set()  # waiting jobs whose start_job call is in flight
+        self._reserved: Counter = Counter()  # per user: slots taken by submissions still starting
+        self._last_update: Dict[str, float] = {}  # running jobs: when they last reported
+        self._backend_ids: Dict[str, str] = {}  # gateway -> backend job_id, looked up for jobs no longer queued
+        self._order: Optional[List[QueueEntry]] = None  # waiting jobs in admission order, None when stale
+        self._eta: Dict[str, float] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ===== LIFECYCLE =====
+
+    async def start(self, adopt: Optional[AdoptFn] = None):
+        """Restore the queue and start admitting; `adopt` picks which orphaned running jobs this worker takes"""
+        self._loop = asyncio.get_running_loop()
+        await self._lead()
+        await self._load(adopt)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _load(self, adopt: Optional[AdoptFn]):
+        """Pick up the queue as it was before a restart"""
+        db = self.session_factory()
+        try:
+            rows = db.query(models.QueuedJob).filter(
+                models.QueuedJob.state == "running",
+                models.QueuedJob.backend == "local",
+            ).order_by(models.QueuedJob.id).all()
+            lost = 0
+            for row in rows:
+                if adopt is not None and not await adopt(row.job_id):
+                    continue
+                # The local worker pool doesn't outlive its gateway worker
+                row.state = "lost"
+                row.finished_at = datetime.utcnow()
+                lost += 1
+
+            durations = [
+                (row.finished_at - row.admitted_at).total_seconds()
+                for row in db.query(models.QueuedJob).filter(
+                    models.QueuedJob.state == "done",
+                    models.QueuedJob.admitted_at.isnot(None),
+                    models.QueuedJob.finished_at.isnot(None),
+                ).order_by(models.QueuedJob.id.desc()).limit(50)
+            ]
+            if durations:
+                self.job_seconds = max(1.0, sum(durations) / len(durations))
+            db.commit()
+        finally:
+            db.close()
+
+        self._sync()
+
+        waiting = sum(1 for entry in self.entries.values() if entry.state == "waiting")
+        if self.entries or lost:
+            logger.info(f"[ADMISSION] Restored {waiting} waiting and {len(self.entries) - waiting} running jobs"
+                        f" ({lost} local jobs lost on restart)")
+
+    # ===== SUBMISSION =====
+
+    def reserve(self, user: str, priority: str) -> bool:
+        """
+        Take a slot for a new submission if it would be admitted right now:
+        a slot is free, the user is under their limit and no waiting job of
+        the same or a higher priority class could take the slot instead.
+        Otherwise the caller queues the job, or gets 429 when the queue is full.
+        """
+        rank = PRIORITY_CLASSES.index(priority)
+        running = self._running_by_user()
+        # Only the leader starts jobs, so its counts are the ones that hold
+        if (self.leader and sum(running.values()) < self.max_running and running[user] < self.max_per_user
+                and not any(entry.rank <= rank and running[entry.user] < self.max_per_user
+                            for entry in self.waiting())):
+            self._reserved[user] += 1
+            return True
+        if len(self.waiting()) >= self.max_waiting:
+            self.rejected += 1
+            raise HTTPException(status_code=429, detail="Training queue is full, try again later")
+        return False
+
+    def release(self, user: str):
+        """Give back a reserved slot whose job failed to start"""
+        self._reserved[user] -= 1
+        if self._reserved[user] <= 0:
+            del self._reserved[user]
+        self.wake()
+
+    def add(self, db, job_id: str, run_id: int, user: str, priority: str, backend: str,
+            payload: Dict[str, Any], config_hash: str, started: bool, resumed: bool = False) -> QueueEntry:
+        """
+        Record a submission, either started on a reserved slot or waiting.
+        A resumed job keeps its job_id, so its row from the earlier run is reused.
+        """
+        now = datetime.utcnow()
+        row = db.query(models.QueuedJob).filter(models.QueuedJob.job_id == job_id).first() if resumed else None
+        if row is None:
+            row = models.QueuedJob(job_id=job_id)
+            db.add(row)
+        row.run_id = run_id
+        row.user = user
+        row.priority = priority
+        row.backend = backend
+        row.payload = payload
+        row.config_hash = config_hash
+        row.state = "running" if started else "waiting"
+        row.backend_job_id = job_id if started else None
+        row.enqueued_at = now
+        row.admitted_at = now if started else None
+        row.finished_at = None
+        db.commit()
+        db.refresh(row)
+        # Its earlier run may be remembered as finished
+        self._backend_ids.pop(job_id, None)
+
+        entry = self.entries[job_id] = QueueEntry(row)
+        if started:
+            self.release(user)
+            self.admitted += 1
+            self._last_update[job_id] = time.monotonic()
+        else:
+            logger.info(f"[ADMISSION] Queued job {job_id} for {user} ({priority}, {len(self.waiting())} waiting)")
+        self._order = None
+        return entry
+
+    # ===== QUEUED JOBS =====
+
+    def waiting(self) -> List[QueueEntry]:
+        return [entry for entry in self.entries.values() if entry.state == "waiting"]
+
+    def holds(self, job_id: str) -> bool:
+        """
+        True for jobs that haven't reached a backend: waiting or being
+        started, or stopped or failed before they started
+        """
+        entry = self.entries.get(job_id)
+        if entry is not None:
+            return entry.state == "waiting" or job_id in self._starting
+        return self._lookup(job_id) is None
+
+    def backend_id(self, job_id: str) -> str:
+        """The id the backend knows a job by, which differs from the gateway's for jobs that waited"""
+        entry = self.entries.get(job_id)
+        if entry is not None:
+            return entry.backend_job_id or job_id
+        return self._lookup(job_id) or job_id
+
+    def _lookup(self, job_id: str) -> Optional[str]:
+        """Backend job_id of a job no longer queued, None if it never started"""
+        if job_id not in self._backend_ids:
+            # Finished jobs are dropped from memory, look the mapping up once
+            db = self.session_factory()
+            try:
+                row = db.query(models.QueuedJob.backend_job_id).filter(models.QueuedJob.job_id == job_id).first()
+            finally:
+                db.close()
+            # Jobs started before admission control existed aren't in the table
+            self._remember(job_id, row.backend_job_id if row is not None else job_id)
+        return self._backend_ids[job_id]
+
+    def _remember(self, job_id: str, backend_job_id: Optional[str]):
+        if len(self._backend_ids) >= BACKEND_ID_CACHE_SIZE:
+            self._backend_ids.pop(next(iter(self._backend_ids)))
+        self._backend_ids[job_id] = backend_job_id
+
+    def queued_payload(self, job_id: str) -> Dict[str, Any]:
+        """Status/metrics response for a job still waiting to be admitted, or stopped before it was"""
+        entry = self.entries.get(job_id)
+        if entry is None:
+            status = "failed" if self._state(job_id) == "failed" else "stopped"
+            return {"job_id": job_id, "status": status, "elapsed_time": 0, "metrics": {}}
+        # A job being started is next in line
+        position, eta = self.position(job_id) if entry.state == "waiting" else (0, 0)
+        return {
+            "job_id": job_id,
+            "status": "queued",
+            "elapsed_time": 0,
+            "metrics": {},
+            "priority": entry.priority,
+            "user": entry.user,
+            "queue_position": position,
+            "eta_seconds": eta,
+        }
+
+    def _state(self, job_id: str) -> Optional[str]:
+        db = self.session_factory()
+        try:
+            row = db.query(models.QueuedJob.state).filter(models.QueuedJob.job_id == job_id).first()
+        finally:
+            db.close()
+        return row.state if row is not None else None
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Take a waiting job off the queue; one being started is stopped once
+        its backend returns. None when the leader has already started it,
+        so the caller stops it on its backend instead.
+        """
+        entry = self.entries.pop(job_id, None)
+        self._order = None
+        if entry is None:
+            return {"message": f"Job {job_id} was stopped before it started", "job_id": job_id, "status": "stopped"}
+        if not self._save(entry.id, expect="waiting", state="cancelled", finished_at=datetime.utcnow()):
+            # Admitted by another worker since the last sync, look its backend id up again
+            self._backend_ids.pop(job_id, None)
+            return None
+        self._remember(job_id, None)
+        logger.info(f"[ADMISSION] Removed job {job_id} from the queue")
+        return {"message": f"Job {job_id} removed from the queue", "job_id": job_id, "status": "stopped"}
+
+    def position(self, job_id: str):
+        """
+        1-based position in admission order and the estimated seconds until
+        the job starts, None when no job can run (ADMISSION_MAX_RUNNING=0)
+        """
+        order = self._admission_order()
+        entry = self.entries[job_id]
+        eta = self._eta.get(job_id)
+        return order.index(entry) + 1, round(eta) if eta is not None else None
+
+    def _running_by_user(self) -> Counter:
+        running = Counter(entry.user for entry in self.entries.values() if entry.state == "running")
+        running.update(self._reserved)
+        return running
+
+    def _admission_order(self) -> List[QueueEntry]:
+        """
+        Waiting jobs in the order they would be admitted if no job started
+        or finished in the meantime, ignoring per-user limits. Also fills in
+        each job's ETA: jobs take the earliest free slot, and each job is
+        assumed to run for the average duration of finished jobs.
+        """
+        if self._order is not None:
+            return self._order
+
+        load = self._running_by_user()
+        queues = defaultdict(deque)
+        for entry in sorted(self.waiting(), key=lambda e: e.id):
+            queues[(entry.rank, entry.user)].append(entry)
+        heap = [(rank, load[user], queue[0].id, user) for (rank, user), queue in queues.items()]
+        heapq.heapify(heap)
+
+        order = []
+        while heap:
+            rank, _, _, user = heapq.heappop(heap)
+            queue = queues[(rank, user)]
+            order.append(queue.popleft())
+            load[user] += 1
+            if queue:
+                heapq.heappush(heap, (rank, load[user], queue[0].id, user))
+
+        # When each slot frees up, in seconds from now
+        now = datetime.utcnow()
+        slots = [
+            max(0.0, self.job_seconds - (now - entry.admitted_at).total_seconds())
+            for entry in self.entries.values() if entry.state == "running" and entry.admitted_at
+        ][:self.max_running]
+        slots += [0.0] * (self.max_running - len(slots))
+        heapq.heapify(slots)
+        self._eta = {}
+        for entry in order if slots else ():
+            free_at = heapq.heappop(slots)
+            self._eta[entry.job_id] = free_at
+            heapq.heappush(slots, free_at + self.job_seconds)
+
+        self._order = order
+        return order
+
+    # ===== FINISHED JOBS =====
+
+    def job_update(self, job_id: str, data: Dict[str, Any]):
+        """Note a status/metrics payload; may be called from worker threads"""
+        if job_id not in self.entries:
+            return
+        self._last_update[job_id] = time.monotonic()
+        if data.get("status") in TERMINAL_STATUSES and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._finished, job_id, data["status"])
+
+    def _finished(self, job_id: str, status: str, state: str = "done", expect: Optional[str] = None) -> bool:
+        entry = self.entries.get(job_id)
+        if entry is None or entry.state != "running":
+            return False
+        del self.entries[job_id]
+        self._last_update.pop(job_id, None)
+        # None for a job that failed before reaching its backend
+        self._remember(job_id, entry.backend_job_id)
+        now = datetime.utcnow()
+        saved = self._save(entry.id, expect=expect, state=state, finished_at=now)
+        if status == "completed" and entry.admitted_at is not None:
+            seconds = (now - entry.admitted_at).total_seconds()
+            self.job_seconds += DURATION_SMOOTHING * (seconds - self.job_seconds)
+        self._order = None
+        self.wake()
+        return saved
+
+    def _save(self, row_id: int, expect: Optional[str] = None, **fields) -> bool:
+        """Update a queue row, only while it is in state `expect` when given; False if it wasn't"""
+        db = self.session_factory()
+        try:
+            query = db.query(models.QueuedJob).filter(models.QueuedJob.id == row_id)
+            if expect is not None:
+                query = query.filter(models.QueuedJob.state == expect)
+            updated = query.update(fields, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        return updated > 0
+
+    def _sync(self):
+        """
+        Bring the queue in line with the database, where other workers add,
+        admit, cancel and finish jobs. Jobs this worker is starting keep
+        their in-memory state.
+        """
+        db = self.session_factory()
+        try:
+            rows = db.query(
+                models.QueuedJob.id, models.QueuedJob.job_id, models.QueuedJob.state,
+                models.QueuedJob.backend_job_id, models.QueuedJob.admitted_at,
+            ).filter(models.QueuedJob.state.in_(("waiting", "running"))).all()
+            current = {row.job_id for row in rows}
+            changed = False
+            for job_id in [job_id for job_id in self.entries if job_id not in current]:
+                if job_id not in self._starting:
+                    del self.entries[job_id]
+                    self._last_update.pop(job_id, None)
+                    changed = True
+
+            new = []
+            for row in rows:
+                entry = self.entries.get(row.job_id)
+                if entry is None:
+                    new.append(row.id)
+                elif row.job_id not in self._starting and entry.state != row.state:
+                    entry.state = row.state
+                    entry.backend_job_id = row.backend_job_id
+                    entry.admitted_at = row.admitted_at
+                    changed = True
+            # Payloads are only read for jobs this worker hasn't seen yet
+            if new:
+                for row in db.query(models.QueuedJob).filter(models.QueuedJob.id.in_(new)):
+                    self.entries[row.job_id] = QueueEntry(row)
+                changed = True
+        finally:
+            db.close()
+        if changed:
+            self._order = None
+
+    async def _lead(self) -> bool:
+        """Take or renew the admission lease"""
+        if self.is_leader is None:
+            return True
+        try:
+            leader = await self.is_leader()
+        except Exception as e:
+            logger.error(f"[ADMISSION] Could not check the admission lease: {e}")
+            leader = False
+        if leader != self.leader:
+            logger.info(f"[ADMISSION] {'Took' if leader else 'Lost'} the admission lease")
+        self.leader = leader
+        return leader
+
+    # ===== SCHEDULER =====
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                # Renewed before the sync, so a new leader admits from the current queue
+                await self._lead()
+                self._sync()
+                if self.leader:
+                    await self._poll_unwatched()
+                    await self._admit_waiting()
+            except Exception as e:
+                logger.error(f"[ADMISSION] Error advancing the queue: {e}")
+
+    async def _poll_unwatched(self):
+        """
+        Poll running Space jobs that haven't reported for a while, so a job
+        without viewers still frees its slot. Local jobs report themselves.
+        """
+        cutoff = time.monotonic() - self.interval
+        stale = [
+            entry for entry in self.entries.values()
+            if entry.state == "running" and entry.backend != "local"
+            and self._last_update.get(entry.job_id, 0.0) < cutoff
+        ]
+        results = await asyncio.gather(*(self.poll_job(entry.job_id) for entry in stale), return_exceptions=True)
+        for entry, result in zip(stale, results):
+            if isinstance(result, HTTPException) and result.status_code == 404:
+                logger.warning(f"[ADMISSION] Job {entry.job_id} is gone from the backend, releasing its slot")
+                self._finished(entry.job_id, "failed")
+            elif isinstance(result, Exception):
+                logger.warning(f"[ADMISSION] Could not poll job {entry.job_id}: {result}")
+
+    def _next_admissible(self) -> Optional[QueueEntry]:
+        running = self._running_by_user()
+        if sum(running.values()) >= self.max_running:
+            return None
+        now = time.monotonic()
+        for entry in self._admission_order():
+            # Jobs backing off after a failed start let the ones behind them go first
+            if running[entry.user] < self.max_per_user and entry.retry_at <= now:
+                return entry
+        return None
+
+    async def _admit_waiting(self):
+        while (entry := self._next_admissible()) is not None:
+            # Starts can be slow; keep the lease, and stop if another worker took it
+            if not await self._lead():
+                return
+            # Counted as running while it starts, so submissions see the slot as taken
+            entry.state = "running"
+            self._order = None
+            self._starting.add(entry.job_id)
+            try:
+                backend_job_id = await self.start_job(entry.payload, entry.backend, entry.job_id)
+            except Exception as e:
+                if self.entries.get(entry.job_id) is entry:
+                    self._start_failed(entry, e)
+                continue
+            finally:
+                self._starting.discard(entry.job_id)
+            admitted_at = datetime.utcnow()
+            if self.entries.get(entry.job_id) is not entry or not self._save(
+                    entry.id, expect="waiting", state="running", backend_job_id=backend_job_id, admitted_at=admitted_at):
+                # Cancelled, here or on another worker, while its backend was starting it
+                if self.entries.get(entry.job_id) is entry:
+                    del self.entries[entry.job_id]
+                self._order = None
+                await self._stop_orphan(entry, backend_job_id)
+                continue
+            entry.backend_job_id = backend_job_id
+            entry.admitted_at = admitted_at
+            self._last_update[entry.job_id] = time.monotonic()
+            self.admitted += 1
+            logger.info(f"[ADMISSION] Admitted job {entry.job_id} for {entry.user} ({entry.priority})"
+                        f" as {entry.backend} job {backend_job_id}")
+
+    def _start_failed(self, entry: QueueEntry, error: Exception):
+        """Put a job that failed to start back in line to retry later, or fail it for good"""
+        detail = error.detail if isinstance(error, HTTPException) else str(error)
+        entry.attempts += 1
+        if retryable(error) and entry.attempts <= self.start_retries:
+            delay = min(ADMISSION_RETRY_BACKOFF * 2 ** (entry.attempts - 1), ADMISSION_RETRY_BACKOFF_MAX)
+            entry.state = "waiting"
+            entry.retry_at = time.monotonic() + delay
+            self._order = None
+            logger.warning(f"[ADMISSION] Could not start job {entry.job_id}, retrying in {delay:g}s"
+                           f" (attempt {entry.attempts}/{self.start_retries}): {detail}")
+            return
+
+        self.start_failures += 1
+        logger.error(f"[ADMISSION] Job {entry.job_id} failed to start after {entry.attempts} attempts: {detail}")
+        # Still waiting in the database unless another worker cancelled it meanwhile
+        if not self._finished(entry.job_id, "failed", state="failed", expect="waiting"):
+            return
+        if self.record_update is not None:
+            self.record_update(entry.job_id, {"status": "failed", "results": {"error": detail}})
+
+    async def _stop_orphan(self, entry: QueueEntry, backend_job_id: str):
+        logger.info(f"[ADMISSION] Job {entry.job_id} was cancelled while starting,"
+                    f" stopping {entry.backend} job {backend_job_id}")
+        if self.stop_job is None:
+            return
+        try:
+            await self.stop_job(entry.backend, backend_job_id)
+        except Exception as e:
+            logger.error(f"[ADMISSION] Could not stop {entry.backend} job {backend_job_id}"
+                         f" of cancelled job {entry.job_id}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        running = self._running_by_user()
+        waiting = self.waiting()
+        return {
+            "running": sum(running.values()),
+            "waiting": len(waiting),
+            "waiting_by_priority": dict(Counter(entry.priority for entry in waiting)),
+            "running_by_user": dict(running),
+            "max_running": self.max_running,
+            "max_per_user": self.max_per_user,
+            "max_waiting": self.max_waiting,
+            "avg_job_seconds": round(self.job_seconds, 1),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "start_failures": self.start_failures,
+            "leader": self.leader,
+        }
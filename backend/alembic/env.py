@@ -14,8 +14,9 @@ from alembic import context
 config = context.config
 
 # Interpret the config file for Python logging.
-# This line sets up loggers basically.
-if config.config_file_name is not None:
+# This line sets up loggers basically. Skipped when migrate.py runs us from
+# a process that has its own logging set up.
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
     fileConfig(config.config_file_name)
 
 # add your model's MetaData object here
@@ -23,6 +24,13 @@ if config.config_file_name is not None:
 from models import Base
 target_metadata = Base.metadata
 
+# Use the same database as the app unless alembic is pointed elsewhere with -x url=...
+from database import SQLALCHEMY_DATABASE_URL
+config.set_main_option(
+    "sqlalchemy.url",
+    context.get_x_argument(as_dictionary=True).get("url", SQLALCHEMY_DATABASE_URL).replace("%", "%%"),
+)
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
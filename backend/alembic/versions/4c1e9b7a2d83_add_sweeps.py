@@ -0,0 +1,68 @@
+"""Add sweeps and sweep_trials tables
+
+Revision ID: 4c1e9b7a2d83
+Revises: b81e6c0d2f47
+Create Date: 2026-10-18 13:05:22.481907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c1e9b7a2d83'
+down_revision: Union[str, None] = 'b81e6c0d2f47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('sweeps',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('method', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('space', sa.JSON(), nullable=True),
+    sa.Column('base_config', sa.JSON(), nullable=True),
+    sa.Column('max_trials', sa.Integer(), nullable=True),
+    sa.Column('max_concurrent', sa.Integer(), nullable=True),
+    sa.Column('seed', sa.Integer(), nullable=True),
+    sa.Column('early_stopping', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_sweeps_created_at'), 'sweeps', ['created_at'], unique=False)
+    op.create_index(op.f('ix_sweeps_id'), 'sweeps', ['id'], unique=False)
+    op.create_table('sweep_trials',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sweep_id', sa.Integer(), nullable=False),
+    sa.Column('trial_index', sa.Integer(), nullable=False),
+    sa.Column('run_id', sa.Integer(), nullable=True),
+    sa.Column('job_id', sa.String(), nullable=True),
+    sa.Column('params', sa.JSON(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('reward', sa.Float(), nullable=True),
+    sa.Column('timesteps', sa.Integer(), nullable=True),
+    sa.Column('rung_rewards', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['run_id'], ['training_runs.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['sweep_id'], ['sweeps.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_sweep_trials_id'), 'sweep_trials', ['id'], unique=False)
+    op.create_index('ix_sweep_trials_sweep_id_trial_index', 'sweep_trials', ['sweep_id', 'trial_index'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_sweep_trials_sweep_id_trial_index', table_name='sweep_trials')
+    op.drop_index(op.f('ix_sweep_trials_id'), table_name='sweep_trials')
+    op.drop_table('sweep_trials')
+    op.drop_index(op.f('ix_sweeps_id'), table_name='sweeps')
+    op.drop_index(op.f('ix_sweeps_created_at'), table_name='sweeps')
+    op.drop_table('sweeps')
@@ -0,0 +1,30 @@
+"""Add config_hash to training_runs
+
+Revision ID: 5e8d0c3a71f9
+Revises: 4c1e9b7a2d83
+Create Date: 2026-10-18 01:27:18.220592
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8d0c3a71f9'
+down_revision: Union[str, None] = '4c1e9b7a2d83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('training_runs', sa.Column('config_hash', sa.String(), nullable=True))
+    op.create_index(op.f('ix_training_runs_config_hash'), 'training_runs', ['config_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_training_runs_config_hash'), table_name='training_runs')
+    op.drop_column('training_runs', 'config_hash')
@@ -0,0 +1,37 @@
+"""Add metric_points time-series table
+
+Revision ID: 7d3f2a91c4b5
+Revises: 29c09c7843c2
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '7d3f2a91c4b5'
+down_revision: Union[str, None] = '29c09c7843c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('metric_points',
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('timestep', sa.Integer(), nullable=False),
+    sa.Column('episodes', sa.Integer(), nullable=True),
+    sa.Column('reward', sa.Float(), nullable=True),
+    sa.Column('std_reward', sa.Float(), nullable=True),
+    sa.Column('episode_length', sa.Float(), nullable=True),
+    sa.Column('loss', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['run_id'], ['training_runs.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('run_id', 'timestep')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('metric_points')
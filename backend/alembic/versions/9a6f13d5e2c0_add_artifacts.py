@@ -0,0 +1,50 @@
+"""Add artifacts table
+
+Revision ID: 9a6f13d5e2c0
+Revises: 5e8d0c3a71f9
+Create Date: 2026-10-18 01:39:40.975973
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a6f13d5e2c0'
+down_revision: Union[str, None] = '5e8d0c3a71f9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('artifacts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job_id', sa.String(), nullable=True),
+    sa.Column('kind', sa.String(), nullable=True),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('digest', sa.String(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('blob', sa.String(), nullable=False),
+    sa.Column('stored_size', sa.Integer(), nullable=True),
+    sa.Column('encoding', sa.String(), nullable=True),
+    sa.Column('base_digest', sa.String(), nullable=True),
+    sa.Column('timestep', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_artifacts_blob'), 'artifacts', ['blob'], unique=False)
+    op.create_index(op.f('ix_artifacts_digest'), 'artifacts', ['digest'], unique=False)
+    op.create_index(op.f('ix_artifacts_id'), 'artifacts', ['id'], unique=False)
+    op.create_index('ix_artifacts_job_id_kind_timestep', 'artifacts', ['job_id', 'kind', 'timestep'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_artifacts_job_id_kind_timestep', table_name='artifacts')
+    op.drop_index(op.f('ix_artifacts_id'), table_name='artifacts')
+    op.drop_index(op.f('ix_artifacts_digest'), table_name='artifacts')
+    op.drop_index(op.f('ix_artifacts_blob'), table_name='artifacts')
+    op.drop_table('artifacts')
@@ -0,0 +1,67 @@
+"""Bring training_runs in line with models.TrainingRun and index hot queries
+
+Revision ID: b81e6c0d2f47
+Revises: 7d3f2a91c4b5
+Create Date: 2026-10-18 10:41:07.553019
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'b81e6c0d2f47'
+down_revision: Union[str, None] = '7d3f2a91c4b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Files adopted by migrate.py from an older gateway's create_all schema
+    # already have the columns and some of the indexes
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name'] for column in inspector.get_columns('training_runs')}
+    indexes = {index['name'] for index in inspector.get_indexes('training_runs')}
+
+    # Columns the initial migration left out
+    for column in (
+        sa.Column('job_id', sa.String(), nullable=True),
+        sa.Column('config', sa.JSON(), nullable=True),
+        sa.Column('metrics', sa.JSON(), nullable=True),
+        sa.Column('results', sa.JSON(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    ):
+        if column.name not in columns:
+            op.add_column('training_runs', column)
+
+    # Status polls look runs up by job_id, history lists sort by created_at
+    # and filter by status or environment; the (environment, created_at)
+    # index also covers lookups by environment alone
+    for name, fields, unique in (
+        (op.f('ix_training_runs_job_id'), ['job_id'], True),
+        (op.f('ix_training_runs_created_at'), ['created_at'], False),
+        ('ix_training_runs_status_created_at', ['status', 'created_at'], False),
+        ('ix_training_runs_environment_created_at', ['environment', 'created_at'], False),
+    ):
+        if name not in indexes:
+            op.create_index(name, 'training_runs', fields, unique=unique)
+    if 'ix_training_runs_environment' in indexes:
+        op.drop_index(op.f('ix_training_runs_environment'), table_name='training_runs')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_training_runs_environment'), 'training_runs', ['environment'], unique=False)
+    op.drop_index('ix_training_runs_environment_created_at', table_name='training_runs')
+    op.drop_index('ix_training_runs_status_created_at', table_name='training_runs')
+    op.drop_index(op.f('ix_training_runs_created_at'), table_name='training_runs')
+    op.drop_index(op.f('ix_training_runs_job_id'), table_name='training_runs')
+
+    with op.batch_alter_table('training_runs') as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('results')
+        batch_op.drop_column('metrics')
+        batch_op.drop_column('config')
+        batch_op.drop_column('job_id')
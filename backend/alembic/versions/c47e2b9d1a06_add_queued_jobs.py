@@ -0,0 +1,50 @@
+"""Add queued_jobs table
+
+Revision ID: c47e2b9d1a06
+Revises: 9a6f13d5e2c0
+Create Date: 2026-10-18 02:03:21.975686
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47e2b9d1a06'
+down_revision: Union[str, None] = '9a6f13d5e2c0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('queued_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job_id', sa.String(), nullable=True),
+    sa.Column('backend_job_id', sa.String(), nullable=True),
+    sa.Column('run_id', sa.Integer(), nullable=True),
+    sa.Column('user', sa.String(), nullable=True),
+    sa.Column('priority', sa.String(), nullable=True),
+    sa.Column('backend', sa.String(), nullable=True),
+    sa.Column('payload', sa.JSON(), nullable=True),
+    sa.Column('config_hash', sa.String(), nullable=True),
+    sa.Column('state', sa.String(), nullable=True),
+    sa.Column('enqueued_at', sa.DateTime(), nullable=True),
+    sa.Column('admitted_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['run_id'], ['training_runs.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_queued_jobs_id'), 'queued_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_queued_jobs_job_id'), 'queued_jobs', ['job_id'], unique=True)
+    op.create_index('ix_queued_jobs_state', 'queued_jobs', ['state'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_queued_jobs_state', table_name='queued_jobs')
+    op.drop_index(op.f('ix_queued_jobs_job_id'), table_name='queued_jobs')
+    op.drop_index(op.f('ix_queued_jobs_id'), table_name='queued_jobs')
+    op.drop_table('queued_jobs')
@@ -0,0 +1,37 @@
+"""Index the result cache, artifact listing and sweep scheduler lookups
+
+Revision ID: e3b9d4c7a215
+Revises: c47e2b9d1a06
+Create Date: 2026-10-18 14:12:40.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b9d4c7a215'
+down_revision: Union[str, None] = 'c47e2b9d1a06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The result cache wants a config's newest runs; this also covers lookups by config_hash alone
+    op.create_index('ix_training_runs_config_hash_created_at', 'training_runs', ['config_hash', 'created_at'], unique=False)
+    op.drop_index(op.f('ix_training_runs_config_hash'), table_name='training_runs')
+    # A run's artifacts in the order they were recorded
+    op.create_index('ix_artifacts_job_id_created_at', 'artifacts', ['job_id', 'created_at'], unique=False)
+    # The sweep scheduler looks up active sweeps on every tick
+    op.create_index(op.f('ix_sweeps_status'), 'sweeps', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_sweeps_status'), table_name='sweeps')
+    op.drop_index('ix_artifacts_job_id_created_at', table_name='artifacts')
+    op.create_index(op.f('ix_training_runs_config_hash'), 'training_runs', ['config_hash'], unique=False)
+    op.drop_index('ix_training_runs_config_hash_created_at', table_name='training_runs')
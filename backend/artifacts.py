@@ -0,0 +1,300 @@
+"""
+Content-addressed storage for model artifacts and training checkpoints.
+
+Blobs live under `{ARTIFACT_DIR}/blobs/ab/abcdef...`, named by the SHA-256
+of their bytes, so identical files are stored once and a blob never changes
+after it is written. `models.Artifact` rows give blobs a job, kind and name.
+
+Checkpoints are stored in full. PPO updates every tensor of the policy and
+optimizer between two checkpoints, so deltas saved little: an XOR-zlib
+delta of a CartPole checkpoint was about 75% of the 124 KB full size, and no
+tensor was ever unchanged for a per-tensor diff to skip. A checkpoint that
+is identical to an earlier one is still stored once, like any blob.
+Checkpoints written as XOR deltas by earlier versions are still read.
+
+The store is plain files plus numpy, so worker processes write checkpoints
+into it directly.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "./artifacts")
+ARTIFACT_CHUNK_SIZE = int(os.getenv("ARTIFACT_CHUNK_SIZE", str(1024 * 1024)))
+# Largest body accepted by POST /artifacts, 0 for no limit
+ARTIFACT_MAX_UPLOAD_BYTES = int(os.getenv("ARTIFACT_MAX_UPLOAD_BYTES", str(1024 ** 3)))
+# Stored blob encodings
+FULL = "full"
+XOR_ZLIB = "xor-zlib"  # only read, for checkpoints of earlier versions
+
+# Checkpoint tensors are float32, so XOR bytes were grouped by position in the word
+WORD_BYTES = 4
+
+
+class UploadTooLarge(ValueError):
+    """A streamed upload went past its size limit"""
+
+
+def decode_delta(delta: bytes, base: bytes, size: int) -> bytes:
+    """Rebuild a checkpoint from its XOR delta: decompress, un-shuffle the byte planes, XOR with `base`"""
+    import numpy as np
+
+    planes = np.frombuffer(zlib.decompress(delta), dtype=np.uint8).reshape(WORD_BYTES, -1)
+    data = planes.T.reshape(-1)[:size].copy()
+    overlap = min(size, len(base))
+    data[:overlap] ^= np.frombuffer(base, dtype=np.uint8, count=overlap)
+    return data.tobytes()
+
+
+class ArtifactStore:
+    """Content-addressed blob files on local disk"""
+
+    def __init__(self, directory: str = ARTIFACT_DIR, chunk_size: int = ARTIFACT_CHUNK_SIZE):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.blob_dir = os.path.join(directory, "blobs")
+        self.tmp_dir = os.path.join(directory, "tmp")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path(self, blob: str) -> str:
+        return os.path.join(self.blob_dir, blob[:2], blob)
+
+    def has(self, blob: str) -> bool:
+        return os.path.exists(self.path(blob))
+
+    def _commit(self, tmp_path: str, blob: str):
+        """Move a fully written temp file to its content address"""
+        path = self.path(blob)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+
+    def _tmp_file(self):
+        return tempfile.NamedTemporaryFile(dir=self.tmp_dir, delete=False)
+
+    # ===== WRITES =====
+
+    def put_bytes(self, data: bytes) -> Tuple[str, int]:
+        blob = hashlib.sha256(data).hexdigest()
+        if not self.has(blob):
+            with self._tmp_file() as f:
+                f.write(data)
+            self._commit(f.name, blob)
+        return blob, len(data)
+
+    def put_file(self, source: str) -> Tuple[str, int]:
+        """
+        Store a copy of a file, hashed from the bytes actually copied. A
+        hard link would share the source's inode, so rewriting the source
+        in place later would change a blob that is named by its content.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        with open(source, "rb") as src, self._tmp_file() as f:
+            while chunk := src.read(self.chunk_size):
+                digest.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+        blob = digest.hexdigest()
+        self._commit(f.name, blob)
+        return blob, size
+
+    async def put_stream(self, chunks: AsyncIterator[bytes], max_bytes: int = 0) -> Tuple[str, int]:
+        """
+        Store a body as it arrives, without holding it in memory. Raises
+        UploadTooLarge, keeping nothing, once it passes `max_bytes` (0 for
+        no limit).
+        """
+        digest = hashlib.sha256()
+        size = 0
+        f = await asyncio.to_thread(self._tmp_file)
+        try:
+            async for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                await asyncio.to_thread(f.write, chunk)
+            f.close()
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+        blob = digest.hexdigest()
+        await asyncio.to_thread(self._commit, f.name, blob)
+        return blob, size
+
+    def delete(self, blob: str):
+        try:
+            os.remove(self.path(blob))
+        except FileNotFoundError:
+            pass
+
+    # ===== READS =====
+
+    def read(self, blob: str) -> bytes:
+        with open(self.path(blob), "rb") as f:
+            return f.read()
+
+    def iter_chunks(self, blob: str) -> Iterator[bytes]:
+        with open(self.path(blob), "rb") as f:
+            while chunk := f.read(self.chunk_size):
+                yield chunk
+
+    def reconstruct(self, chain: List[Dict[str, Any]]) -> bytes:
+        """
+        Rebuild an artifact from its delta chain: a full keyframe first, then
+        each delta up to the artifact itself.
+        """
+        data = b""
+        for link in chain:
+            stored = self.read(link["blob"])
+            data = stored if link["encoding"] == FULL else decode_delta(stored, data, link["size"])
+        return data
+
+    def materialize(self, chain: List[Dict[str, Any]]) -> str:
+        """Write a reconstructed artifact to a temp file and return its path"""
+        with self._tmp_file() as f:
+            f.write(self.reconstruct(chain))
+        return f.name
+
+
+class CheckpointWriter:
+    """Stores a job's successive checkpoints, each in full"""
+
+    def __init__(self, store: ArtifactStore):
+        self.store = store
+
+    def write(self, data: bytes, timestep: int) -> Dict[str, Any]:
+        blob, stored_size = self.store.put_bytes(data)
+        return {
+            "kind": "checkpoint",
+            "name": f"checkpoint-{timestep}.pt",
+            "digest": blob,
+            "size": len(data),
+            "blob": blob,
+            "stored_size": stored_size,
+            "encoding": FULL,
+            "base_digest": None,
+            "timestep": timestep,
+        }
+
+
+# ===== DATABASE RECORDS =====
+
+ARTIFACT_FIELDS = (
+    "id", "job_id", "kind", "name", "digest", "size", "stored_size", "encoding", "timestep", "created_at",
+)
+
+
+def serialize_artifact(artifact) -> Dict[str, Any]:
+    data = {field: getattr(artifact, field) for field in ARTIFACT_FIELDS}
+    data["created_at"] = artifact.created_at.isoformat() if artifact.created_at else None
+    data["url"] = f"/artifacts/{artifact.digest}"
+    return data
+
+
+def delta_chain(db, artifact) -> List[Dict[str, Any]]:
+    """The keyframe-to-artifact chain `ArtifactStore.reconstruct` expects"""
+    import models
+
+    chain = []
+    while True:
+        chain.append({"blob": artifact.blob, "encoding": artifact.encoding, "size": artifact.size})
+        if artifact.encoding == FULL:
+            return chain[::-1]
+        base = db.query(models.Artifact).filter(
+            models.Artifact.job_id == artifact.job_id,
+            models.Artifact.digest == artifact.base_digest,
+        ).first()
+        if base is None:
+            raise ValueError(f"Base checkpoint {artifact.base_digest} of artifact {artifact.id} is missing")
+        artifact = base
+
+
+def release_blobs(db, store: ArtifactStore, blobs: List[str]):
+    """Delete blobs no artifact row references any more"""
+    import models
+
+    for blob in set(blobs):
+        if db.query(models.Artifact.id).filter(models.Artifact.blob == blob).first() is None:
+            store.delete(blob)
+
+
+class ArtifactRecorder:
+    """
+    Records the checkpoints, replays and final model of each training job as
+    `Artifact` rows. Local workers store their files themselves and report
+    the result; models of Space jobs are streamed into the store when the job
+    completes.
+    """
+
+    def __init__(self, store: ArtifactStore, session_factory,
+                 stream_model: Optional[Callable[[str], AsyncIterator[bytes]]] = None):
+        self.store = store
+        self.session_factory = session_factory
+        self.stream_model = stream_model
+        self._captured: set = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+
+    def record(self, job_id: str, fields: Dict[str, Any]):
+        import models
+
+        db = self.session_factory()
+        try:
+            db.add(models.Artifact(job_id=job_id, **fields))
+            db.commit()
+        finally:
+            db.close()
+
+    def stored(self, job_id: str, info: Dict[str, Any]):
+        """A worker stored a checkpoint or replay; safe to call from worker threads"""
+        try:
+            self.record(job_id, info)
+        except Exception as e:
+            logger.error(f"[ARTIFACT] Could not record {info.get('kind')} of job {job_id}: {e}")
+
+    def job_update(self, job_id: str, data: Dict[str, Any]):
+        """Status/metrics payload for any job; safe to call from worker threads"""
+        if data.get("status") != "completed" or job_id in self._captured or self._loop is None:
+            return
+        self._captured.add(job_id)
+        asyncio.run_coroutine_threadsafe(self.capture_model(job_id, data.get("results") or {}), self._loop)
+
+    async def capture_model(self, job_id: str, results: Dict[str, Any]):
+        try:
+            model_path = results.get("model_path")
+            if model_path and os.path.exists(model_path):
+                name = os.path.basename(model_path)
+                blob, size = await asyncio.to_thread(self.store.put_file, model_path)
+            elif self.stream_model is not None:
+                name = f"{job_id}.zip"
+                blob, size = await self.store.put_stream(self.stream_model(job_id))
+            else:
+                return
+            await asyncio.to_thread(self.record, job_id, {
+                "kind": "model",
+                "name": name,
+                "digest": blob,
+                "size": size,
+                "blob": blob,
+                "stored_size": size,
+                "encoding": FULL,
+            })
+            logger.info(f"[ARTIFACT] Stored model of job {job_id} ({size} bytes)")
+        except Exception as e:
+            self._captured.discard(job_id)
+            logger.error(f"[ARTIFACT] Could not store model of job {job_id}: {e}")
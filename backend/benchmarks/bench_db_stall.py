@@ -0,0 +1,261 @@
+"""
+Event-loop stall benchmark for database access from request handlers.
+
+Render viewers watch a fake Space job through the gateway while a background
+thread writes metric points in large transactions and clients hammer the
+training history list and delete endpoints. Every gap between two frames a
+viewer receives is recorded: with blocking database calls on the event loop,
+a delete waiting for the writer's lock holds up every frame behind it.
+
+`sync` mode serves the same endpoints the old way, with a `SessionLocal`
+session inside the async handler; `async` mode uses the gateway's own
+endpoints on the async session.
+
+    cd backend && python -m benchmarks.bench_db_stall --viewers 8 --duration 15
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SPACE_PORT = 7864
+GATEWAY_PORT = 8064
+
+HISTORY_PATHS = {"sync": "/bench/sync/training-history", "async": "/api/training-history"}
+
+
+def summarize(latencies):
+    if not latencies:
+        return {"count": 0}
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[math.ceil(len(latencies) * 0.99) - 1] * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+# ===== DATABASE LOAD =====
+
+def seed_runs(session_factory, count: int):
+    """Runs for the clients to list and delete, each with a config and metrics blob"""
+    import models
+
+    db = session_factory()
+    try:
+        db.bulk_insert_mappings(models.TrainingRun, [
+            {
+                "job_id": f"bench-{i}",
+                "environment": "CartPole-v1",
+                "status": "completed",
+                "reward": float(i % 500),
+                "config": {"learning_rate": 3e-4, "n_steps": 2048, "seed": i},
+                "metrics": {"timesteps": 100000, "episode_rewards": list(range(50))},
+            }
+            for i in range(count)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+class MetricWriter(threading.Thread):
+    """Appends metric points in large transactions, holding the write lock for most of the run"""
+
+    def __init__(self, session_factory, batch: int):
+        super().__init__(daemon=True)
+        self.session_factory = session_factory
+        self.batch = batch
+        self.rows = 0
+        self.stopping = threading.Event()
+
+    def run(self):
+        import models
+
+        run_id = 1
+        timestep = 0
+        while not self.stopping.is_set():
+            db = self.session_factory()
+            try:
+                db.bulk_insert_mappings(models.MetricPoint, [
+                    {"run_id": run_id, "timestep": timestep + i, "reward": float(i), "episodes": i}
+                    for i in range(self.batch)
+                ])
+                db.commit()
+            finally:
+                db.close()
+            timestep += self.batch
+            self.rows += self.batch
+
+
+def add_sync_routes(app, session_factory):
+    """The history list and delete endpoints as they were before the async session"""
+    from fastapi import HTTPException
+    from fastapi.responses import JSONResponse
+    from sqlalchemy import select
+
+    import models
+    from history import SUMMARY_FIELDS, Run, serialize_run
+
+    @app.get(HISTORY_PATHS["sync"])
+    async def sync_history(limit: int = 100):
+        db = session_factory()
+        try:
+            query = select(*[getattr(Run, f).label(f) for f in SUMMARY_FIELDS])
+            rows = db.execute(query.order_by(Run.created_at.desc(), Run.id.desc()).limit(limit)).all()
+            return JSONResponse([serialize_run(row, SUMMARY_FIELDS) for row in rows])
+        finally:
+            db.close()
+
+    @app.delete(HISTORY_PATHS["sync"] + "/{run_id}")
+    async def sync_delete(run_id: int):
+        db = session_factory()
+        try:
+            run = db.get(models.TrainingRun, run_id)
+            if run is None:
+                raise HTTPException(status_code=404, detail=f"Training run {run_id} not found")
+            db.delete(run)
+            db.commit()
+            return {"message": f"Training run {run_id} deleted successfully"}
+        finally:
+            db.close()
+
+
+# ===== LOAD GENERATOR =====
+
+async def watch_render(ws_url: str, fps: float, gaps: list, deadline: float) -> int:
+    import websockets
+
+    frames = 0
+    last = None
+    async with websockets.connect(f"{ws_url}/ws/render/bench", max_size=None) as ws:
+        await ws.send(json.dumps({"type": "config", "fps": fps}))
+        while (remaining := deadline - time.perf_counter()) > 0:
+            try:
+                message = await asyncio.wait_for(ws.recv(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if not isinstance(message, bytes):
+                continue
+            now = time.perf_counter()
+            if last is not None:
+                gaps.append(now - last)
+            last = now
+            frames += 1
+    return frames
+
+
+async def hammer(client, history_path: str, run_ids: list, timings: dict, deadline: float):
+    while time.perf_counter() < deadline:
+        for op in ("history", "delete"):
+            start = time.perf_counter()
+            if op == "history":
+                await client.get(history_path, params={"limit": 200})
+            elif run_ids:
+                await client.delete(f"{history_path}/{run_ids.pop()}")
+            timings[op].append(time.perf_counter() - start)
+
+
+async def drive(url: str, args, history_path: str) -> dict:
+    import httpx
+
+    ws_url = url.replace("http://", "ws://")
+    gaps = []
+    timings = {"history": [], "delete": []}
+    run_ids = list(range(2, args.runs + 1))  # run 1 takes the metric writes
+
+    # Let the relay connect and frames settle before measuring
+    warmup = time.perf_counter() + 2.0
+    await asyncio.gather(*(watch_render(ws_url, args.fps, [], warmup) for _ in range(args.viewers)))
+
+    deadline = time.perf_counter() + args.duration
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(watch_render(ws_url, args.fps, gaps, deadline) for _ in range(args.viewers)),
+            *(hammer(client, history_path, run_ids, timings, deadline) for _ in range(args.clients)),
+        )
+        elapsed = time.perf_counter() - started
+
+    frames = sum(results[:args.viewers])
+    return {
+        "fps_per_viewer": round(frames / args.viewers / elapsed, 2),
+        "frame_gap": summarize(gaps),
+        "stalls_over_250ms": sum(gap > 0.25 for gap in gaps),
+        **{op: summarize(values) for op, values in timings.items()},
+    }
+
+
+# ===== RUNNER =====
+
+def run_worker(args):
+    """Run one mode in this process; the database URL comes from the environment"""
+    from benchmarks.fake_space import ServerThread, create_app
+    import migrate
+
+    migrate.upgrade()
+    with ServerThread(create_app(latency_ms=0), SPACE_PORT) as space:
+        os.environ["HUGGINGFACE_SPACE_URL"] = space.url
+        import main
+
+        seed_runs(main.SessionLocal, args.runs)
+        add_sync_routes(main.app, main.SessionLocal)
+        writer = MetricWriter(main.SessionLocal, args.write_batch)
+        with ServerThread(main.app, GATEWAY_PORT) as gateway:
+            writer.start()
+            started = time.perf_counter()
+            result = asyncio.run(drive(gateway.url, args, HISTORY_PATHS[args.mode]))
+            writer.stopping.set()
+            writer.join()
+            result["db_rows_written_per_sec"] = round(writer.rows / (time.perf_counter() - started))
+    print(json.dumps(result))
+
+
+def run_mode(mode: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp}/bench.db", "ARTIFACT_DIR": os.path.join(tmp, "artifacts")}
+        command = [
+            sys.executable, "-m", "benchmarks.bench_db_stall", "--worker", "--modes", mode,
+            "--viewers", str(args.viewers), "--clients", str(args.clients), "--duration", str(args.duration),
+            "--fps", str(args.fps), "--runs", str(args.runs), "--write-batch", str(args.write_batch),
+        ]
+        output = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if output.returncode != 0:
+        return {"mode": mode, "error": output.stderr.strip().splitlines()[-1:]}
+    return {"mode": mode, **json.loads(output.stdout.strip().splitlines()[-1])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--viewers", type=int, default=8)
+    parser.add_argument("--clients", type=int, default=8, help="clients listing and deleting history")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--runs", type=int, default=5000, help="training runs seeded before the load starts")
+    parser.add_argument("--write-batch", type=int, default=20000, help="metric points per write transaction")
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        args.mode = args.modes
+        run_worker(args)
+        return
+
+    results = [run_mode(mode, args) for mode in args.modes.split(",")]
+    print(json.dumps({"viewers": args.viewers, "clients": args.clients, "fps": args.fps, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+End-to-end load benchmark for the gateway.
+
+Runs the real gateway (backend/main.py) against the fake Space with a fresh
+SQLite database, launches N jobs and attaches M viewers to each. A viewer
+behaves like an open experiment page: it follows the metrics WebSocket,
+watches the render stream, polls `/train/{id}/status` and refreshes the
+training history every few seconds.
+
+    cd backend && python -m benchmarks.bench_e2e --jobs 4 --viewers 8 --duration 30
+
+The report is JSON: HTTP throughput and p50/p99 latency per route, metric
+updates delivered, DB write rate and render FPS per viewer. Save one with
+`--output` and pass it to a later run as `--baseline` to list regressions;
+the command exits with status 1 when any metric is worse than the baseline
+by more than `--tolerance`.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SPACE_PORT = 7863
+GATEWAY_PORT = 8063
+
+# The dashboard refreshes the history list this often
+HISTORY_INTERVAL = 5.0
+
+# Compared against --baseline: (path in the report, True when higher is better)
+TRACKED_METRICS = (
+    (("http", "requests_per_sec"), True),
+    (("http", "status", "p50_ms"), False),
+    (("http", "status", "p99_ms"), False),
+    (("http", "history", "p50_ms"), False),
+    (("http", "history", "p99_ms"), False),
+    (("http", "train", "p99_ms"), False),
+    (("metrics_stream", "updates_per_sec"), True),
+    (("db", "rows_per_sec"), True),
+    (("render", "fps_mean"), True),
+    (("render", "fps_min"), True),
+)
+
+
+def summarize(latencies):
+    if not latencies:
+        return {"count": 0}
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[math.ceil(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+# ===== LOAD GENERATOR =====
+
+class Recorder:
+    """Timings and counters shared by every simulated viewer"""
+
+    def __init__(self):
+        self.timings = {"train": [], "status": [], "history": []}
+        self.errors = 0
+        self.metric_updates = 0
+        self.frames = []  # per render viewer: (frames, bytes, seconds from first to last frame)
+        self.first_frame = []
+
+    async def timed(self, op, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code == 200
+        except Exception:
+            ok = False
+        self.timings[op].append(time.perf_counter() - start)
+        if not ok:
+            self.errors += 1
+
+
+async def follow_metrics(ws_url: str, job_id: str, recorder: Recorder, deadline: float):
+    import websockets
+
+    async with websockets.connect(f"{ws_url}/ws/train/{job_id}/metrics") as ws:
+        while (remaining := deadline - time.perf_counter()) > 0:
+            try:
+                await asyncio.wait_for(ws.recv(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            recorder.metric_updates += 1
+
+
+async def watch_render(ws_url: str, job_id: str, fps: float, recorder: Recorder, deadline: float):
+    import websockets
+
+    frames = size = 0
+    first = last = None
+    opened = time.perf_counter()
+    async with websockets.connect(f"{ws_url}/ws/render/{job_id}", max_size=None) as ws:
+        await ws.send(json.dumps({"type": "config", "fps": fps}))
+        while (remaining := deadline - time.perf_counter()) > 0:
+            try:
+                message = await asyncio.wait_for(ws.recv(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if not isinstance(message, bytes):
+                continue
+            last = time.perf_counter()
+            if first is None:
+                first = last
+                recorder.first_frame.append(first - opened)
+            frames += 1
+            size += len(message)
+    # FPS is counted from the first frame, so relay startup doesn't skew it
+    recorder.frames.append((frames, size, (last - first) if frames > 1 else 0.0))
+
+
+async def poll(client, job_id: str, interval: float, recorder: Recorder, deadline: float):
+    next_history = time.perf_counter()
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await recorder.timed("status", client.get(f"/train/{job_id}/status"))
+        if started >= next_history:
+            next_history = started + HISTORY_INTERVAL
+            await recorder.timed("history", client.get("/api/training-history", params={"limit": 50}))
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+async def drive(url: str, args) -> dict:
+    import httpx
+
+    recorder = Recorder()
+    ws_url = url.replace("http://", "ws://")
+    limits = httpx.Limits(max_connections=args.jobs * args.viewers + 10)
+
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        job_ids = []
+        for index in range(args.jobs):
+            start = time.perf_counter()
+            response = await client.post("/train", json={
+                "env_name": "CartPole-v1",
+                "total_timesteps": 10**9,
+                "seed": index,
+            })
+            recorder.timings["train"].append(time.perf_counter() - start)
+            response.raise_for_status()
+            job_ids.append(response.json()["job_id"])
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        viewers = []
+        for job_id in job_ids:
+            for _ in range(args.viewers):
+                viewers += [
+                    follow_metrics(ws_url, job_id, recorder, deadline),
+                    watch_render(ws_url, job_id, args.fps, recorder, deadline),
+                    poll(client, job_id, args.poll_interval, recorder, deadline),
+                ]
+        outcomes = await asyncio.gather(*viewers, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+        recorder.errors += sum(isinstance(outcome, Exception) for outcome in outcomes)
+
+        for job_id in job_ids:
+            await client.post(f"/train/{job_id}/stop")
+
+    return report(recorder, elapsed)
+
+
+def report(recorder: Recorder, elapsed: float) -> dict:
+    polled = len(recorder.timings["status"]) + len(recorder.timings["history"])
+    fps = [frames / seconds for frames, _, seconds in recorder.frames if seconds > 0] or [0.0]
+    frame_bytes = sum(size for _, size, _ in recorder.frames)
+    return {
+        "elapsed_seconds": round(elapsed, 2),
+        "http": {
+            "requests_per_sec": round(polled / elapsed, 1),
+            "errors": recorder.errors,
+            **{op: summarize(values) for op, values in recorder.timings.items()},
+        },
+        "metrics_stream": {
+            "updates": recorder.metric_updates,
+            "updates_per_sec": round(recorder.metric_updates / elapsed, 1),
+        },
+        "render": {
+            "viewers": len(recorder.frames),
+            "fps_mean": round(statistics.mean(fps), 2),
+            "fps_p50": round(statistics.median(fps), 2),
+            "fps_min": round(min(fps), 2),
+            "bytes_per_sec": round(frame_bytes / elapsed),
+            "first_frame": summarize(recorder.first_frame),
+        },
+    }
+
+
+# ===== RUNNER =====
+
+def db_counters(main, models) -> dict:
+    db = main.SessionLocal()
+    try:
+        points = db.query(models.MetricPoint).count()
+    finally:
+        db.close()
+    return {**main.write_buffer.stats(), "metric_points": points}
+
+
+def run_worker(args):
+    """Run the benchmark in this process; paths and URLs come from the environment"""
+    from benchmarks.fake_space import ServerThread, create_app
+    import migrate
+
+    migrate.upgrade()
+    space_app = create_app(latency_ms=args.latency_ms, frame_size=(args.frame_width, args.frame_height))
+    with ServerThread(space_app, SPACE_PORT) as space:
+        os.environ["HUGGINGFACE_SPACE_URL"] = space.url
+        import main
+        import models
+
+        with ServerThread(main.app, GATEWAY_PORT) as gateway:
+            before = db_counters(main, models)
+            result = asyncio.run(drive(gateway.url, args))
+            after = db_counters(main, models)
+
+    elapsed = result["elapsed_seconds"]
+    result["db"] = {
+        "rows_per_sec": round((after["rows_written"] - before["rows_written"]) / elapsed, 1),
+        "flushes_per_sec": round((after["flushes"] - before["flushes"]) / elapsed, 2),
+        "metric_points_per_sec": round((after["metric_points"] - before["metric_points"]) / elapsed, 1),
+        "avg_flush_ms": after["avg_flush_ms"],
+        "max_flush_ms": after["max_flush_ms"],
+        "flush_errors": after["flush_errors"],
+    }
+    print(json.dumps(result))
+
+
+def worker_command(args) -> list:
+    return [
+        sys.executable, "-m", "benchmarks.bench_e2e", "--worker",
+        "--jobs", str(args.jobs), "--viewers", str(args.viewers), "--duration", str(args.duration),
+        "--latency-ms", str(args.latency_ms), "--frame-width", str(args.frame_width),
+        "--frame-height", str(args.frame_height), "--fps", str(args.fps),
+        "--poll-interval", str(args.poll_interval),
+    ]
+
+
+def git_revision() -> str:
+    output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True)
+    return output.stdout.strip() or "unknown"
+
+
+def lookup(result: dict, path):
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Tracked metrics worse than the baseline by more than `tolerance` (a fraction)"""
+    regressions = []
+    for path, higher_is_better in TRACKED_METRICS:
+        value, previous = lookup(result, path), lookup(baseline, path)
+        if value is None or not previous:
+            continue
+        change = (value - previous) / previous
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append({
+                "metric": ".".join(path),
+                "baseline": previous,
+                "value": value,
+                "change": f"{change:+.1%}",
+            })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=4)
+    parser.add_argument("--viewers", type=int, default=8, help="viewers per job")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="fake Space latency per call")
+    parser.add_argument("--frame-width", type=int, default=600)
+    parser.add_argument("--frame-height", type=int, default=400)
+    parser.add_argument("--fps", type=float, default=20.0, help="render FPS each viewer asks for")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds between a viewer's status polls")
+    parser.add_argument("--metrics-poll-interval", type=float, default=1.0,
+                        help="METRICS_POLL_INTERVAL of the gateway under test")
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--baseline", help="report from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{tmp}/bench.db",
+            "METRICS_POLL_INTERVAL": str(args.metrics_poll_interval),
+            "ARTIFACT_DIR": os.path.join(tmp, "artifacts"),
+            "RESULT_CACHE_DIR": os.path.join(tmp, "cache"),
+            "LOCAL_MODEL_DIR": os.path.join(tmp, "models"),
+        }
+        output = subprocess.run(worker_command(args), cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if output.returncode != 0:
+        sys.exit(f"Benchmark failed: {output.stderr.strip().splitlines()[-1:]}")
+
+    result = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "parameters": {
+            key: value for key, value in vars(args).items() if key not in ("output", "baseline", "tolerance", "worker")
+        },
+        **json.loads(output.stdout.strip().splitlines()[-1]),
+    }
+
+    regressions = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        result["regressions"] = regressions
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
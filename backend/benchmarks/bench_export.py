@@ -0,0 +1,275 @@
+"""
+Bulk export benchmark.
+
+Fills a SQLite database with synthetic runs (each with a config, final
+metrics and results blob) and per-step metric points, then exports each
+table in each format through `/api/export/{table}`. Every export runs in a
+fresh gateway process, so its peak RSS only covers that one export:
+
+    cd backend && python -m benchmarks.bench_export --runs 1000000 --points-per-run 3
+
+The report has rows/sec, MB/sec and output size per export, and the
+process's RSS before the export and at its peak (Linux only). Peak RSS
+includes the pages of SQLite's memory-mapped database file, up to
+SQLITE_MMAP_SIZE, so the anonymous (heap) part is sampled separately. `history` pages through
+`/api/training-history?fields=all` 1000 runs at a time, for comparison.
+Seeding a million runs takes a few minutes; pass `--database` to keep the
+file and reuse it on the next run.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+GATEWAY_PORT = 8068
+SEED_BATCH = 20000
+
+ENVIRONMENTS = ("CartPole-v1", "LunarLander-v3", "Pendulum-v1", "Acrobot-v1", "MountainCar-v0")
+STATUSES = ("completed", "completed", "completed", "failed", "stopped")
+
+
+# ===== SYNTHETIC DATA =====
+
+def synthetic_run(i: int, started: datetime) -> dict:
+    rng = random.Random(i)
+    return {
+        "job_id": f"bench-{i}",
+        "environment": ENVIRONMENTS[i % len(ENVIRONMENTS)],
+        "agent": "PPO",
+        "episodes": rng.randint(10, 2000),
+        "reward": rng.uniform(0, 500),
+        "status": STATUSES[i % len(STATUSES)],
+        "config": {
+            "env_name": ENVIRONMENTS[i % len(ENVIRONMENTS)],
+            "total_timesteps": 100000,
+            "learning_rate": 10 ** rng.uniform(-5, -2),
+            "n_steps": rng.choice((512, 1024, 2048)),
+            "batch_size": rng.choice((32, 64, 128)),
+            "n_epochs": 10,
+            "seed": i,
+            "backend": "space",
+        },
+        "metrics": {"timesteps": 100000, "episodes": 500, "mean_reward": 200.0, "std_reward": 12.5},
+        "results": {"mean_reward": 210.0, "std_reward": 9.1},
+        "created_at": started + timedelta(seconds=30 * i),
+        "updated_at": started + timedelta(seconds=30 * i + 600),
+    }
+
+
+def seed(runs: int, points_per_run: int):
+    """Insert the synthetic runs and their metric points in large batches"""
+    from sqlalchemy import insert
+
+    import models
+    from database import SessionLocal
+
+    started = datetime(2025, 1, 1)
+    db = SessionLocal()
+    try:
+        for first in range(0, runs, SEED_BATCH):
+            ids = range(first, min(first + SEED_BATCH, runs))
+            db.execute(insert(models.TrainingRun), [synthetic_run(i, started) for i in ids])
+            if points_per_run:
+                # Runs get ids 1..runs in insertion order on a fresh database
+                db.execute(insert(models.MetricPoint), [
+                    {"run_id": i + 1, "timestep": step * 2048, "episodes": step * 10,
+                     "reward": step * 1.5, "std_reward": 5.0, "episode_length": 200.0, "loss": 0.01}
+                    for i in ids for step in range(1, points_per_run + 1)
+                ])
+            db.commit()
+            print(f"[BENCH] Seeded {ids[-1] + 1}/{runs} runs", file=sys.stderr)
+    finally:
+        db.close()
+
+
+def table_sizes() -> dict:
+    from sqlalchemy import func, select
+
+    import models
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return {
+            "runs": db.scalar(select(func.count()).select_from(models.TrainingRun)),
+            "metrics": db.scalar(select(func.count()).select_from(models.MetricPoint)),
+        }
+    finally:
+        db.close()
+
+
+# ===== EXPORT =====
+
+def rss_mb() -> dict:
+    """Resident memory now: all of it, and the anonymous part (heap), excluding mapped files"""
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("VmRSS", "RssAnon"):
+                fields[name] = round(int(value.split()[0]) / 1024, 1)
+    return {"rss": fields["VmRSS"], "anon": fields["RssAnon"]}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class AnonPeak(threading.Thread):
+    """
+    Samples anonymous RSS during an export. ru_maxrss also counts the pages
+    of SQLite's memory-mapped database file, which grow with the table
+    scanned up to SQLITE_MMAP_SIZE, whatever the export does.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0.0
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            self.peak = max(self.peak, rss_mb()["anon"])
+
+    def stop(self) -> float:
+        self.done.set()
+        self.join()
+        return max(self.peak, rss_mb()["anon"])
+
+
+def export(client, table: str, fmt: str) -> int:
+    """Download an export, discarding the bytes as they arrive; returns its size"""
+    size = 0
+    if fmt == "history":
+        cursor = None
+        while True:
+            params = {"limit": 1000, "fields": "all", **({"cursor": cursor} if cursor else {})}
+            response = client.get("/api/training-history", params=params)
+            response.raise_for_status()
+            size += len(response.content)
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                return size
+    with client.stream("GET", f"/api/export/{table}", params={"format": fmt}) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes():
+            size += len(chunk)
+    return size
+
+
+def run_worker(args):
+    """Serve the gateway in this process and export one table; paths come from the environment"""
+    import httpx
+
+    from benchmarks.fake_space import ServerThread
+    import main
+
+    with ServerThread(main.app, GATEWAY_PORT) as gateway:
+        with httpx.Client(base_url=gateway.url, timeout=600) as client:
+            client.get("/")
+            before = rss_mb()
+            sampler = AnonPeak()
+            sampler.start()
+            started = time.perf_counter()
+            size = export(client, args.table, args.format)
+            elapsed = time.perf_counter() - started
+            peak_anon = sampler.stop()
+    print(json.dumps({
+        "bytes": size, "seconds": elapsed, "rss_before_mb": before["rss"], "peak_rss_mb": peak_rss_mb(),
+        "anon_before_mb": before["anon"], "peak_anon_mb": peak_anon,
+    }))
+
+
+def measure(env: dict, table: str, fmt: str, rows: int) -> dict:
+    command = [sys.executable, "-m", "benchmarks.bench_export", "--worker", "--table", table, "--format", fmt]
+    output = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if output.returncode != 0:
+        sys.exit(f"Export of {table} as {fmt} failed: {output.stderr.strip().splitlines()[-1:]}")
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    seconds = result["seconds"]
+    print(f"[BENCH] {table} as {fmt}: {rows / seconds:.0f} rows/s, peak RSS {result['peak_rss_mb']} MB,"
+          f" peak anonymous RSS {result['peak_anon_mb']} MB", file=sys.stderr)
+    return {
+        "table": table,
+        "format": fmt,
+        "rows": rows,
+        "seconds": round(seconds, 2),
+        "rows_per_sec": round(rows / seconds),
+        "mb_per_sec": round(result["bytes"] / seconds / 2**20, 1),
+        "output_mb": round(result["bytes"] / 2**20, 1),
+        "rss_before_mb": result["rss_before_mb"],
+        "peak_rss_mb": result["peak_rss_mb"],
+        "anon_before_mb": result["anon_before_mb"],
+        "peak_anon_mb": result["peak_anon_mb"],
+        "anon_growth_mb": round(result["peak_anon_mb"] - result["anon_before_mb"], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=1000000)
+    parser.add_argument("--points-per-run", type=int, default=3)
+    parser.add_argument("--formats", default="ndjson,parquet,arrow,history",
+                        help="comma separated; history pages through /api/training-history (runs only)")
+    parser.add_argument("--tables", default="runs,metrics")
+    parser.add_argument("--database", help="SQLite file to seed once and reuse, instead of a temporary one")
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--table", help=argparse.SUPPRESS)
+    parser.add_argument("--format", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.abspath(args.database) if args.database else os.path.join(tmp, "bench.db")
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{path}",
+            "ARTIFACT_DIR": os.path.join(tmp, "artifacts"),
+            "RESULT_CACHE_DIR": os.path.join(tmp, "cache"),
+            "LOCAL_MODEL_DIR": os.path.join(tmp, "models"),
+        }
+        os.environ.update(env)
+        import migrate
+
+        migrate.upgrade()
+        sizes = table_sizes()
+        if sizes["runs"] == 0:
+            seed_started = time.perf_counter()
+            seed(args.runs, args.points_per_run)
+            print(f"[BENCH] Seeded in {time.perf_counter() - seed_started:.0f}s", file=sys.stderr)
+            sizes = table_sizes()
+
+        exports = []
+        for table in args.tables.split(","):
+            for fmt in args.formats.split(","):
+                if fmt == "history" and table != "runs":
+                    continue
+                exports.append(measure(env, table, fmt, sizes[table]))
+        database_mb = round(os.path.getsize(path) / 2**20, 1)
+
+    result = {"rows": sizes, "database_mb": database_mb, "exports": exports}
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Multi-agent rollout benchmark.
+
+Steps a PettingZoo parallel env with a growing number of agents and reports
+agent-steps/sec for batched inference (one shared policy, one forward pass
+per step) against per-agent inference (one policy and forward pass per agent).
+
+    cd backend && python -m benchmarks.bench_multi_agent --agents 2,4,8,16 --duration 3
+
+The default env is MPE's simple_spread (`pip install mpe2`), whose agent
+count is set with the `N` keyword.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def bench(env_name, agents_kwarg, n_agents, sharing, n_envs, duration):
+    import torch
+    from multi_agent import GroupPolicy, MultiAgentRollout, load_parallel_env, policy_groups
+
+    env_kwargs = {agents_kwarg: n_agents}
+    env_fn = lambda: load_parallel_env(env_name, env_kwargs)
+    probe = env_fn()
+    groups = policy_groups(probe, sharing)
+    policies = {
+        group: GroupPolicy(probe.observation_space(agents[0]), probe.action_space(agents[0]))
+        for group, agents in groups.items()
+    }
+    probe.close()
+
+    rollout = MultiAgentRollout(env_fn, n_envs, groups, policies, seed=0)
+    try:
+        torch.set_num_threads(1)
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            rollout.step()
+        elapsed = time.perf_counter() - start
+    finally:
+        rollout.close()
+    return {
+        "policy_sharing": sharing,
+        "policies": len(policies),
+        "agent_steps_per_second": round(rollout.agent_steps / elapsed),
+        "env_steps_per_second": round(rollout.env_steps / elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--env", default="simple_spread_v3")
+    parser.add_argument("--agents-kwarg", default="N", help="env keyword that sets the agent count")
+    parser.add_argument("--agents", default="2,4,8,16")
+    parser.add_argument("--n-envs", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per configuration")
+    args = parser.parse_args()
+
+    results = []
+    for n_agents in [int(n) for n in args.agents.split(",")]:
+        results.append({
+            "agents": n_agents,
+            "modes": [
+                bench(args.env, args.agents_kwarg, n_agents, sharing, args.n_envs, args.duration)
+                for sharing in ("shared", "none")
+            ],
+        })
+
+    print(json.dumps({"env": args.env, "n_envs": args.n_envs, "duration": args.duration, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Load benchmark for the gateway proxy layer.
+
+Starts the fake Space and a minimal gateway exposing the metrics proxy route,
+then hammers the gateway with concurrent clients. The `legacy` mode reproduces
+the old blocking `requests` call inside the async handler; `pooled` uses the
+shared UpstreamClient.
+
+    cd backend && python -m benchmarks.bench_proxy --concurrency 50 --duration 10
+
+`legacy` mode needs the `requests` package.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI, HTTPException
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_space import ServerThread, create_app  # noqa: E402
+from upstream import UpstreamClient  # noqa: E402
+
+UPSTREAM_PORT = 7861
+GATEWAY_PORT = 8061
+
+
+def make_gateway(mode: str, upstream_url: str) -> FastAPI:
+    app = FastAPI()
+    state = {}
+
+    if mode == "legacy":
+        import requests
+
+        async def forward(endpoint):
+            try:
+                response = requests.get(f"{upstream_url}{endpoint}", timeout=30)
+                response.raise_for_status()
+                return response.json()
+            except requests.exceptions.RequestException as e:
+                raise HTTPException(status_code=502, detail=str(e))
+    else:
+        async def forward(endpoint):
+            if "client" not in state:
+                state["client"] = UpstreamClient(upstream_url, timeout=30)
+            return await state["client"].request("GET", endpoint)
+
+    @app.get("/train/{job_id}/metrics")
+    async def metrics(job_id: str):
+        return await forward(f"/train/{job_id}/metrics")
+
+    return app
+
+
+async def drive(url: str, job_id: str, concurrency: int, duration: float):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async with httpx.AsyncClient(timeout=60, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.get(f"{url}/train/{job_id}/metrics")
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+def run_mode(mode: str, upstream_url: str, job_id: str, args) -> dict:
+    with ServerThread(make_gateway(mode, upstream_url), GATEWAY_PORT) as gateway:
+        result = asyncio.run(drive(gateway.url, job_id, args.concurrency, args.duration))
+    return {"mode": mode, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fake Space latency per call")
+    parser.add_argument("--modes", default="legacy,pooled")
+    args = parser.parse_args()
+
+    with ServerThread(create_app(latency_ms=args.latency_ms), UPSTREAM_PORT) as space:
+        job_id = httpx.post(f"{space.url}/train", json={"total_timesteps": 10**9}).json()["job_id"]
+        results = [run_mode(mode, space.url, job_id, args) for mode in args.modes.split(",")]
+
+    print(json.dumps({"concurrency": args.concurrency, "latency_ms": args.latency_ms, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
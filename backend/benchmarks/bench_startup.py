@@ -0,0 +1,165 @@
+"""
+Cold start benchmark for the gateway.
+
+Each run starts a fresh interpreter, so nothing is cached in-process:
+
+- import: time to `import main`, and which heavy modules came with it
+- first request: time from spawning `uvicorn main:app` to the first answer
+  on `/`, and to the first answer that touches the database
+
+The database is a scratch SQLite file migrated beforehand, so migrations
+aren't counted. Medians over `--runs` are checked against the budgets; the
+command exits with status 1 when one is exceeded or a module listed in
+`--forbid` is imported at startup.
+
+    cd backend && python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+GATEWAY_PORT = 8065
+
+# Only needed inside training workers or when frames are re-encoded
+HEAVY_MODULES = "cv2,numpy,torch,gymnasium,stable_baselines3,pettingzoo"
+
+IMPORT_SNIPPET = """
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "modules": sorted(m for m in %r if m in sys.modules)}))
+"""
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)")
+
+
+# ===== MEASUREMENTS =====
+
+def measure_import(env: dict, forbid: list) -> dict:
+    snippet = IMPORT_SNIPPET % (forbid,)
+    output = subprocess.run([sys.executable, "-c", snippet], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(env: dict, top: int) -> list:
+    """Modules imported directly by main, by cumulative import time"""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    direct = []
+    for line in output.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        # main itself is at depth 0, what it imports at depth 1 (two spaces)
+        if match and len(match.group(2)) == 2:
+            direct.append((int(match.group(1)), match.group(3)))
+    direct.sort(reverse=True)
+    return [{"module": name, "ms": round(us / 1000, 1)} for us, name in direct[:top]]
+
+
+def wait_for(client, path: str, deadline: float) -> bool:
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(path).status_code == 200:
+                return True
+        except Exception:
+            pass
+        time.sleep(0.005)
+    return False
+
+
+def measure_first_request(env: dict, timeout: float) -> dict:
+    import httpx
+
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(GATEWAY_PORT), "--log-level", "warning"]
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{GATEWAY_PORT}", timeout=5) as client:
+            deadline = started + timeout
+            if not wait_for(client, "/", deadline):
+                raise RuntimeError("Gateway did not answer within the timeout")
+            first = time.perf_counter() - started
+            if not wait_for(client, "/api/training-history", deadline):
+                raise RuntimeError("Training history did not answer within the timeout")
+            first_db = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return {"first_request": first, "first_db_request": first_db}
+
+
+# ===== RUNNER =====
+
+def median_ms(values) -> float:
+    return round(statistics.median(values) * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=2000.0, help="budget for `import main`")
+    parser.add_argument("--max-first-request-ms", type=float, default=4000.0,
+                        help="budget from spawning uvicorn to the first answer")
+    parser.add_argument("--forbid", default=HEAVY_MODULES, help="modules that must not be imported at startup")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for the gateway to answer")
+    parser.add_argument("--top", type=int, default=10, help="slowest direct imports of main to list")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+    forbid = [name for name in args.forbid.split(",") if name]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{tmp}/bench.db",
+            "ARTIFACT_DIR": os.path.join(tmp, "artifacts"),
+            "RESULT_CACHE_DIR": os.path.join(tmp, "cache"),
+            "LOCAL_MODEL_DIR": os.path.join(tmp, "models"),
+        }
+        subprocess.run([sys.executable, "-m", "migrate"], cwd=BACKEND_DIR, env=env, capture_output=True, check=True)
+
+        imports = [measure_import(env, forbid) for _ in range(args.runs)]
+        starts = [measure_first_request(env, args.timeout) for _ in range(args.runs)]
+        slowest = slowest_imports(env, args.top)
+
+    heavy = sorted({name for run in imports for name in run["modules"]})
+    result = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "import_ms": median_ms([run["seconds"] for run in imports]),
+        "first_request_ms": median_ms([run["first_request"] for run in starts]),
+        "first_db_request_ms": median_ms([run["first_db_request"] for run in starts]),
+        "heavy_modules_at_startup": heavy,
+        "slowest_imports": slowest,
+        "budget": {"import_ms": args.max_import_ms, "first_request_ms": args.max_first_request_ms},
+    }
+
+    violations = []
+    if result["import_ms"] > args.max_import_ms:
+        violations.append(f"import took {result['import_ms']} ms, budget {args.max_import_ms} ms")
+    if result["first_request_ms"] > args.max_first_request_ms:
+        violations.append(f"first request after {result['first_request_ms']} ms, budget {args.max_first_request_ms} ms")
+    if heavy:
+        violations.append(f"imported at startup: {', '.join(heavy)}")
+    result["violations"] = violations
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if violations:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
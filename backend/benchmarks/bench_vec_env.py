@@ -0,0 +1,92 @@
+"""
+Vectorized environment benchmark.
+
+Steps every environment listed in `frontend/src/data/environments.js` with
+random actions under each vectorization mode and reports env steps/sec,
+alongside the mode that `vec_env.choose_vectorization` would pick.
+
+    cd backend && python -m benchmarks.bench_vec_env --n-envs 8 --duration 3
+
+Environments that are not registered with gymnasium (e.g. the custom
+GridWorld-v0) are reported as skipped.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+ENV_DATA_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "frontend", "src", "data")
+MODES = ("dummy", "subproc", "shm")
+
+
+def frontend_env_ids():
+    """Env ids passed to gym.make() in the frontend's environment templates"""
+    ids = []
+    for name in sorted(os.listdir(ENV_DATA_DIR)):
+        if not name.endswith(".js"):
+            continue
+        with open(os.path.join(ENV_DATA_DIR, name)) as f:
+            for env_id in re.findall(r"gym\.make\(['\"]([^'\"]+)['\"]", f.read()):
+                if env_id not in ids:
+                    ids.append(env_id)
+    return ids
+
+
+def bench_mode(env_id, mode, n_envs, duration):
+    from vec_env import make_vec_env
+
+    env = make_vec_env(env_id, n_envs, mode)
+    try:
+        env.seed(0)
+        env.reset()
+        actions = np.array([env.action_space.sample() for _ in range(n_envs)])
+        steps = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            env.step(actions)
+            steps += n_envs
+        elapsed = time.perf_counter() - start
+    finally:
+        env.close()
+    return {"mode": mode, "n_envs": n_envs, "steps_per_second": round(steps / elapsed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-envs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per env and mode")
+    parser.add_argument("--modes", default=",".join(MODES))
+    args = parser.parse_args()
+
+    import gymnasium as gym
+    from vec_env import choose_vectorization, measure_step_cost
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    results = []
+    for env_id in frontend_env_ids():
+        if env_id not in gym.registry:
+            results.append({"env": env_id, "skipped": "not registered with gymnasium"})
+            continue
+
+        step_cost, obs_bytes = measure_step_cost(env_id)
+        auto_mode, auto_n_envs = choose_vectorization(env_id, cores)
+        results.append({
+            "env": env_id,
+            "step_cost_us": round(step_cost * 1e6, 1),
+            "obs_bytes": obs_bytes,
+            "auto": {"mode": auto_mode, "n_envs": auto_n_envs},
+            "modes": [bench_mode(env_id, mode, args.n_envs, args.duration) for mode in args.modes.split(",")],
+        })
+
+    print(json.dumps({"cores": cores, "duration": args.duration, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Viewer capacity of the gateway as the number of worker processes grows.
+
+For each worker count, runs `uvicorn main:app --workers N` against the fake
+Space, with every worker sharing state through the fake Redis
+(`PUBSUB_URL=redis://...`). A few jobs are started, then render and metrics
+viewers are added in steps. Viewers connect to whichever worker the kernel
+hands them to, so most of them sit on a worker that isn't relaying their
+job and get its frames through the broker.
+
+    cd backend && python -m benchmarks.bench_workers --workers 1,2,4 --viewers 20,40,80
+
+For every step the report has the render FPS viewers got, the share that
+sustained at least `--sustain` of the FPS they asked for, metric updates
+delivered, and how many render connections the Space saw, which should stay
+at one per job whatever the worker count. A worker count's capacity is the
+largest step at which at least `--min-share` of viewers kept up.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SPACE_PORT = 7866
+REDIS_PORT = 6396
+GATEWAY_PORT = 8066
+
+
+# ===== LOAD GENERATOR =====
+
+async def drive(url: str, job_ids: list, viewers: int, fps: float, duration: float) -> dict:
+    """Attach `viewers` render and metrics viewers, spread over the jobs, for `duration` seconds"""
+    from benchmarks.bench_e2e import Recorder, follow_metrics, watch_render
+
+    recorder = Recorder()
+    ws_url = url.replace("http://", "ws://")
+    deadline = time.perf_counter() + duration
+    tasks = []
+    for index in range(viewers):
+        job_id = job_ids[index % len(job_ids)]
+        tasks += [
+            watch_render(ws_url, job_id, fps, recorder, deadline),
+            follow_metrics(ws_url, job_id, recorder, deadline),
+        ]
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        "fps": [frames / seconds if seconds > 0 else 0.0 for frames, _, seconds in recorder.frames],
+        "metric_updates": recorder.metric_updates,
+        "errors": sum(isinstance(outcome, Exception) for outcome in outcomes),
+    }
+
+
+def run_client(args):
+    """Run one step's viewers in this process and print what they measured"""
+    job_ids = args.job_ids.split(",")
+    result = asyncio.run(drive(args.url, job_ids, args.client_viewers, args.fps, args.duration))
+    print(json.dumps(result))
+
+
+def client_command(args, url: str, job_ids: list, viewers: int) -> list:
+    return [
+        sys.executable, "-m", "benchmarks.bench_workers", "--client", "--url", url,
+        "--job-ids", ",".join(job_ids), "--client-viewers", str(viewers),
+        "--fps", str(args.fps), "--duration", str(args.duration),
+    ]
+
+
+# ===== RUNNER =====
+
+def wait_for(client, path: str, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(path).status_code == 200:
+                return
+        except Exception:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("Gateway did not answer within the timeout")
+
+
+def measure_step(args, client, space, url: str, job_ids: list, viewers: int) -> dict:
+    # Split the viewers over a few processes so the load generator isn't the bottleneck
+    processes = max(1, min(args.clients, viewers))
+    shares = [viewers // processes + (1 if i < viewers % processes else 0) for i in range(processes)]
+    before = client.get(f"{space}/bench/stats").json()
+    runs = [
+        subprocess.Popen(client_command(args, url, job_ids, share), cwd=BACKEND_DIR,
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        for share in shares
+    ]
+    outputs = [json.loads(run.communicate()[0].strip().splitlines()[-1]) for run in runs]
+    after = client.get(f"{space}/bench/stats").json()
+
+    fps = [value for output in outputs for value in output["fps"]] or [0.0]
+    sustained = sum(1 for value in fps if value >= args.sustain * args.fps) / len(fps)
+    updates = sum(output["metric_updates"] for output in outputs)
+    return {
+        "viewers": viewers,
+        "fps_mean": round(statistics.mean(fps), 2),
+        "fps_p10": round(sorted(fps)[len(fps) // 10], 2),
+        "sustained_share": round(sustained, 3),
+        "metric_updates_per_viewer_sec": round(updates / viewers / args.duration, 2),
+        "errors": sum(output["errors"] for output in outputs),
+        "space_render_connections": after["render_connections"] - before["render_connections"],
+        "space_calls_per_sec": round((after["calls"] - before["calls"]) / args.duration, 1),
+    }
+
+
+def measure_workers(args, env: dict, space: str, workers: int) -> dict:
+    import httpx
+
+    url = f"http://127.0.0.1:{GATEWAY_PORT}"
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(GATEWAY_PORT),
+               "--workers", str(workers), "--log-level", "warning"]
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(timeout=30) as client:
+            wait_for(client, f"{url}/", args.timeout)
+            job_ids = []
+            for index in range(args.jobs):
+                response = client.post(f"{url}/train", json={"total_timesteps": 10**9, "seed": index})
+                response.raise_for_status()
+                job_ids.append(response.json()["job_id"])
+
+            steps = []
+            for viewers in args.viewers:
+                step = measure_step(args, client, space, url, job_ids, viewers)
+                steps.append(step)
+                print(f"[BENCH] workers={workers} viewers={viewers} fps_mean={step['fps_mean']}"
+                      f" sustained={step['sustained_share']}", file=sys.stderr)
+
+            for job_id in job_ids:
+                client.post(f"{url}/train/{job_id}/stop")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    kept_up = [step["viewers"] for step in steps if step["sustained_share"] >= args.min_share]
+    return {"workers": workers, "capacity": max(kept_up, default=0), "steps": steps}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma separated worker counts")
+    parser.add_argument("--viewers", default="20,40,80", help="comma separated viewer counts per step")
+    parser.add_argument("--jobs", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per step")
+    parser.add_argument("--fps", type=float, default=10.0, help="render FPS each viewer asks for")
+    parser.add_argument("--sustain", type=float, default=0.9, help="share of --fps a viewer must get to keep up")
+    parser.add_argument("--min-share", type=float, default=0.95,
+                        help="share of viewers that must keep up for a step to count towards capacity")
+    parser.add_argument("--frame-width", type=int, default=160)
+    parser.add_argument("--frame-height", type=int, default=120)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="fake Space latency per call")
+    parser.add_argument("--clients", type=int, default=2, help="load generator processes")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for the gateway to start")
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--client", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--job-ids", help=argparse.SUPPRESS)
+    parser.add_argument("--client-viewers", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client:
+        run_client(args)
+        return
+
+    from benchmarks.fake_redis import FakeRedisThread
+    from benchmarks.fake_space import ServerThread, create_app
+
+    args.viewers = [int(count) for count in args.viewers.split(",")]
+    worker_counts = [int(count) for count in args.workers.split(",")]
+    space_app = create_app(latency_ms=args.latency_ms, frame_size=(args.frame_width, args.frame_height))
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, FakeRedisThread(REDIS_PORT) as redis, \
+            ServerThread(space_app, SPACE_PORT) as space:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{tmp}/bench.db",
+            "PUBSUB_URL": redis.url,
+            "HUGGINGFACE_SPACE_URL": space.url,
+            "RENDER_UPSTREAM_FPS": str(args.fps),
+            "ARTIFACT_DIR": os.path.join(tmp, "artifacts"),
+            "RESULT_CACHE_DIR": os.path.join(tmp, "cache"),
+            "LOCAL_MODEL_DIR": os.path.join(tmp, "models"),
+        }
+        subprocess.run([sys.executable, "-m", "migrate"], cwd=BACKEND_DIR, env=env, capture_output=True, check=True)
+        for workers in worker_counts:
+            results.append(measure_workers(args, env, space.url, workers))
+
+    result = {
+        "cpus": os.cpu_count(),
+        "parameters": {
+            key: value for key, value in vars(args).items()
+            if key not in ("output", "client", "url", "job_ids", "client_viewers")
+        },
+        "capacity": {str(run["workers"]): run["capacity"] for run in results},
+        "runs": results,
+    }
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
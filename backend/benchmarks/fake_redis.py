@@ -0,0 +1,215 @@
+"""
+Local stand-in for Redis, speaking enough of its protocol for `pubsub.RedisBroker`.
+
+Supports HELLO (RESP2 and RESP3), PING, GET, SET (with NX, XX, EX and PX),
+DEL, EXISTS, PEXPIRE, PUBLISH, SUBSCRIBE and UNSUBSCRIBE, all in one asyncio
+loop. Anything else is answered with +OK. Keys live in memory and nothing
+is persisted, so it is only meant for running several gateway workers in
+benchmarks.
+
+    python -m benchmarks.fake_redis --port 6390
+"""
+import argparse
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+
+def encode(value, resp3: bool = False) -> bytes:
+    """Encoding of a reply; a tuple is a push message (pub/sub), a list an array"""
+    if value is None:
+        return b"_\r\n" if resp3 else b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode()
+    if isinstance(value, dict):
+        items = [item for pair in value.items() for item in pair]
+        prefix = b"%%%d\r\n" % len(value) if resp3 else b"*%d\r\n" % len(items)
+        return prefix + b"".join(encode(item, resp3) for item in items)
+    if isinstance(value, (list, tuple)):
+        kind = b">" if resp3 and isinstance(value, tuple) else b"*"
+        return kind + b"%d\r\n" % len(value) + b"".join(encode(item, resp3) for item in value)
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[list]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, as typed into telnet
+        return line.split()
+    arguments = []
+    for _ in range(int(line[1:])):
+        size = int((await reader.readline())[1:])
+        arguments.append((await reader.readexactly(size + 2))[:-2])
+    return arguments
+
+
+class Client:
+    """One connection: its protocol version and the channels it listens on"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.resp3 = False
+        self.subscribed: Set[bytes] = set()
+
+    def encode(self, value) -> bytes:
+        return encode(value, self.resp3)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.keys: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.channels: Dict[bytes, Set[Client]] = {}
+        self.commands = 0
+        self.published = 0
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self.keys.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self.keys[key]
+            return None
+        return value
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = Client(writer)
+        try:
+            while True:
+                command = await read_command(reader)
+                if command is None:
+                    break
+                if command:
+                    self.commands += 1
+                    writer.write(self.execute(command, client))
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in client.subscribed:
+                self._unsubscribe(channel, client)
+            writer.close()
+
+    def _unsubscribe(self, channel: bytes, client: Client):
+        subscribers = self.channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(client)
+            if not subscribers:
+                del self.channels[channel]
+
+    def execute(self, command: list, client: Client) -> bytes:
+        name, args = command[0].upper(), command[1:]
+        encode = client.encode
+
+        if name == b"HELLO":
+            if args:
+                client.resp3 = args[0] == b"3"
+            return encode({b"server": b"redis", b"version": b"7.2.0", b"proto": 3 if client.resp3 else 2,
+                           b"mode": b"standalone", b"role": b"master", b"modules": []})
+
+        if name == b"PING":
+            if client.subscribed and not client.resp3:
+                return encode([b"pong", args[0] if args else b""])
+            return encode(args[0]) if args else encode("PONG")
+
+        if name == b"GET":
+            return encode(self._get(args[0]))
+
+        if name == b"SET":
+            key, value = args[0], args[1]
+            options = [arg.upper() for arg in args[2:]]
+            expires = None
+            for unit, scale in ((b"PX", 1000.0), (b"EX", 1.0)):
+                if unit in options:
+                    expires = time.monotonic() + int(args[2 + options.index(unit) + 1]) / scale
+            exists = self._get(key) is not None
+            if (b"NX" in options and exists) or (b"XX" in options and not exists):
+                return encode(None)
+            self.keys[key] = (value, expires)
+            return encode("OK")
+
+        if name == b"DEL":
+            removed = sum(1 for key in args if self._get(key) is not None)
+            for key in args:
+                self.keys.pop(key, None)
+            return encode(removed)
+
+        if name == b"EXISTS":
+            return encode(sum(1 for key in args if self._get(key) is not None))
+
+        if name == b"PEXPIRE":
+            value = self._get(args[0])
+            if value is None:
+                return encode(0)
+            self.keys[args[0]] = (value, time.monotonic() + int(args[1]) / 1000)
+            return encode(1)
+
+        if name == b"PUBLISH":
+            channel, message = args
+            subscribers = self.channels.get(channel, set())
+            for subscriber in subscribers:
+                subscriber.writer.write(subscriber.encode((b"message", channel, message)))
+            self.published += 1
+            return encode(len(subscribers))
+
+        if name == b"SUBSCRIBE":
+            replies = []
+            for channel in args:
+                client.subscribed.add(channel)
+                self.channels.setdefault(channel, set()).add(client)
+                replies.append(encode((b"subscribe", channel, len(client.subscribed))))
+            return b"".join(replies)
+
+        if name == b"UNSUBSCRIBE":
+            channels = args or sorted(client.subscribed)
+            if not channels:
+                return encode((b"unsubscribe", None, 0))
+            replies = []
+            for channel in channels:
+                client.subscribed.discard(channel)
+                self._unsubscribe(channel, client)
+                replies.append(encode((b"unsubscribe", channel, len(client.subscribed))))
+            return b"".join(replies)
+
+        # CLIENT SETINFO, SELECT and the like
+        return encode("OK")
+
+
+class FakeRedisThread:
+    """Run a fake Redis on a background thread with its own event loop"""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.url = f"redis://127.0.0.1:{port}/0"
+        self.redis = FakeRedis()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self.redis.handle, "127.0.0.1", self.port)
+        )
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+async def serve(port: int):
+    server = await asyncio.start_server(FakeRedis().handle, "127.0.0.1", port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=6390)
+    asyncio.run(serve(parser.parse_args().port))
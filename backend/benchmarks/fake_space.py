@@ -0,0 +1,171 @@
+"""
+Local stand-in for the HuggingFace Space training API.
+
+Implements the subset of the Space contract the gateway proxies, with a
+configurable artificial latency, render frame size and training speed so
+benchmarks can run without network access.
+
+    uvicorn benchmarks.fake_space:app --port 7860
+"""
+import asyncio
+import base64
+import math
+import os
+import threading
+import time
+import uuid
+
+import cv2
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+
+LATENCY_MS = float(os.getenv("FAKE_SPACE_LATENCY_MS", "50"))
+FRAME_WIDTH = int(os.getenv("FAKE_SPACE_FRAME_WIDTH", "600"))
+FRAME_HEIGHT = int(os.getenv("FAKE_SPACE_FRAME_HEIGHT", "400"))
+STEPS_PER_SECOND = int(os.getenv("FAKE_SPACE_STEPS_PER_SECOND", "5000"))
+
+
+def render_frame(t: float, width: int, height: int) -> np.ndarray:
+    """A CartPole-like scene: a cart sliding along a track with a swinging pole"""
+    frame = np.full((height, width, 3), 255, np.uint8)
+    track_y = int(height * 0.7)
+    cart_x = int(width / 2 + np.sin(t) * width / 4)
+    cv2.line(frame, (0, track_y), (width, track_y), (0, 0, 0), 1)
+    cv2.rectangle(frame, (cart_x - 25, track_y - 15), (cart_x + 25, track_y + 15), (0, 0, 0), -1)
+    angle = np.sin(t * 1.7) * 0.4
+    tip = (int(cart_x + np.sin(angle) * height * 0.3), int(track_y - 15 - np.cos(angle) * height * 0.3))
+    cv2.line(frame, (cart_x, track_y - 15), tip, (202, 152, 101), 8)
+    return frame
+
+
+def learning_speed(payload: dict) -> float:
+    """How fast a fake job's reward climbs: best at learning_rate=3e-4, so sweeps have an optimum"""
+    distance = math.log10(payload.get("learning_rate", 3e-4)) - math.log10(3e-4)
+    return math.exp(-distance ** 2)
+
+
+def create_app(latency_ms: float = LATENCY_MS, frame_size=(FRAME_WIDTH, FRAME_HEIGHT),
+               steps_per_second: int = STEPS_PER_SECOND) -> FastAPI:
+    """Build a fake Space with `latency_ms` of delay on every call"""
+    app = FastAPI()
+    jobs = {}
+    # Load the gateway puts on the Space, read by benchmarks from /bench/stats
+    app.state.calls = 0
+    app.state.render_connections = 0
+    app.state.render_open = 0
+
+    async def delay():
+        app.state.calls += 1
+        if latency_ms > 0:
+            await asyncio.sleep(latency_ms / 1000)
+
+    def job_payload(job_id: str):
+        job = jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        elapsed = time.time() - job["started"]
+        timesteps = min(job["total_timesteps"], int(elapsed * job["steps_per_second"]))
+        progress = timesteps / job["total_timesteps"]
+        status = job["status"]
+        if status == "training" and progress >= 1.0:
+            status = job["status"] = "completed"
+        episodes = timesteps // 200
+        return {
+            "job_id": job_id,
+            "status": status,
+            "elapsed_time": elapsed,
+            "metrics": {
+                "timesteps": timesteps,
+                "episodes": episodes,
+                "progress": progress * 100,
+                "mean_reward": min(500.0, 10.0 + episodes * 0.5 * job["learning_speed"]),
+                "std_reward": 5.0,
+                "episode_rewards": [],
+                "episode_lengths": [],
+            },
+        }
+
+    @app.post("/train")
+    async def train(payload: dict):
+        await delay()
+        job_id = str(uuid.uuid4())
+        jobs[job_id] = {
+            "status": "training",
+            "started": time.time(),
+            "total_timesteps": payload.get("total_timesteps", 100000),
+            "steps_per_second": steps_per_second,
+            "learning_speed": learning_speed(payload),
+        }
+        return {"job_id": job_id, "status": "queued"}
+
+    @app.get("/train/{job_id}/status")
+    async def status(job_id: str):
+        await delay()
+        data = job_payload(job_id)
+        if data["status"] == "completed":
+            data["results"] = {"mean_reward": data["metrics"]["mean_reward"]}
+        return data
+
+    @app.get("/train/{job_id}/metrics")
+    async def metrics(job_id: str):
+        await delay()
+        return job_payload(job_id)
+
+    @app.post("/train/{job_id}/stop")
+    async def stop(job_id: str):
+        await delay()
+        if job_id in jobs:
+            jobs[job_id]["status"] = "stopped"
+        return {"message": f"Job {job_id} stopped"}
+
+    @app.websocket("/ws/render/{job_id}")
+    async def render(websocket: WebSocket, job_id: str):
+        await websocket.accept()
+        app.state.render_connections += 1
+        app.state.render_open += 1
+        width, height = frame_size
+        try:
+            while True:
+                message = await websocket.receive_text()
+                if message != "request_frame":
+                    continue
+                frame = render_frame(time.time(), width, height)
+                ok, jpeg = cv2.imencode(".jpg", frame)
+                await websocket.send_json({"type": "frame", "data": base64.b64encode(jpeg.tobytes()).decode()})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            app.state.render_open -= 1
+
+    @app.get("/bench/stats")
+    async def bench_stats():
+        return {
+            "calls": app.state.calls,
+            "render_connections": app.state.render_connections,
+            "render_open": app.state.render_open,
+        }
+
+    return app
+
+
+app = create_app()
+
+
+class ServerThread:
+    """Run an ASGI app with uvicorn on a background thread"""
+
+    def __init__(self, app, port: int):
+        self.server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.url = f"http://127.0.0.1:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
@@ -0,0 +1,249 @@
+"""
+Bulk export of the training history for offline analysis.
+
+`export_chunks` walks a table in primary key order, `EXPORT_CHUNK_ROWS` rows
+per query, and encodes each chunk as soon as it is read, so memory use
+doesn't grow with the size of the table. Two tables can be exported:
+
+- runs: one row per training run, with its config, final metrics and
+  results as JSON text
+- metrics: the per-step metric history of the selected runs
+
+NDJSON needs nothing extra. Parquet (one row group per chunk) and Arrow IPC
+streams need pyarrow, imported on first use.
+"""
+import io
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, List, Optional, Sequence
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import String, select, tuple_, type_coerce
+
+import models
+
+Run = models.TrainingRun
+Point = models.MetricPoint
+
+# Configuration
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+
+EXPORT_TABLES = ("runs", "metrics")
+EXPORT_FORMATS = ("ndjson", "parquet", "arrow")
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+EXTENSIONS = {"ndjson": "ndjson", "parquet": "parquet", "arrow": "arrows"}
+
+# Columns per table, in output order, with their Arrow types
+RUN_COLUMNS = (
+    ("id", "int64"), ("job_id", "string"), ("environment", "string"), ("agent", "string"),
+    ("status", "string"), ("episodes", "int64"), ("reward", "float64"), ("config_hash", "string"),
+    ("created_at", "timestamp"), ("updated_at", "timestamp"),
+    ("config", "json"), ("metrics", "json"), ("results", "json"),
+)
+POINT_COLUMNS = (
+    ("run_id", "int64"), ("timestep", "int64"), ("episodes", "int64"), ("reward", "float64"),
+    ("std_reward", "float64"), ("episode_length", "float64"), ("loss", "float64"),
+)
+COLUMNS = {"runs": RUN_COLUMNS, "metrics": POINT_COLUMNS}
+
+
+def check_format(table: str, fmt: str):
+    """Reject an unknown table or format, or one whose library is missing, before anything is streamed"""
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=400, detail=f"Unknown table '{table}', expected one of {list(EXPORT_TABLES)}")
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{fmt}', expected one of {list(EXPORT_FORMATS)}")
+    if fmt != "ndjson":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail=f"format={fmt} needs pyarrow, run `pip install pyarrow`")
+
+
+def filename(table: str, fmt: str) -> str:
+    return f"{table}.{EXTENSIONS[fmt]}"
+
+
+# ===== QUERIES =====
+
+def naive_utc(value: datetime) -> datetime:
+    """Timestamps are stored as naive UTC"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def filter_runs(query, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                environment: Optional[str] = None, status: Optional[str] = None,
+                agent: Optional[str] = None):
+    """Restrict a query to runs created in [since, until) and matching the other filters"""
+    if since is not None:
+        query = query.where(Run.created_at >= naive_utc(since))
+    if until is not None:
+        query = query.where(Run.created_at < naive_utc(until))
+    if environment:
+        query = query.where(Run.environment == environment)
+    if status:
+        query = query.where(Run.status == status)
+    if agent:
+        query = query.where(Run.agent == agent)
+    return query
+
+
+def run_query(**filters):
+    # JSON columns come back as the stored text, so they are never parsed and re-encoded
+    columns = [
+        type_coerce(getattr(Run, name), String).label(name) if kind == "json" else getattr(Run, name).label(name)
+        for name, kind in RUN_COLUMNS
+    ]
+    return filter_runs(select(*columns), **filters)
+
+
+def point_query(**filters):
+    columns = [getattr(Point, name).label(name) for name, _ in POINT_COLUMNS]
+    return filter_runs(select(*columns).join(Run, Run.id == Point.run_id), **filters)
+
+
+async def read_chunks(db, table: str, chunk_rows: int, **filters) -> AsyncIterator[List[Any]]:
+    """Rows of `table` in primary key order, `chunk_rows` at a time, paginated on the key"""
+    if table == "runs":
+        query, key = run_query(**filters), (Run.id,)
+    else:
+        query, key = point_query(**filters), (Point.run_id, Point.timestep)
+
+    last = None
+    while True:
+        page = query
+        if last is not None:
+            page = page.where(tuple_(*key) > tuple_(*last) if len(key) > 1 else key[0] > last[0])
+        result = await db.execute(page.order_by(*key).limit(chunk_rows))
+        rows = result.all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_rows:
+            return
+        last = tuple(rows[-1][:len(key)])
+
+
+# ===== ENCODERS =====
+
+def json_text(value) -> str:
+    """A JSON column as text; some drivers hand it over already parsed"""
+    if value is None:
+        return "null"
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+class NdjsonEncoder:
+    def __init__(self, table: str):
+        self.columns = COLUMNS[table]
+        self.scalars = [name for name, kind in self.columns if kind != "json"]
+        self.blobs = [name for name, kind in self.columns if kind == "json"]
+
+    def encode(self, rows: Sequence[Any]) -> bytes:
+        lines = []
+        for row in rows:
+            data = row._mapping
+            scalars = {}
+            for name in self.scalars:
+                value = data[name]
+                scalars[name] = value.isoformat() if isinstance(value, datetime) else value
+            line = json.dumps(scalars)
+            if self.blobs:
+                line = line[:-1] + "".join(f', "{name}": {json_text(data[name])}' for name in self.blobs) + "}"
+            lines.append(line)
+        return ("\n".join(lines) + "\n").encode()
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file that collects what pyarrow writes until it is drained"""
+
+    def __init__(self):
+        super().__init__()
+        self.parts: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+class ArrowEncoder:
+    """Parquet with one row group per chunk, or an Arrow IPC stream with one record batch per chunk"""
+
+    def __init__(self, table: str, fmt: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.types = {
+            "int64": pa.int64(), "float64": pa.float64(), "string": pa.string(),
+            "json": pa.string(), "timestamp": pa.timestamp("us"),
+        }
+        self.pa = pa
+        self.columns = COLUMNS[table]
+        self.schema = pa.schema([(name, self.types[kind]) for name, kind in self.columns])
+        self.sink = ChunkSink()
+        self.parquet = fmt == "parquet"
+        if self.parquet:
+            self.writer = pq.ParquetWriter(self.sink, self.schema, compression="zstd")
+        else:
+            self.writer = pa.ipc.new_stream(self.sink, self.schema)
+
+    def encode(self, rows: Sequence[Any]) -> bytes:
+        arrays = []
+        for index, (name, kind) in enumerate(self.columns):
+            values = [row[index] for row in rows]
+            if kind == "json":
+                values = [json_text(value) if value is not None else None for value in values]
+            arrays.append(self.pa.array(values, self.types[kind]))
+        batch = self.pa.record_batch(arrays, schema=self.schema)
+        if self.parquet:
+            self.writer.write_table(self.pa.Table.from_batches([batch]))
+        else:
+            self.writer.write_batch(batch)
+        return self.sink.drain()
+
+    def finish(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+async def export_chunks(session_factory, table: str, fmt: str, chunk_rows: int = EXPORT_CHUNK_ROWS,
+                        **filters) -> AsyncIterator[bytes]:
+    """
+    Encoded export of `table`, yielded one chunk of rows at a time. Encoding
+    runs in a worker thread so large chunks don't stall the event loop.
+    """
+    encoder = NdjsonEncoder(table) if fmt == "ndjson" else ArrowEncoder(table, fmt)
+    async with session_factory() as db:
+        async for rows in read_chunks(db, table, chunk_rows, **filters):
+            data = await run_in_threadpool(encoder.encode, rows)
+            if data:
+                yield data
+    data = encoder.finish()
+    if data:
+        yield data
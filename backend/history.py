@@ -0,0 +1,110 @@
+import base64
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import select, tuple_
+
+import models
+
+Run = models.TrainingRun
+
+# Every field a training run can be serialized with, in response order
+RUN_FIELDS = (
+    "id", "job_id", "environment", "agent", "episodes", "status", "reward",
+    "created_at", "updated_at", "metrics", "config", "results",
+)
+
+# Potentially large JSON columns, only loaded when asked for
+JSON_FIELDS = ("metrics", "config", "results")
+
+SUMMARY_FIELDS = tuple(f for f in RUN_FIELDS if f not in JSON_FIELDS and f != "updated_at")
+DETAIL_FIELDS = tuple(f for f in RUN_FIELDS if f != "updated_at")
+
+
+def parse_fields(fields: Optional[str], default: Sequence[str]) -> Tuple[str, ...]:
+    """Parse a `fields=` projection; `all` selects every field"""
+    if not fields:
+        return tuple(default)
+    if fields == "all":
+        return RUN_FIELDS
+
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in RUN_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields {unknown}, expected any of {list(RUN_FIELDS)}")
+    return tuple(f for f in RUN_FIELDS if f in requested)
+
+
+def project(fields: Sequence[str]):
+    """Select only the columns needed for `fields`, plus the keyset columns"""
+    columns = set(fields) | {"id", "created_at"}
+    return select(*[getattr(Run, f).label(f) for f in RUN_FIELDS if f in columns])
+
+
+def serialize_run(row, fields: Sequence[str]) -> Dict[str, Any]:
+    data = {}
+    for field in fields:
+        value = getattr(row, field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        data[field] = value
+    return data
+
+
+# ===== KEYSET PAGINATION =====
+
+def encode_cursor(created_at: datetime, run_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{run_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, run_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(run_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def list_runs(db, fields: Sequence[str], limit: int, cursor: Optional[str] = None,
+              environment: Optional[str] = None, status: Optional[str] = None,
+              agent: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    List runs newest first, paginated on (created_at, id), with an async session.
+
+    Returns the serialized page and the cursor for the next page, if any.
+    """
+    query = project(fields)
+    if environment:
+        query = query.where(Run.environment == environment)
+    if status:
+        query = query.where(Run.status == status)
+    if agent:
+        query = query.where(Run.agent == agent)
+    if cursor:
+        created_at, run_id = decode_cursor(cursor)
+        query = query.where(tuple_(Run.created_at, Run.id) < tuple_(created_at, run_id))
+
+    result = await db.execute(query.order_by(Run.created_at.desc(), Run.id.desc()).limit(limit + 1))
+    rows = result.all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return [serialize_run(row, fields) for row in rows], next_cursor
+
+
+def etag_for(payload: Any) -> str:
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
@@ -0,0 +1,126 @@
+"""
+Prometheus metrics for the gateway, served by GET /metrics.
+
+Latency histograms are recorded as requests happen: one observation costs a
+lock and a few increments. Gauges (active jobs, viewers) are read from the
+live objects only when /metrics is scraped, so they cost nothing otherwise.
+"""
+import re
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import PlatformCollector, ProcessCollector
+from sqlalchemy import event
+
+REGISTRY = CollectorRegistry()
+ProcessCollector(registry=REGISTRY)
+PlatformCollector(registry=REGISTRY)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "gateway_http_request_duration_seconds", "Time to serve an HTTP request, by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS, registry=REGISTRY,
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "gateway_upstream_request_duration_seconds", "Time of each call to the HuggingFace Space, retries counted separately",
+    ["method", "endpoint", "outcome"], buckets=LATENCY_BUCKETS, registry=REGISTRY,
+)
+DB_TRANSACTION_DURATION = Histogram(
+    "gateway_db_transaction_duration_seconds", "Time from the start of a session transaction to its commit or rollback",
+    ["outcome"], buckets=LATENCY_BUCKETS, registry=REGISTRY,
+)
+DB_QUERY_DURATION = Histogram(
+    "gateway_db_query_duration_seconds", "Time to execute one SQL statement",
+    ["operation"], buckets=LATENCY_BUCKETS, registry=REGISTRY,
+)
+SERIALIZATION_DURATION = Histogram(
+    "gateway_serialization_duration_seconds", "Time to turn database rows into a JSON response body",
+    ["payload"], buckets=LATENCY_BUCKETS, registry=REGISTRY,
+)
+FRAMES_SENT = Counter(
+    "gateway_render_frames_sent", "Render frames sent to WebSocket viewers", registry=REGISTRY,
+)
+FRAME_BYTES_SENT = Counter(
+    "gateway_render_frame_bytes_sent", "Bytes of render frames sent to WebSocket viewers", registry=REGISTRY,
+)
+ACTIVE_JOBS = Gauge(
+    "gateway_active_jobs", "Training jobs the gateway is running or polling", ["backend", "state"], registry=REGISTRY,
+)
+WEBSOCKET_VIEWERS = Gauge(
+    "gateway_websocket_viewers", "Connected WebSocket viewers", ["stream"], registry=REGISTRY,
+)
+
+# Path segments holding ids (job ids, run ids) are collapsed to keep label cardinality bounded
+ID_SEGMENT = re.compile(r"/[^/]*\d[^/]*")
+
+
+def endpoint_template(endpoint: str) -> str:
+    """`/train/3f2a.../metrics` -> `/train/{id}/metrics`"""
+    return ID_SEGMENT.sub("/{id}", endpoint.split("?", 1)[0])
+
+
+def scrape():
+    """Body and content type of a /metrics response"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+# ===== MIDDLEWARE =====
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by its route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_DURATION.labels(scope["method"], route, str(status)).observe(time.perf_counter() - started)
+
+
+# ===== DATABASE =====
+
+def instrument_database(engine, session_factory):
+    """Time every statement on `engine` and every transaction of `session_factory` sessions"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("query_started", None)
+        if started is None:
+            return
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_QUERY_DURATION.labels(operation).observe(time.perf_counter() - started)
+
+    @event.listens_for(session_factory, "after_begin")
+    def _after_begin(session, transaction, connection):
+        session.info.setdefault("transaction_started", time.perf_counter())
+
+    def _finish(outcome):
+        def listener(session):
+            started = session.info.pop("transaction_started", None)
+            if started is not None:
+                DB_TRANSACTION_DURATION.labels(outcome).observe(time.perf_counter() - started)
+        return listener
+
+    event.listen(session_factory, "after_commit", _finish("commit"))
+    event.listen(session_factory, "after_rollback", _finish("rollback"))
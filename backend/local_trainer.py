@@ -0,0 +1,354 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from artifacts import ARTIFACT_DIR
+from training_worker import run_training_job
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+LOCAL_THREADS_PER_JOB = int(os.getenv("LOCAL_THREADS_PER_JOB", "1"))
+LOCAL_QUEUE_SIZE = int(os.getenv("LOCAL_QUEUE_SIZE", "32"))
+LOCAL_STOP_GRACE_SECONDS = float(os.getenv("LOCAL_STOP_GRACE_SECONDS", "10"))
+LOCAL_MODEL_DIR = os.getenv("LOCAL_MODEL_DIR", "./models")
+# A job keeps sending preview frames this long after the last render request
+LOCAL_RENDER_TTL = float(os.getenv("LOCAL_RENDER_TTL", "6"))
+# Finished jobs are forgotten this long after they end; their final state is in the DB
+LOCAL_JOB_TTL = float(os.getenv("LOCAL_JOB_TTL", "600"))
+
+TERMINAL_STATUSES = {"completed", "failed", "stopped"}
+# vec_env modes that run each env copy in its own process, on its own core
+SUBPROCESS_VEC_ENVS = ("subproc", "shm")
+
+
+def available_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class CoreAllocator:
+    """Hands out disjoint sets of CPU cores so concurrent jobs don't contend"""
+
+    def __init__(self, cores: List[int]):
+        self.free = list(cores)
+
+    def allocate(self, count: int) -> Optional[List[int]]:
+        if count > len(self.free):
+            return None
+        cores, self.free = self.free[:count], self.free[count:]
+        return cores
+
+    def release(self, cores: List[int]):
+        self.free = sorted(self.free + cores)
+
+
+class LocalJob:
+    def __init__(self, job_id: str, config: Dict[str, Any], resume: Optional[List[Dict[str, Any]]] = None):
+        self.job_id = job_id
+        self.config = config
+        self.resume = resume
+        self.status = "queued"
+        self.metrics: Dict[str, Any] = {}
+        self.results: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cores: List[int] = []
+        self.process = None
+        self.stop_event = None
+        self.render_event = None
+        self.render_until = 0.0  # time.monotonic() until which someone wants preview frames
+
+    @property
+    def elapsed_time(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def payload(self, include_results: bool = False) -> Dict[str, Any]:
+        """Same shape as the HuggingFace Space's status/metrics responses"""
+        data = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "elapsed_time": self.elapsed_time,
+            "metrics": self.metrics,
+        }
+        if self.error:
+            data["error"] = self.error
+        if include_results and self.results is not None:
+            data["results"] = self.results
+        return data
+
+
+class LocalTrainingPool:
+    """
+    In-house executor for training jobs, behind the same contract as the Space.
+
+    Jobs wait in a bounded queue and are started in their own worker process
+    as soon as enough CPU cores are free; each process is pinned to the cores
+    it was given. Workers report progress over a shared multiprocessing queue,
+    and preview frames too while `render` keeps being called for a job.
+    """
+
+    def __init__(self, on_update: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                 on_artifact: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                 on_frame: Optional[Callable[[str, bytes], Awaitable[Any]]] = None,
+                 threads_per_job: int = LOCAL_THREADS_PER_JOB, queue_size: int = LOCAL_QUEUE_SIZE,
+                 model_dir: str = LOCAL_MODEL_DIR, artifact_dir: str = ARTIFACT_DIR,
+                 job_ttl: float = LOCAL_JOB_TTL):
+        self.on_update = on_update
+        self.on_artifact = on_artifact
+        self.on_frame = on_frame
+        self.threads_per_job = threads_per_job
+        self.model_dir = model_dir
+        self.artifact_dir = artifact_dir
+        self.job_ttl = job_ttl
+        self.cores = CoreAllocator(available_cores())
+        self.total_cores = len(self.cores.free)
+        self.max_workers = max(1, self.total_cores // threads_per_job)
+        self.jobs: Dict[str, LocalJob] = {}
+
+        self._mp = multiprocessing.get_context("spawn")
+        self._updates = self._mp.Queue()
+        self._pending: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._capacity = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._evictor: Optional[asyncio.Task] = None
+        self._watchers: set = set()
+        self._reader: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing = False
+
+    # ===== LIFECYCLE =====
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        self._evictor = asyncio.create_task(self._evict())
+        self._reader = threading.Thread(target=self._read_updates, daemon=True)
+        self._reader.start()
+        logger.info(f"[LOCAL] Worker pool ready ({self.max_workers} workers, {self.threads_per_job} cores each)")
+
+    async def shutdown(self):
+        """Stop queued and running jobs, giving workers time to exit cleanly"""
+        self._closing = True
+        for job in self.jobs.values():
+            if job.status not in TERMINAL_STATUSES:
+                self._request_stop(job)
+        for task in (self._dispatcher, self._evictor):
+            if task is not None:
+                task.cancel()
+        if self._watchers:
+            await asyncio.wait(self._watchers, timeout=LOCAL_STOP_GRACE_SECONDS + 1)
+        self._updates.put(None)
+        if self._reader is not None:
+            self._reader.join(timeout=1)
+
+    # ===== PUBLIC API =====
+
+    def owns(self, job_id: str) -> bool:
+        return job_id in self.jobs
+
+    def submit(self, config: Dict[str, Any], job_id: Optional[str] = None,
+               resume: Optional[List[Dict[str, Any]]] = None) -> str:
+        """
+        Queue a job. Passing an earlier `job_id` and the delta chain of one of
+        its checkpoints as `resume` continues that job from the checkpoint.
+        """
+        if job_id is not None and job_id in self.jobs and self.jobs[job_id].status not in TERMINAL_STATUSES:
+            raise HTTPException(status_code=409, detail=f"Job {job_id} is still {self.jobs[job_id].status}")
+        job = LocalJob(job_id or str(uuid.uuid4()), config, resume)
+        try:
+            self._pending.put_nowait(job)
+        except asyncio.QueueFull:
+            raise HTTPException(status_code=429, detail="Local training queue is full")
+        self.jobs[job.job_id] = job
+        logger.info(f"[LOCAL] Queued job {job.job_id} ({self._pending.qsize()} waiting)")
+        return job.job_id
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        return self._job(job_id).payload(include_results=True)
+
+    def metrics(self, job_id: str) -> Dict[str, Any]:
+        return self._job(job_id).payload()
+
+    def stop(self, job_id: str) -> Dict[str, Any]:
+        job = self._job(job_id)
+        self._request_stop(job)
+        return {"message": f"Stop requested for job {job_id}", "job_id": job_id, "status": job.status}
+
+    def render(self, job_id: str) -> Dict[str, Any]:
+        """Have a job send preview frames for the next LOCAL_RENDER_TTL seconds"""
+        job = self._job(job_id)
+        if job.config.get("multi_agent"):
+            raise HTTPException(status_code=409, detail=f"Multi-agent job {job_id} has no live render")
+        if job.status in TERMINAL_STATUSES:
+            raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}, there is nothing to render")
+        job.render_until = time.monotonic() + LOCAL_RENDER_TTL
+        if job.render_event is not None:
+            job.render_event.set()
+        return {"job_id": job_id, "status": job.status}
+
+    def stats(self) -> Dict[str, Any]:
+        running = sum(1 for job in self.jobs.values() if job.status == "training")
+        return {
+            "max_workers": self.max_workers,
+            "running": running,
+            "queued": self._pending.qsize(),
+            "free_cores": len(self.cores.free),
+        }
+
+    # ===== INTERNALS =====
+
+    def _cores_wanted(self, job: LocalJob) -> int:
+        """
+        Cores to pin a job to: `threads_per_job`, or one per env copy for jobs
+        asking for subprocess envs, up to every core on the machine
+        """
+        if job.config.get("vec_env") not in SUBPROCESS_VEC_ENVS:
+            return self.threads_per_job
+        n_envs = job.config.get("n_envs") or max(2, self.threads_per_job)
+        return min(max(n_envs, self.threads_per_job), self.total_cores)
+
+    def _job(self, job_id: str) -> LocalJob:
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        return job
+
+    def _request_stop(self, job: LocalJob):
+        if job.status == "queued":
+            # Never started; the dispatcher skips it
+            self._set_status(job, "stopped")
+        elif job.stop_event is not None:
+            job.stop_event.set()
+
+    def _set_status(self, job: LocalJob, status: str):
+        job.status = status
+        if status in TERMINAL_STATUSES and job.finished_at is None:
+            job.finished_at = time.time()
+        self._notify(job)
+
+    def _notify(self, job: LocalJob):
+        if self.on_update is not None:
+            self.on_update(job.job_id, job.payload(include_results=True))
+
+    async def _dispatch(self):
+        while True:
+            job = await self._pending.get()
+            if job.status != "queued":
+                continue
+
+            wanted = self._cores_wanted(job)
+            cores = self.cores.allocate(wanted)
+            while cores is None:
+                self._capacity.clear()
+                await self._capacity.wait()
+                cores = self.cores.allocate(wanted)
+            if job.status != "queued":
+                self.cores.release(cores)
+                continue
+
+            job.cores = cores
+            job.stop_event = self._mp.Event()
+            job.render_event = self._mp.Event()
+            if job.render_until > time.monotonic():
+                job.render_event.set()
+            job.process = self._mp.Process(
+                target=run_training_job,
+                args=(job.job_id, job.config, cores, self.model_dir, self.artifact_dir, self._updates, job.stop_event,
+                      job.resume, job.render_event),
+                # Not a daemon: workers may start their own env subprocesses
+                daemon=False,
+            )
+            job.process.start()
+            job.started_at = time.time()
+            logger.info(f"[LOCAL] Started job {job.job_id} on cores {cores}")
+
+            watcher = asyncio.create_task(self._watch(job))
+            self._watchers.add(watcher)
+            watcher.add_done_callback(self._watchers.discard)
+
+    async def _watch(self, job: LocalJob):
+        """Release a job's cores when its process exits, escalating slow stops"""
+        stop_requested_at = None
+        while job.process.is_alive():
+            if job.stop_event.is_set():
+                stop_requested_at = stop_requested_at or time.monotonic()
+                if time.monotonic() - stop_requested_at > LOCAL_STOP_GRACE_SECONDS:
+                    logger.warning(f"[LOCAL] Job {job.job_id} ignored stop, terminating")
+                    job.process.terminate()
+            if job.render_event.is_set() and time.monotonic() > job.render_until:
+                # Nobody asked for frames lately
+                job.render_event.clear()
+            await asyncio.sleep(0.5)
+
+        job.process.join()
+        # Let the reader thread apply the worker's final messages first
+        await asyncio.sleep(0.2)
+        if job.status not in TERMINAL_STATUSES:
+            stopped = job.stop_event.is_set()
+            job.error = job.error or (None if stopped else f"Worker exited with code {job.process.exitcode}")
+            self._set_status(job, "stopped" if stopped else "failed")
+
+        self.cores.release(job.cores)
+        self._capacity.set()
+        logger.info(f"[LOCAL] Job {job.job_id} finished with status {job.status}")
+
+    async def _evict(self):
+        """Forget jobs that finished more than `job_ttl` seconds ago"""
+        while True:
+            await asyncio.sleep(min(60.0, self.job_ttl / 2))
+            cutoff = time.time() - self.job_ttl
+            expired = [
+                job_id for job_id, job in self.jobs.items()
+                if job.status in TERMINAL_STATUSES and job.finished_at is not None and job.finished_at < cutoff
+                # _watch still holds on to a worker that reported its status but hasn't exited
+                and (job.process is None or not job.process.is_alive())
+            ]
+            for job_id in expired:
+                del self.jobs[job_id]
+            if expired:
+                logger.info(f"[LOCAL] Evicted {len(expired)} finished jobs ({len(self.jobs)} left)")
+
+    def _read_updates(self):
+        """Apply progress messages from worker processes (runs on its own thread)"""
+        while True:
+            try:
+                message = self._updates.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            if message is None:
+                return
+
+            job_id, kind, payload = message
+            job = self.jobs.get(job_id)
+            if job is None:
+                continue
+            if kind == "metrics":
+                job.metrics = payload
+                self._notify(job)
+            elif kind == "results":
+                job.results = payload
+            elif kind in ("checkpoint", "artifact"):
+                if self.on_artifact is not None:
+                    self.on_artifact(job_id, payload)
+            elif kind == "frame":
+                if self.on_frame is not None:
+                    asyncio.run_coroutine_threadsafe(self.on_frame(job_id, payload), self._loop)
+            elif kind == "error":
+                job.error = payload
+                logger.error(f"[LOCAL] Job {job_id} failed: {payload}")
+            elif kind == "status":
+                self._set_status(job, payload)
@@ -1,28 +1,188 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import requests
+from pydantic import BaseModel, ValidationError
+from contextlib import asynccontextmanager
+import asyncio
 import json
 import os
 import logging
+import uuid
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from dotenv import load_dotenv
+
+# Read .env before importing the project modules, which read their settings on import
+load_dotenv()
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from database import SessionLocal, engine
+from database import (
+    AsyncBackedSession, AsyncSessionLocal, SessionLocal, async_engine, engine, schema_ready,
+)
+from upstream import UpstreamClient
+from metrics_hub import MetricsHub
+from pubsub import WORKER_ID, Broker, JobRouter, make_broker
+from websocket_handler import handle_render_viewer, render_stats, render_viewers
+from timeseries import SeriesWriter, SERIES_FIELDS, query_series
+from write_buffer import RunUpdateBuffer
+from local_trainer import LocalTrainingPool
+from training_worker import parallel_env_modules
+from admission import AdmissionController, DEFAULT_USER, PRIORITY_CLASSES
+from sweeps import SweepScheduler, asha_rungs, grid_size, parse_space, serialize_sweep, space_samples
+from result_cache import ResultCache, DEFAULT_CACHE_SEED, config_hash
+from instrumentation import (
+    ACTIVE_JOBS, SERIALIZATION_DURATION, WEBSOCKET_VIEWERS, MetricsMiddleware, instrument_database, scrape,
+)
+from artifacts import (
+    ARTIFACT_MAX_UPLOAD_BYTES, FULL, ArtifactRecorder, ArtifactStore, UploadTooLarge, delta_chain, release_blobs,
+    serialize_artifact,
+)
+from export import MEDIA_TYPES, check_format, export_chunks, filename
+from history import (
+    SUMMARY_FIELDS, DETAIL_FIELDS, list_runs, parse_fields, project, serialize_run,
+    etag_for, etag_matches,
+)
 import models
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize database
-models.Base.metadata.create_all(bind=engine)
+# Statement and transaction latency histograms for /metrics
+instrument_database(engine, SessionLocal)
+instrument_database(async_engine.sync_engine, AsyncBackedSession)
 
-load_dotenv()
+# Configuration
+HUGGINGFACE_SPACE_URL = os.getenv("HUGGINGFACE_SPACE_URL", "https://bumie-e-marl-gym.hf.space")
+REQUEST_TIMEOUT = 30
+METRICS_POLL_INTERVAL = float(os.getenv("METRICS_POLL_INTERVAL", "2.0"))
+DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "1.0"))
+DB_FLUSH_MAX_PENDING = int(os.getenv("DB_FLUSH_MAX_PENDING", "200"))
+# Where jobs run by default: "space" (HuggingFace Space proxy) or "local" (worker pool)
+TRAINING_BACKEND = os.getenv("TRAINING_BACKEND", "space")
+TRAINING_BACKENDS = ("space", "local")
+# How local jobs step their env copies; "auto" picks from the measured step cost
+VEC_ENV_MODES = ("auto", "dummy", "subproc", "shm")
+# How agents of a multi-agent env share policies: per name prefix, all, or none
+POLICY_SHARING_MODES = ("group", "shared", "none")
+
+# Leases taken by one worker at a time when several serve the gateway
+SWEEP_LEASE = "lease:sweeps"
+ADMISSION_LEASE = "lease:admission"
+ADOPT_LEASE_TTL = 60.0
+
+# Shared upstream client, metrics hub and local worker pool, created on startup
+broker: Optional[Broker] = None
+job_router: Optional[JobRouter] = None
+upstream: Optional[UpstreamClient] = None
+hub: Optional[MetricsHub] = None
+local_pool: Optional[LocalTrainingPool] = None
+sweep_scheduler: Optional[SweepScheduler] = None
+admission: Optional[AdmissionController] = None
+result_cache: Optional[ResultCache] = None
+artifact_store: Optional[ArtifactStore] = None
+artifact_recorder: Optional[ArtifactRecorder] = None
+
+# Status/metrics updates and the metric history are written behind, in batches
+series_writer = SeriesWriter(SessionLocal)
+write_buffer = RunUpdateBuffer(
+    SessionLocal,
+    series_writer=series_writer,
+    flush_interval=DB_FLUSH_INTERVAL,
+    max_pending=DB_FLUSH_MAX_PENDING,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared resources on startup and release them on shutdown"""
+    global broker, job_router, upstream, hub, local_pool, sweep_scheduler, admission
+    global result_cache, artifact_store, artifact_recorder
+    if not schema_ready():
+        raise RuntimeError("Database schema is missing, run `python -m migrate` from backend/ first")
+    broker = make_broker()
+    job_router = JobRouter(broker, handle=local_job_request)
+    await job_router.start()
+    logger.info(f"[PUBSUB] Worker {WORKER_ID} on {type(broker).__name__}")
+    upstream = UpstreamClient(HUGGINGFACE_SPACE_URL, timeout=REQUEST_TIMEOUT)
+    logger.info(f"[PROXY] Upstream client ready (http2={upstream.http2})")
+    result_cache = ResultCache(
+        download=lambda job_id: upstream.download(f"/download/{admission.backend_id(job_id)}/model"),
+    )
+    result_cache.start()
+    artifact_store = ArtifactStore()
+    artifact_recorder = ArtifactRecorder(
+        artifact_store,
+        SessionLocal,
+        stream_model=lambda job_id: upstream.stream(
+            f"/download/{admission.backend_id(job_id)}/model", chunk_size=artifact_store.chunk_size,
+        ),
+    )
+    artifact_recorder.start()
+    local_pool = LocalTrainingPool(
+        on_update=record_job_update,
+        on_artifact=artifact_recorder.stored,
+        on_frame=publish_local_frame,
+        artifact_dir=artifact_store.directory,
+    )
+    local_pool.start()
+    admission = AdmissionController(
+        SessionLocal,
+        start_job=start_backend_job,
+        poll_job=poll_job_metrics,
+        stop_job=stop_backend_job,
+        record_update=record_job_update,
+        interval=METRICS_POLL_INTERVAL,
+        is_leader=lambda: broker.claim(ADMISSION_LEASE, WORKER_ID, ttl=3 * METRICS_POLL_INTERVAL),
+    )
+    await admission.start(adopt=adopt_queued_job)
+    hub = MetricsHub(
+        fetch_metrics=lambda job_id: job_request("GET", job_id, "metrics"),
+        fetch_final=lambda job_id: job_request("GET", job_id, "status"),
+        on_update=buffer_job_update,
+        interval=METRICS_POLL_INTERVAL,
+        broker=broker,
+    )
+    write_buffer.start()
+
+    # Read by /metrics only when it is scraped
+    ACTIVE_JOBS.labels("local", "running").set_function(lambda: local_pool.stats()["running"])
+    ACTIVE_JOBS.labels("local", "queued").set_function(lambda: local_pool.stats()["queued"])
+    ACTIVE_JOBS.labels("any", "polled").set_function(lambda: hub.active_jobs)
+    ACTIVE_JOBS.labels("any", "admitted").set_function(lambda: admission.stats()["running"])
+    ACTIVE_JOBS.labels("any", "waiting").set_function(lambda: admission.stats()["waiting"])
+    WEBSOCKET_VIEWERS.labels("metrics").set_function(lambda: hub.viewers)
+    WEBSOCKET_VIEWERS.labels("render").set_function(render_viewers)
+
+    sweep_scheduler = SweepScheduler(
+        SessionLocal,
+        launch=launch_sweep_trial,
+        fetch_metrics=poll_job_metrics,
+        stop_job=stop_training_job,
+        interval=METRICS_POLL_INTERVAL,
+        is_leader=lambda: broker.claim(SWEEP_LEASE, WORKER_ID, ttl=3 * METRICS_POLL_INTERVAL),
+    )
+    sweep_scheduler.start()
+    try:
+        yield
+    finally:
+        await sweep_scheduler.close()
+        await admission.close()
+        await hub.close()
+        await local_pool.shutdown()
+        await write_buffer.stop()
+        await upstream.aclose()
+        await job_router.close()
+        await broker.release(SWEEP_LEASE, WORKER_ID)
+        await broker.release(ADMISSION_LEASE, WORKER_ID)
+        await broker.close()
+        await async_engine.dispose()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CORS configuration
 origins = [
@@ -40,11 +200,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "Link"],
 )
-
-# Configuration
-HUGGINGFACE_SPACE_URL = os.getenv("HUGGINGFACE_SPACE_URL", "https://bumie-e-marl-gym.hf.space")
-REQUEST_TIMEOUT = 30
+app.add_middleware(MetricsMiddleware)
 
 def get_db():
     """Database session dependency"""
@@ -54,6 +212,11 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """Async database session dependency, for handlers that shouldn't block the event loop"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # ===== PYDANTIC MODELS =====
 
 class TrainingRequest(BaseModel):
@@ -63,6 +226,29 @@ class TrainingRequest(BaseModel):
     n_steps: int = 2048
     batch_size: int = 64
     n_epochs: int = 10
+    seed: Optional[int] = None
+    n_envs: Optional[int] = None  # parallel env copies, local backend only
+    vec_env: Optional[str] = None  # one of VEC_ENV_MODES, local backend only
+    multi_agent: bool = False  # env_name is a PettingZoo parallel env, local backend only
+    policy_sharing: Optional[str] = None  # one of POLICY_SHARING_MODES, multi-agent only
+    env_kwargs: Optional[Dict[str, Any]] = None  # passed to parallel_env(), multi-agent only
+    checkpoint_every: Optional[int] = None  # timesteps between checkpoints (0 disables), local backend only
+    backend: Optional[str] = None  # "space" or "local", defaults to TRAINING_BACKEND
+    cache: bool = False  # reuse the result of an identical earlier or in-flight run
+    user: Optional[str] = None  # who the job counts against for admission, defaults to DEFAULT_USER
+    priority: str = "interactive"  # one of PRIORITY_CLASSES; sweep trials run as "batch"
+
+class SweepRequest(BaseModel):
+    name: Optional[str] = None
+    method: str = "grid"  # grid, random or bayes
+    space: Dict[str, Any]  # param -> list of values, or {"min", "max", "log", "type"}
+    base: TrainingRequest = TrainingRequest()
+    max_trials: Optional[int] = None  # required for random/bayes, defaults to the grid size
+    max_concurrent: int = 2
+    early_stopping: bool = True  # asynchronous successive halving on mean_reward
+    reduction_factor: int = 3
+    min_timesteps: Optional[int] = None  # first rung, defaults to total_timesteps / reduction_factor^3
+    seed: Optional[int] = None
 
 class EventStatus(BaseModel):
     job_id: str
@@ -73,31 +259,103 @@ async def forward_request(method: str, endpoint: str, data: Optional[Dict] = Non
     """
     Forward request to HuggingFace Space API with error handling
     """
-    url = f"{HUGGINGFACE_SPACE_URL}{endpoint}"
-    headers = {"Content-Type": "application/json"}
-    
+    logger.info(f"[PROXY] {method} {endpoint}")
+    return await upstream.request(method, endpoint, data, timeout=timeout)
+
+async def job_request(method: str, job_id: str, action: str):
+    """
+    Run a status/metrics/stop call on the worker holding the job, which may
+    be another gateway worker process
+    """
+    owner = await job_router.owner(job_id)
+    if owner is not None:
+        data = await job_router.call(owner, method, job_id, action)
+        if data is not None:
+            return data
+        logger.warning(f"[PUBSUB] Worker {owner} holding job {job_id} is gone, handling it here")
+    return await local_job_request(method, job_id, action)
+
+async def local_job_request(method: str, job_id: str, action: str):
+    """
+    Run a status/metrics/stop call against whichever backend owns the job,
+    or answer it from the admission queue while the job is waiting
+    """
+    if local_pool.owns(job_id):
+        return getattr(local_pool, action)(job_id)
+    if admission.holds(job_id):
+        if action != "stop":
+            return admission.queued_payload(job_id)
+        result = admission.cancel(job_id)
+        if result is not None:
+            return result
+        # Started by the admitting worker meanwhile, stop it wherever it runs now
+        return await job_request(method, job_id, action)
+    if action == "render":
+        # Only local jobs are asked for frames, and the Space has no such call
+        raise HTTPException(status_code=404, detail=f"Job {job_id} is not running on a local worker")
+    run = await asyncio.to_thread(stored_local_run, job_id)
+    if run is not None:
+        # Finished long enough ago for the pool to forget it
+        if action == "stop":
+            raise HTTPException(status_code=409, detail=f"Job {job_id} is already {run.status}")
+        return stored_job_payload(run)
+
+    backend_job_id = admission.backend_id(job_id)
+    data = await forward_request(method, f"/train/{backend_job_id}/{action}")
+    if backend_job_id != job_id and isinstance(data, dict) and "job_id" in data:
+        data = {**data, "job_id": job_id}
+    return data
+
+def stored_local_run(job_id: str) -> Optional[models.TrainingRun]:
+    """The TrainingRun of a local job, None for Space or unknown jobs"""
+    db = SessionLocal()
     try:
-        logger.info(f"[PROXY] {method} {endpoint}")
-        
-        if method == "POST":
-            response = requests.post(url, json=data, headers=headers, timeout=timeout)
-        elif method == "GET":
-            response = requests.get(url, json=data, headers=headers, timeout=timeout)
-        else:
-            raise ValueError(f"Unsupported HTTP method: {method}")
-        
-        response.raise_for_status()
-        return response.json()
-    
-    except requests.exceptions.Timeout:
-        logger.error(f"[PROXY] Timeout connecting to {endpoint}")
-        raise HTTPException(status_code=504, detail="Backend service timeout")
-    except requests.exceptions.ConnectionError:
-        logger.error(f"[PROXY] Connection error to {endpoint}")
-        raise HTTPException(status_code=503, detail="Backend service unavailable")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"[PROXY] Request error: {e}")
-        raise HTTPException(status_code=502, detail=f"Backend error: {str(e)}")
+        run = db.query(models.TrainingRun).filter(models.TrainingRun.job_id == job_id).first()
+    finally:
+        db.close()
+    if run is None or (run.config or {}).get("backend") != "local":
+        return None
+    return run
+
+def stored_job_payload(run: models.TrainingRun) -> Dict[str, Any]:
+    """A status payload, in the Space's shape, from a job's TrainingRun row"""
+    data = {
+        "job_id": run.job_id,
+        "status": run.status,
+        "elapsed_time": (run.updated_at - run.created_at).total_seconds(),
+        "metrics": run.metrics or {},
+    }
+    if run.results:
+        data["results"] = run.results
+    return data
+
+def record_job_update(job_id: str, data: Dict[str, Any]):
+    """
+    Queue a status/metrics payload for the next batched write and let the
+    result cache, artifact store and admission queue see it
+    """
+    write_buffer.put(job_id, data)
+    result_cache.job_update(job_id, data)
+    artifact_recorder.job_update(job_id, data)
+    admission.job_update(job_id, data)
+
+async def buffer_job_update(job_id: str, data: Dict[str, Any]):
+    """Queue a payload from the metrics hub for the next batched write"""
+    record_job_update(job_id, data)
+
+async def adopt_queued_job(job_id: str) -> bool:
+    """
+    Whether this worker takes over a local job found running on startup,
+    which is then marked lost: yes unless the worker running it is still alive
+    """
+    owner = await job_router.owner(job_id)
+    if owner is not None and await job_router.alive(owner):
+        return False
+    # Workers starting together must not both take the job
+    if not await broker.claim(f"lease:adopt:{job_id}", WORKER_ID, ttl=ADOPT_LEASE_TTL):
+        return False
+    await job_router.claim(job_id)
+    return True
 
 # ===== REST ENDPOINTS =====
 
@@ -110,59 +368,219 @@ def read_root():
         "backend": HUGGINGFACE_SPACE_URL
     }
 
-@app.post("/train")
-async def start_training(request: TrainingRequest, db: Session = Depends(get_db)):
+def validation_detail(error: ValidationError) -> str:
+    """A pydantic error on one line, e.g. n_steps: Input should be a valid integer"""
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+
+def validate_training_request(request: TrainingRequest) -> str:
+    """Reject a training request the backends can't run (400), returning its backend"""
+    backend = request.backend or TRAINING_BACKEND
+    if backend not in TRAINING_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"Unknown backend '{backend}', expected one of {list(TRAINING_BACKENDS)}")
+    if request.vec_env is not None and request.vec_env not in VEC_ENV_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown vec_env '{request.vec_env}', expected one of {list(VEC_ENV_MODES)}")
+    if request.n_envs is not None and request.n_envs < 1:
+        raise HTTPException(status_code=400, detail="n_envs must be at least 1")
+    if request.multi_agent and backend != "local":
+        raise HTTPException(status_code=400, detail="Multi-agent training is only available on the local backend")
+    if request.multi_agent:
+        try:
+            parallel_env_modules(request.env_name)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if request.policy_sharing is not None and request.policy_sharing not in POLICY_SHARING_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown policy_sharing '{request.policy_sharing}', expected one of {list(POLICY_SHARING_MODES)}")
+    if request.checkpoint_every is not None and request.checkpoint_every < 0:
+        raise HTTPException(status_code=400, detail="checkpoint_every must not be negative")
+    if request.priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail=f"Unknown priority '{request.priority}', expected one of {list(PRIORITY_CLASSES)}")
+    return backend
+
+async def launch_training(request: TrainingRequest, db: Session) -> Dict[str, Any]:
     """
-    Start a new training job on the HuggingFace Space
+    Start a job on the chosen backend and record its TrainingRun row
     """
+    backend = validate_training_request(request)
+    user = request.user or DEFAULT_USER
+
+    # Cached runs need a fixed seed to be reproducible
+    seed = request.seed
+    if request.cache and seed is None:
+        seed = DEFAULT_CACHE_SEED
+
+    # Prepare payload for the training backend
+    payload = {
+        "env_name": request.env_name,
+        "total_timesteps": request.total_timesteps,
+        "learning_rate": request.learning_rate,
+        "n_steps": request.n_steps,
+        "batch_size": request.batch_size,
+        "n_epochs": request.n_epochs,
+        "seed": seed,
+    }
+    for field in ("n_envs", "vec_env", "multi_agent", "policy_sharing", "env_kwargs", "checkpoint_every"):
+        value = getattr(request, field)
+        if value is not None and value is not False:
+            payload[field] = value
+    if seed is None:
+        del payload["seed"]
+    key = config_hash({**payload, "backend": backend})
+
+    if not request.cache:
+        return await submit_training(payload, backend, key, db, user, request.priority)
+
+    async with result_cache.launching(key):
+        kind, run = await result_cache.lookup(db, key)
+        if kind == "hit":
+            logger.info(f"[CACHE] Serving {request.env_name} from completed job {run.job_id}")
+            return {
+                "message": "Training result served from cache",
+                "job_id": run.job_id,
+                "run_id": run.id,
+                "status": "completed",
+                "cached": True,
+                "backend": backend,
+                "config": payload,
+                "config_hash": key,
+                "results": run.results,
+                "model_url": f"/cache/{key}/model",
+            }
+        if kind == "join":
+            logger.info(f"[CACHE] Joining in-flight job {run.job_id} for {request.env_name}")
+            return {
+                "message": "Joined an identical training job already in progress",
+                "job_id": run.job_id,
+                "run_id": run.id,
+                "status": run.status,
+                "joined": True,
+                "backend": backend,
+                "config": payload,
+                "config_hash": key,
+            }
+
+        result = await submit_training(payload, backend, key, db, user, request.priority)
+        result_cache.track(result["job_id"], key)
+        return result
+
+async def start_backend_job(payload: Dict[str, Any], backend: str, job_id: Optional[str] = None) -> str:
+    """
+    Start a job on its backend and return the backend's job_id. Local jobs
+    take `job_id` as theirs when given; the Space always picks its own.
+    A local payload's `resume` is the delta chain of the checkpoint it resumes.
+    """
+    if backend == "local":
+        config = {key: value for key, value in payload.items() if key != "resume"}
+        job_id = local_pool.submit(config, job_id=job_id, resume=payload.get("resume"))
+        await job_router.claim(job_id)
+        return job_id
+
+    # Forward to HuggingFace Space
+    result = await forward_request("POST", "/train", payload)
+    backend_job_id = result.get("job_id")
+    if not backend_job_id:
+        raise HTTPException(status_code=500, detail="No job_id returned from backend")
+    return backend_job_id
+
+async def stop_backend_job(backend: str, backend_job_id: str):
+    """Stop a job by its backend's job_id, bypassing the admission queue"""
+    if backend == "local":
+        return local_pool.stop(backend_job_id)
+    return await forward_request("POST", f"/train/{backend_job_id}/stop")
+
+async def submit_training(payload: Dict[str, Any], backend: str, key: str, db: Session,
+                          user: str, priority: str) -> Dict[str, Any]:
+    """
+    Start a validated payload on its backend, or queue it when admission
+    control has no slot for it, and record the TrainingRun row
+    """
+    started = admission.reserve(user, priority)
+    added = False
     try:
-        # Prepare payload for HuggingFace Space
-        payload = {
-            "env_name": request.env_name,
-            "total_timesteps": request.total_timesteps,
-            "learning_rate": request.learning_rate,
-            "n_steps": request.n_steps,
-            "batch_size": request.batch_size,
-            "n_epochs": request.n_epochs,
-        }
-        
-        # Forward to HuggingFace Space
-        result = await forward_request("POST", "/train", payload)
-        job_id = result.get("job_id")
-        
-        if not job_id:
-            raise HTTPException(status_code=500, detail="No job_id returned from backend")
-        
+        if started:
+            job_id = await start_backend_job(payload, backend)
+        else:
+            # The backend's id is only known once the job is admitted
+            job_id = str(uuid.uuid4())
+
         # Create training run record in database
         training_run = models.TrainingRun(
             job_id=job_id,
-            environment=request.env_name,
-            agent="PPO",
+            environment=payload["env_name"],
+            agent="IPPO" if payload.get("multi_agent") else "PPO",
             episodes=0,
             reward=0.0,
             status="queued",
             metrics={},
-            config={
-                "env_name": request.env_name,
-                "total_timesteps": request.total_timesteps,
-                "learning_rate": request.learning_rate,
-                "n_steps": request.n_steps,
-                "batch_size": request.batch_size,
-                "n_epochs": request.n_epochs,
-            },
+            config={**payload, "backend": backend},
+            config_hash=key,
         )
         db.add(training_run)
         db.commit()
         db.refresh(training_run)
-        
-        logger.info(f"[TRAIN] Started job {job_id} for environment {request.env_name}")
-        
-        return {
-            "message": "Training job started successfully!",
-            "job_id": job_id,
-            "status": "queued",
-            "config": payload,
-        }
+
+        admission.add(db, job_id, training_run.id, user, priority, backend, payload, key, started)
+        added = True
+        if not started:
+            # Status and stop calls come here until the job is admitted
+            await job_router.claim(job_id)
+    finally:
+        if started and not added:
+            admission.release(user)
+
+    result = {
+        "message": "Training job started successfully!",
+        "job_id": job_id,
+        "run_id": training_run.id,
+        "status": "queued",
+        "backend": backend,
+        "user": user,
+        "priority": priority,
+        "config": payload,
+        "config_hash": key,
+    }
+    if started:
+        logger.info(f"[TRAIN] Started job {job_id} for environment {payload['env_name']} ({backend})")
+    else:
+        result["message"] = "Training job queued until a slot is free"
+        result["queue_position"], result["eta_seconds"] = admission.position(job_id)
+        logger.info(f"[TRAIN] Queued job {job_id} for environment {payload['env_name']} ({backend})")
+    return result
+
+async def launch_sweep_trial(config: Dict[str, Any]):
+    """Launch one sweep trial, returning its job_id and TrainingRun id"""
+    db = SessionLocal()
+    try:
+        try:
+            request = TrainingRequest(**{**config, "priority": "batch"})
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=validation_detail(e))
+        result = await launch_training(request, db)
+    finally:
+        db.close()
+    return result["job_id"], result["run_id"]
+
+async def poll_job_metrics(job_id: str):
+    """Fetch a job's metrics and queue them for the TrainingRun row"""
+    data = await job_request("GET", job_id, "metrics")
+    record_job_update(job_id, data)
+    return data
+
+async def stop_training_job(job_id: str):
+    """Stop a job on its backend and record the stop"""
+    result = await job_request("POST", job_id, "stop")
+    
+    # Local jobs report "stopped" themselves once the worker has exited
+    if not local_pool.owns(job_id):
+        record_job_update(job_id, {"status": "stopped"})
+    return result
+
+@app.post("/train")
+async def start_training(request: TrainingRequest, db: Session = Depends(get_db)):
+    """
+    Start a new training job on the HuggingFace Space or the local worker pool
+    """
+    try:
+        return await launch_training(request, db)
     
     except HTTPException:
         raise
@@ -171,30 +589,15 @@ async def start_training(request: TrainingRequest, db: Session = Depends(get_db)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/train/{job_id}/status")
-async def get_training_status(job_id: str, db: Session = Depends(get_db)):
+async def get_training_status(job_id: str):
     """
     Get full training status from backend and update database
     """
     try:
-        # Forward to HuggingFace Space
-        data = await forward_request("GET", f"/train/{job_id}/status")
+        data = await job_request("GET", job_id, "status")
         
-        # Update database
-        training_run = db.query(models.TrainingRun).filter(
-            models.TrainingRun.job_id == job_id
-        ).first()
-        
-        if training_run:
-            training_run.status = data.get("status", "unknown")
-            training_run.episodes = data.get("metrics", {}).get("episodes", training_run.episodes)
-            training_run.reward = data.get("metrics", {}).get("mean_reward", training_run.reward)
-            training_run.metrics = data.get("metrics", {})
-            
-            if "results" in data:
-                training_run.results = data.get("results")
-            
-            db.commit()
-            db.refresh(training_run)
+        # Update database on the next batched flush
+        record_job_update(job_id, data)
         
         return data
     
@@ -205,27 +608,20 @@ async def get_training_status(job_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/train/{job_id}/metrics")
-async def get_training_metrics(job_id: str, db: Session = Depends(get_db)):
+async def get_training_metrics(job_id: str):
     """
     Lightweight endpoint for polling real-time metrics
     """
     try:
-        # Forward to HuggingFace Space
-        data = await forward_request("GET", f"/train/{job_id}/metrics")
-        
-        # Update database with latest metrics
-        training_run = db.query(models.TrainingRun).filter(
-            models.TrainingRun.job_id == job_id
-        ).first()
+        # Serve from the hub when another viewer is already polling this job
+        data = hub.snapshot(job_id)
+        if data is not None:
+            return data
+
+        data = await job_request("GET", job_id, "metrics")
         
-        if training_run:
-            training_run.status = data.get("status", training_run.status)
-            metrics = data.get("metrics", {})
-            training_run.episodes = metrics.get("episodes", training_run.episodes)
-            training_run.reward = metrics.get("mean_reward", training_run.reward)
-            training_run.metrics = metrics
-            
-            db.commit()
+        # Update database with latest metrics on the next batched flush
+        record_job_update(job_id, data)
         
         return data
     
@@ -236,176 +632,637 @@ async def get_training_metrics(job_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/train/{job_id}/stop")
-async def stop_training(job_id: str, db: Session = Depends(get_db)):
+async def stop_training(job_id: str):
     """
     Stop a training job
     """
     try:
-        # Forward to HuggingFace Space
-        result = await forward_request("POST", f"/train/{job_id}/stop")
+        result = await stop_training_job(job_id)
         
-        # Update database
-        training_run = db.query(models.TrainingRun).filter(
+        logger.info(f"[STOP] Stopped job {job_id}")
+        return result
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[STOP] Error stopping job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/train/{job_id}/resume")
+async def resume_training(job_id: str, db: Session = Depends(get_db)):
+    """
+    Restart a stopped or failed local job from its latest checkpoint, on the
+    same training run
+    """
+    try:
+        run = db.query(models.TrainingRun).filter(
             models.TrainingRun.job_id == job_id
         ).first()
         
-        if training_run:
-            training_run.status = "stopped"
-            db.commit()
-        
-        logger.info(f"[STOP] Stopped job {job_id}")
+        if not run:
+            raise HTTPException(status_code=404, detail=f"Training run for job {job_id} not found")
+        config = dict(run.config or {})
+        if config.pop("backend", None) != "local":
+            raise HTTPException(status_code=400, detail="Only jobs on the local backend can be resumed")
+        if run.status == "completed":
+            raise HTTPException(status_code=409, detail=f"Job {job_id} has already completed")
+        if job_id in admission.entries:
+            raise HTTPException(status_code=409, detail=f"Job {job_id} is still {admission.entries[job_id].state}")
+
+        checkpoint = db.query(models.Artifact).filter(
+            models.Artifact.job_id == job_id,
+            models.Artifact.kind == "checkpoint",
+        ).order_by(models.Artifact.timestep.desc(), models.Artifact.id.desc()).first()
+        if checkpoint is None:
+            raise HTTPException(status_code=409, detail=f"Job {job_id} has no checkpoint to resume from")
+
+        # Resumed jobs go through admission like new ones, as their original user and priority
+        queued = db.query(models.QueuedJob).filter(models.QueuedJob.job_id == job_id).first()
+        user = queued.user if queued is not None else DEFAULT_USER
+        priority = queued.priority if queued is not None else "interactive"
+        payload = {**config, "resume": delta_chain(db, checkpoint)}
+        started = admission.reserve(user, priority)
+        added = False
+        try:
+            if started:
+                await start_backend_job(payload, "local", job_id)
+            admission.add(db, job_id, run.id, user, priority, "local", payload, run.config_hash, started, resumed=True)
+            added = True
+            if not started:
+                await job_router.claim(job_id)
+        finally:
+            if started and not added:
+                admission.release(user)
+
+        # The metric history continues after the last point already recorded
+        last_timestep = db.query(func.max(models.MetricPoint.timestep)).filter(
+            models.MetricPoint.run_id == run.id
+        ).scalar()
+        if last_timestep is not None:
+            series_writer.continue_after(run.id, last_timestep)
+        record_job_update(job_id, {"status": "queued"})
+
+        logger.info(f"[RESUME] Resuming job {job_id} from timestep {checkpoint.timestep}")
+        result = {
+            "message": f"Resuming job {job_id} from timestep {checkpoint.timestep}",
+            "job_id": job_id,
+            "run_id": run.id,
+            "status": "queued",
+            "resumed_from": checkpoint.timestep,
+        }
+        if not started:
+            result["queue_position"], result["eta_seconds"] = admission.position(job_id)
         return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[RESUME] Error resuming job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.websocket("/ws/train/{job_id}/metrics")
+async def stream_training_metrics(websocket: WebSocket, job_id: str):
+    """
+    Push metrics for a job to the browser as they arrive from the hub
+    """
+    await websocket.accept()
+    queue = await hub.subscribe(job_id)
+    logger.info(f"[HUB] Viewer joined job {job_id} ({hub.viewers} viewers total)")
     
+    try:
+        while True:
+            data = await queue.get()
+            await websocket.send_json(data)
+            if data.get("status") in ("completed", "failed", "stopped"):
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await hub.unsubscribe(job_id, queue)
+        logger.info(f"[HUB] Viewer left job {job_id}")
+
+async def publish_local_frame(job_id: str, jpeg: bytes):
+    """Hand a local job's preview frame to the viewers on every worker"""
+    await broker.publish(f"frames:{job_id}", jpeg)
+
+def job_backend(job_id: str) -> Optional[str]:
+    """The backend a job was submitted to, None for unknown jobs"""
+    if local_pool.owns(job_id):
+        return "local"
+    db = SessionLocal()
+    try:
+        row = db.query(models.TrainingRun.config).filter(models.TrainingRun.job_id == job_id).first()
+    finally:
+        db.close()
+    return (row.config or {}).get("backend") if row is not None else None
+
+@app.websocket("/ws/render/{job_id}")
+async def stream_render_frames(websocket: WebSocket, job_id: str):
+    """
+    Stream environment frames for a job as binary JPEG messages, shared by all
+    viewers: relayed from the Space, or rendered by the local worker running it
+    """
+    request_frames = None
+    if await asyncio.to_thread(job_backend, job_id) == "local":
+        request_frames = lambda: job_request("POST", job_id, "render")
+    await handle_render_viewer(websocket, job_id, HUGGINGFACE_SPACE_URL, broker,
+                               resolve_job_id=admission.backend_id, request_frames=request_frames)
+
+# ===== SWEEP ENDPOINTS =====
+
+@app.post("/sweeps")
+async def create_sweep(request: SweepRequest, db: Session = Depends(get_db)):
+    """
+    Start a hyperparameter sweep; trials are launched in the background
+    """
+    try:
+        space = parse_space(request.space, request.method)
+        max_trials = request.max_trials
+        if request.method == "grid":
+            max_trials = min(max_trials or grid_size(space), grid_size(space))
+        elif not max_trials:
+            raise HTTPException(status_code=400, detail=f"max_trials is required for {request.method} search")
+        if max_trials < 1 or request.max_concurrent < 1:
+            raise HTTPException(status_code=400, detail="max_trials and max_concurrent must be at least 1")
+        if request.reduction_factor < 2:
+            raise HTTPException(status_code=400, detail="reduction_factor must be at least 2")
+        # Trials run the base config with the space's values on top
+        base_config = request.base.model_dump(exclude_none=True)
+        for params in space_samples(space):
+            try:
+                trial = TrainingRequest(**{**base_config, **params})
+            except ValidationError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid trial config {params}: {validation_detail(e)}")
+            validate_training_request(trial)
+
+        early_stopping = {}
+        if request.early_stopping:
+            early_stopping = {
+                "reduction_factor": request.reduction_factor,
+                "rungs": asha_rungs(request.base.total_timesteps, request.reduction_factor, request.min_timesteps),
+            }
+
+        sweep = models.Sweep(
+            name=request.name,
+            method=request.method,
+            status="running",
+            space=space,
+            base_config=base_config,
+            max_trials=max_trials,
+            max_concurrent=request.max_concurrent,
+            seed=request.seed,
+            early_stopping=early_stopping,
+        )
+        db.add(sweep)
+        db.commit()
+        db.refresh(sweep)
+        sweep_scheduler.wake()
+
+        logger.info(f"[SWEEP] Created sweep {sweep.id} ({request.method}, {max_trials} trials)")
+        return serialize_sweep(sweep, [])
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"[STOP] Error stopping job {job_id}: {e}")
+        logger.error(f"[SWEEP] Error creating sweep: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/sweeps")
+async def list_sweeps(limit: int = Query(50, ge=1, le=500), db: Session = Depends(get_db)):
+    """
+    List sweeps newest first, with trial counts and the best config so far
+    """
+    try:
+        sweeps = db.query(models.Sweep).order_by(models.Sweep.created_at.desc()).limit(limit).all()
+        trials = db.query(models.SweepTrial).filter(
+            models.SweepTrial.sweep_id.in_([sweep.id for sweep in sweeps])
+        ).all()
+        by_sweep: Dict[int, List[models.SweepTrial]] = {}
+        for trial in trials:
+            by_sweep.setdefault(trial.sweep_id, []).append(trial)
+        return [serialize_sweep(sweep, by_sweep.get(sweep.id, []), include_trials=False) for sweep in sweeps]
+    except Exception as e:
+        logger.error(f"[SWEEP] Error listing sweeps: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/sweeps/{sweep_id}")
+async def get_sweep(sweep_id: int, db: Session = Depends(get_db)):
+    """
+    Get a sweep with all its trials and the best config so far
+    """
+    try:
+        sweep = db.query(models.Sweep).filter(models.Sweep.id == sweep_id).first()
+        if not sweep:
+            raise HTTPException(status_code=404, detail=f"Sweep {sweep_id} not found")
+        trials = db.query(models.SweepTrial).filter(models.SweepTrial.sweep_id == sweep_id).all()
+        return serialize_sweep(sweep, trials)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[SWEEP] Error fetching sweep {sweep_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/sweeps/{sweep_id}/stop")
+async def stop_sweep(sweep_id: int, db: Session = Depends(get_db)):
+    """
+    Stop a sweep; its running trials are stopped on the scheduler's next tick
+    """
+    try:
+        sweep = db.query(models.Sweep).filter(models.Sweep.id == sweep_id).first()
+        if not sweep:
+            raise HTTPException(status_code=404, detail=f"Sweep {sweep_id} not found")
+        if sweep.status == "running":
+            sweep.status = "stopping"
+            db.commit()
+            sweep_scheduler.wake()
+        trials = db.query(models.SweepTrial).filter(models.SweepTrial.sweep_id == sweep_id).all()
+        logger.info(f"[SWEEP] Stopping sweep {sweep_id}")
+        return serialize_sweep(sweep, trials)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[SWEEP] Error stopping sweep {sweep_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ===== RESULT CACHE ENDPOINTS =====
+
+@app.get("/cache/{config_hash}/model")
+async def download_cached_model(config_hash: str):
+    """
+    Download the model of a cached training result
+    """
+    path = result_cache.artifact_path(config_hash)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"No cached model for {config_hash}")
+    return FileResponse(path, filename=f"{config_hash[:12]}{os.path.splitext(path)[1]}")
+
+# ===== ARTIFACT ENDPOINTS =====
+
+@app.post("/artifacts")
+async def upload_artifact(request: Request, name: Optional[str] = None, job_id: Optional[str] = None,
+                          db: Session = Depends(get_db)):
+    """
+    Upload a file to the artifact store, streamed to disk as it arrives
+    """
+    try:
+        declared = request.headers.get("content-length")
+        if ARTIFACT_MAX_UPLOAD_BYTES and declared and declared.isdigit() and int(declared) > ARTIFACT_MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {ARTIFACT_MAX_UPLOAD_BYTES} bytes")
+        try:
+            blob, size = await artifact_store.put_stream(request.stream(), max_bytes=ARTIFACT_MAX_UPLOAD_BYTES)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        artifact = models.Artifact(
+            job_id=job_id,
+            kind="upload",
+            name=name or blob,
+            digest=blob,
+            size=size,
+            blob=blob,
+            stored_size=size,
+            encoding=FULL,
+        )
+        db.add(artifact)
+        db.commit()
+        db.refresh(artifact)
+        logger.info(f"[ARTIFACT] Stored upload {artifact.name} ({size} bytes)")
+        return serialize_artifact(artifact)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[ARTIFACT] Error storing upload: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/artifacts/{digest}")
+async def download_artifact(digest: str, db: Session = Depends(get_db)):
+    """
+    Download an artifact; supports Range requests. Delta-encoded checkpoints
+    are rebuilt into a temporary file first.
+    """
+    try:
+        artifact = db.query(models.Artifact).filter(models.Artifact.digest == digest).first()
+        if not artifact:
+            raise HTTPException(status_code=404, detail=f"Artifact {digest} not found")
+
+        filename = artifact.name or digest
+        if artifact.encoding == FULL:
+            # A digest always names the same bytes
+            return FileResponse(artifact_store.path(artifact.blob), filename=filename,
+                                headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+        chain = delta_chain(db, artifact)
+        path = await run_in_threadpool(artifact_store.materialize, chain)
+        return FileResponse(path, filename=filename, background=BackgroundTask(os.remove, path))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[ARTIFACT] Error serving artifact {digest}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ===== TRAINING HISTORY ENDPOINTS =====
 
+def run_list_response(request: Request, runs: List[Dict[str, Any]], next_cursor: Optional[str]):
+    """JSON list response with ETag revalidation and a next-page cursor header"""
+    with SERIALIZATION_DURATION.labels("training_history").time():
+        etag = etag_for({"runs": runs, "next": next_cursor})
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+            headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(runs, headers=headers)
+
 @app.get("/api/training-history")
-async def get_training_history(limit: int = 100, db: Session = Depends(get_db)):
-    """Get all training runs with optional pagination"""
+async def get_training_history(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    environment: Optional[str] = None,
+    status: Optional[str] = None,
+    agent: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Get training runs newest first, paginated with the X-Next-Cursor header.
+    JSON columns (metrics, config, results) are only loaded when listed in `fields`.
+    """
     try:
-        runs = db.query(models.TrainingRun).order_by(
-            models.TrainingRun.created_at.desc()
-        ).limit(limit).all()
-        
-        return [
-            {
-                "id": run.id,
-                "job_id": run.job_id,
-                "environment": run.environment,
-                "agent": run.agent,
-                "episodes": run.episodes,
-                "status": run.status,
-                "reward": run.reward,
-                "created_at": run.created_at.isoformat(),
-                "metrics": run.metrics,
-                "config": run.config,
-                "results": run.results,
-            }
-            for run in runs
-        ]
+        runs, next_cursor = await list_runs(
+            db, parse_fields(fields, SUMMARY_FIELDS), limit, cursor,
+            environment=environment, status=status, agent=agent,
+        )
+        return run_list_response(request, runs, next_cursor)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"[HISTORY] Error fetching training history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/training-history/latest")
-async def get_latest_training_history(limit: int = 5, db: Session = Depends(get_db)):
+async def get_latest_training_history(
+    request: Request,
+    limit: int = Query(5, ge=1, le=100),
+    fields: Optional[str] = None,
+    environment: Optional[str] = None,
+    status: Optional[str] = None,
+    agent: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
     """Get the latest N training runs"""
     try:
-        runs = db.query(models.TrainingRun).order_by(
-            models.TrainingRun.created_at.desc()
-        ).limit(limit).all()
-        
-        return [
-            {
-                "id": run.id,
-                "job_id": run.job_id,
-                "environment": run.environment,
-                "agent": run.agent,
-                "episodes": run.episodes,
-                "status": run.status,
-                "reward": run.reward,
-                "created_at": run.created_at.isoformat(),
-                "metrics": run.metrics,
-                "config": run.config,
-                "results": run.results,
-            }
-            for run in runs
-        ]
+        runs, _ = await list_runs(
+            db, parse_fields(fields, SUMMARY_FIELDS), limit,
+            environment=environment, status=status, agent=agent,
+        )
+        return run_list_response(request, runs, None)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"[HISTORY] Error fetching latest training history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/export/{table}")
+async def export_training_history(
+    table: str,
+    fmt: str = Query("ndjson", alias="format"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    environment: Optional[str] = None,
+    status: Optional[str] = None,
+    agent: Optional[str] = None,
+):
+    """
+    Stream `runs` or their per-step `metrics` for offline analysis, as
+    NDJSON, Parquet or an Arrow IPC stream, for runs created in [since, until)
+    """
+    try:
+        check_format(table, fmt)
+        if table == "metrics":
+            # Make sure recently buffered points are included
+            await run_in_threadpool(write_buffer.flush)
+        chunks = export_chunks(
+            AsyncSessionLocal, table, fmt,
+            since=since, until=until, environment=environment, status=status, agent=agent,
+        )
+        return StreamingResponse(chunks, media_type=MEDIA_TYPES[fmt], headers={
+            "Content-Disposition": f'attachment; filename="{filename(table, fmt)}"',
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[EXPORT] Error exporting {table}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/training-history/{run_id}")
-async def get_training_run(run_id: int, db: Session = Depends(get_db)):
+async def get_training_run(run_id: int, fields: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
     """Get a specific training run by ID"""
     try:
-        run = db.query(models.TrainingRun).filter(
+        selected = parse_fields(fields, DETAIL_FIELDS)
+        result = await db.execute(project(selected).where(
             models.TrainingRun.id == run_id
-        ).first()
+        ))
+        run = result.first()
         
         if not run:
             raise HTTPException(status_code=404, detail=f"Training run {run_id} not found")
         
-        return {
-            "id": run.id,
-            "job_id": run.job_id,
-            "environment": run.environment,
-            "agent": run.agent,
-            "episodes": run.episodes,
-            "status": run.status,
-            "reward": run.reward,
-            "created_at": run.created_at.isoformat(),
-            "metrics": run.metrics,
-            "config": run.config,
-            "results": run.results,
-        }
+        return serialize_run(run, selected)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"[HISTORY] Error fetching training run {run_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/training-history/job/{job_id}")
-async def get_training_run_by_job_id(job_id: str, db: Session = Depends(get_db)):
+async def get_training_run_by_job_id(job_id: str, fields: Optional[str] = None,
+                                     db: AsyncSession = Depends(get_async_db)):
     """Get a specific training run by job_id"""
     try:
-        run = db.query(models.TrainingRun).filter(
+        selected = parse_fields(fields, DETAIL_FIELDS)
+        result = await db.execute(project(selected).where(
             models.TrainingRun.job_id == job_id
-        ).first()
+        ))
+        run = result.first()
         
         if not run:
             raise HTTPException(status_code=404, detail=f"Training run with job_id {job_id} not found")
         
-        return {
-            "id": run.id,
-            "job_id": run.job_id,
-            "environment": run.environment,
-            "agent": run.agent,
-            "episodes": run.episodes,
-            "status": run.status,
-            "reward": run.reward,
-            "created_at": run.created_at.isoformat(),
-            "metrics": run.metrics,
-            "config": run.config,
-            "results": run.results,
-        }
+        return serialize_run(run, selected)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"[HISTORY] Error fetching training run by job_id: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/training-history/{run_id}/series")
+async def get_training_series(
+    run_id: int,
+    field: str = "reward",
+    points: int = Query(500, ge=3, le=10000),
+    method: str = "lttb",
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get a run's metric history, downsampled server-side for charting"""
+    if field not in SERIES_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Unknown field {field}, expected one of {list(SERIES_FIELDS)}")
+    if method not in ("lttb", "minmax"):
+        raise HTTPException(status_code=400, detail="method must be 'lttb' or 'minmax'")
+
+    try:
+        exists = await db.scalar(select(models.TrainingRun.id).where(
+            models.TrainingRun.id == run_id
+        ))
+        
+        if not exists:
+            raise HTTPException(status_code=404, detail=f"Training run {run_id} not found")
+        
+        # Make sure recently buffered points are visible
+        await run_in_threadpool(write_buffer.flush)
+        return await db.run_sync(query_series, run_id, field, points, method)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[HISTORY] Error fetching series for training run {run_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/training-history/{run_id}/artifacts")
+async def get_training_artifacts(run_id: int, db: AsyncSession = Depends(get_async_db)):
+    """List a run's final model and checkpoints"""
+    try:
+        result = await db.execute(select(models.TrainingRun.job_id).where(
+            models.TrainingRun.id == run_id
+        ))
+        run = result.first()
+        
+        if not run:
+            raise HTTPException(status_code=404, detail=f"Training run {run_id} not found")
+        
+        artifacts = await db.scalars(select(models.Artifact).where(
+            models.Artifact.job_id == run.job_id
+        ).order_by(models.Artifact.created_at, models.Artifact.id))
+        return [serialize_artifact(artifact) for artifact in artifacts]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[HISTORY] Error fetching artifacts for training run {run_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/training-history/{run_id}/replays")
+async def get_training_replays(run_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Indexes of a run's recorded best and worst episodes. `url` serves the
+    frames with Range support; each index entry is a frame's byte offset,
+    size (0 repeats the previous frame) and whether it is a keyframe.
+    """
+    try:
+        result = await db.execute(select(models.TrainingRun.job_id).where(
+            models.TrainingRun.id == run_id
+        ))
+        run = result.first()
+        
+        if not run:
+            raise HTTPException(status_code=404, detail=f"Training run {run_id} not found")
+        
+        indexes = await db.scalars(select(models.Artifact).where(
+            models.Artifact.job_id == run.job_id,
+            models.Artifact.kind == "replay-index",
+        ).order_by(models.Artifact.created_at, models.Artifact.id))
+        replays = []
+        for artifact in indexes:
+            index = json.loads(await asyncio.to_thread(artifact_store.read, artifact.blob))
+            index["url"] = f"/artifacts/{index['video']}"
+            replays.append(index)
+        return replays
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[HISTORY] Error fetching replays for training run {run_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.delete("/api/training-history/{run_id}")
-async def delete_training_run(run_id: int, db: Session = Depends(get_db)):
+async def delete_training_run(run_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete a training run from history"""
     try:
-        run = db.query(models.TrainingRun).filter(
-            models.TrainingRun.id == run_id
-        ).first()
+        run = await db.get(models.TrainingRun, run_id)
         
         if not run:
             raise HTTPException(status_code=404, detail=f"Training run {run_id} not found")
         
-        db.delete(run)
-        db.commit()
+        write_buffer.forget(run.job_id)
+        series_writer.forget(run_id)
+        await db.execute(delete(models.MetricPoint).where(
+            models.MetricPoint.run_id == run_id
+        ))
+        blobs = list(await db.scalars(select(models.Artifact.blob).where(models.Artifact.job_id == run.job_id)))
+        await db.execute(delete(models.Artifact).where(models.Artifact.job_id == run.job_id))
+        await db.delete(run)
+        await db.commit()
+        await db.run_sync(release_blobs, artifact_store, blobs)
         
         logger.info(f"[HISTORY] Deleted training run {run_id}")
         return {"message": f"Training run {run_id} deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"[HISTORY] Error deleting training run {run_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus scrape endpoint (training metrics live under /train/{job_id}/metrics)"""
+    body, content_type = scrape()
+    return Response(body, media_type=content_type)
+
+@app.get("/debug/write-buffer")
+async def debug_write_buffer():
+    """Debug endpoint with write-behind buffer counters"""
+    return write_buffer.stats()
+
+@app.get("/debug/local-pool")
+async def debug_local_pool():
+    """Debug endpoint with local worker pool occupancy"""
+    return local_pool.stats()
+
+@app.get("/debug/admission")
+async def debug_admission():
+    """Debug endpoint with admission queue occupancy and limits"""
+    return admission.stats()
+
+@app.get("/debug/pubsub")
+async def debug_pubsub():
+    """Debug endpoint with this worker's broker subscriptions and forwarded job calls"""
+    return {
+        "worker_id": WORKER_ID,
+        "broker": type(broker).__name__,
+        "shared": broker.shared,
+        "channels": broker.channels,
+        "forwarded_calls": job_router.forwarded,
+        "polled_jobs": hub.active_jobs,
+        "render_viewers": render_viewers(),
+    }
+
+@app.get("/debug/result-cache")
+async def debug_result_cache():
+    """Debug endpoint with result cache hit rate and store size"""
+    return result_cache.stats()
+
+@app.get("/debug/renders")
+async def debug_renders():
+    """Debug endpoint with per-viewer frame streaming measurements"""
+    return render_stats()
+
 @app.get("/debug/jobs")
-async def debug_jobs(db: Session = Depends(get_db)):
+async def debug_jobs(db: AsyncSession = Depends(get_async_db)):
     """Debug endpoint to list all training jobs"""
     try:
-        runs = db.query(models.TrainingRun).order_by(
+        runs = await db.scalars(select(models.TrainingRun).order_by(
             models.TrainingRun.created_at.desc()
-        ).limit(20).all()
+        ).limit(20))
         
         return {
-            "total": db.query(models.TrainingRun).count(),
+            "total": await db.scalar(select(func.count()).select_from(models.TrainingRun)),
             "recent": [
                 {
                     "job_id": run.job_id,
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from fastapi import HTTPException
+
+from pubsub import WORKER_ID, Broker, InMemoryBroker, Subscription
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {"completed", "failed", "stopped"}
+
+FetchFn = Callable[[str], Awaitable[Dict[str, Any]]]
+UpdateFn = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+def is_terminal(data: Dict[str, Any]) -> bool:
+    return data.get("status") in TERMINAL_STATUSES
+
+
+class JobChannel:
+    """Subscribers, the broker feed and the upstream poller for one job"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+        self.feed: Optional[asyncio.Task] = None
+        self.subscription: Optional[Subscription] = None
+        self.polling = False  # this worker holds the job's poller lease
+        self.latest: Optional[Dict[str, Any]] = None
+        self.latest_at = 0.0
+
+    def publish(self, data: Dict[str, Any]):
+        self.latest = data
+        self.latest_at = time.monotonic()
+        for queue in self.subscribers:
+            # Slow subscribers only ever see the newest snapshot
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(data)
+
+
+class MetricsHub:
+    """
+    Fan out training metrics to every viewer of a job.
+
+    Each job with at least one subscriber gets exactly one poller, so upstream
+    and database load scale with active jobs instead of open dashboards. The
+    poller stops once the job reaches a terminal status or its last
+    subscriber leaves.
+
+    Snapshots go out through the broker on `metrics:{job_id}`. With several
+    workers, each one watching a job runs a poller, but only the holder of
+    the job's lease fetches and writes; the others wait to take over.
+    """
+
+    def __init__(self, fetch_metrics: FetchFn, fetch_final: FetchFn,
+                 on_update: Optional[UpdateFn] = None, interval: float = 2.0,
+                 broker: Optional[Broker] = None, worker_id: str = WORKER_ID):
+        self.fetch_metrics = fetch_metrics
+        self.fetch_final = fetch_final
+        self.on_update = on_update
+        self.interval = interval
+        self.broker = broker or InMemoryBroker()
+        self.worker_id = worker_id
+        self.channels: Dict[str, JobChannel] = {}
+
+    async def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Register a viewer and start polling the job if nobody else is"""
+        channel = self.channels.get(job_id)
+        if channel is None:
+            channel = self.channels[job_id] = JobChannel(job_id)
+            channel.subscription = await self.broker.subscribe(f"metrics:{job_id}")
+            channel.feed = asyncio.create_task(self._feed(channel))
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        if channel.latest is not None:
+            queue.put_nowait(channel.latest)
+        channel.subscribers.add(queue)
+
+        if channel.task is None or channel.task.done():
+            if channel.latest is None or not is_terminal(channel.latest):
+                channel.task = asyncio.create_task(self._poll(channel))
+        return queue
+
+    async def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        channel = self.channels.get(job_id)
+        if channel is None:
+            return
+        channel.subscribers.discard(queue)
+        if not channel.subscribers:
+            del self.channels[job_id]
+            await self._drop(channel)
+
+    async def _drop(self, channel: JobChannel):
+        tasks = [task for task in (channel.task, channel.feed) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if channel.subscription is not None:
+            await channel.subscription.close()
+
+    def snapshot(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Latest metrics for a job if it is being polled and still fresh"""
+        channel = self.channels.get(job_id)
+        if channel is None or channel.latest is None:
+            return None
+        if channel.task is not None and not channel.task.done():
+            if time.monotonic() - channel.latest_at > 2 * self.interval:
+                return None
+        return channel.latest
+
+    @property
+    def active_jobs(self) -> int:
+        """Jobs this worker is polling upstream"""
+        return sum(1 for c in self.channels.values() if c.polling and c.task is not None and not c.task.done())
+
+    @property
+    def viewers(self) -> int:
+        return sum(len(c.subscribers) for c in self.channels.values())
+
+    async def _feed(self, channel: JobChannel):
+        """Hand snapshots published by whichever worker polls the job to local viewers"""
+        while True:
+            channel.publish(json.loads(await channel.subscription.get()))
+
+    async def _poll(self, channel: JobChannel):
+        job_id = channel.job_id
+        lease = f"lease:metrics:{job_id}"
+        try:
+            while channel.subscribers:
+                if channel.latest is not None and is_terminal(channel.latest):
+                    # Another worker saw the job finish
+                    return
+                try:
+                    if await self.broker.claim(lease, self.worker_id, ttl=3 * self.interval):
+                        if not channel.polling:
+                            channel.polling = True
+                            logger.info(f"[HUB] Polling started for job {job_id}")
+                        data = await self.fetch_metrics(job_id)
+                        if is_terminal(data):
+                            # Final status carries the results the viewers need
+                            data = await self.fetch_final(job_id)
+                        if self.on_update is not None:
+                            await self.on_update(job_id, data)
+                        await self.broker.publish(f"metrics:{job_id}", json.dumps(data).encode())
+                        if is_terminal(data):
+                            logger.info(f"[HUB] Job {job_id} finished with status {data.get('status')}")
+                            return
+                    else:
+                        channel.polling = False
+                except HTTPException as e:
+                    logger.warning(f"[HUB] Upstream error for job {job_id}: {e.detail}")
+                except Exception as e:
+                    logger.error(f"[HUB] Error polling job {job_id}: {e}")
+                await asyncio.sleep(self.interval)
+        finally:
+            if channel.polling:
+                channel.polling = False
+                logger.info(f"[HUB] Polling stopped for job {job_id}")
+                # Let a worker with viewers left take over without waiting for the lease to expire
+                await asyncio.shield(self.broker.release(lease, self.worker_id))
+
+    async def close(self):
+        channels = list(self.channels.values())
+        self.channels.clear()
+        for channel in channels:
+            await self._drop(channel)
@@ -0,0 +1,100 @@
+"""
+Apply the database schema, as an explicit step before starting the gateway:
+
+    cd backend && python -m migrate
+
+Runs the alembic migrations up to head on `DATABASE_URL` (or `--url`). A
+SQLite file from an older gateway, which created its tables on startup
+without alembic, is adopted first: it is stamped at the initial revision,
+then each later migration runs, or is only stamped when the file already
+has the table or column it adds. Tables created before later columns and
+indexes existed get them from the migrations like any other database.
+"""
+import argparse
+import logging
+import os
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from dotenv import load_dotenv
+from sqlalchemy import inspect
+
+# DATABASE_URL may come from .env, as for the gateway
+load_dotenv()
+
+from database import SQLALCHEMY_DATABASE_URL, make_engine
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# The revision matching the training_runs table of a gateway without migrations
+BASELINE_REVISION = "29c09c7843c2"
+# What later revisions add, for telling which of them an adopted file already
+# has: a table, or a (table, column) pair
+ADOPTED_BY = {
+    "7d3f2a91c4b5": "metric_points",
+    "4c1e9b7a2d83": "sweeps",
+    "5e8d0c3a71f9": ("training_runs", "config_hash"),
+    "9a6f13d5e2c0": "artifacts",
+    "c47e2b9d1a06": "queued_jobs",
+}
+
+
+def alembic_config(url: str) -> Config:
+    """alembic.ini with `-x url=...`, as alembic/env.py expects it"""
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    config.cmd_opts = argparse.Namespace(x=[f"url={url}"])
+    # Keep the caller's logging setup instead of alembic.ini's
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def _has(inspector, tables, added) -> bool:
+    if isinstance(added, str):
+        return added in tables
+    table, column = added
+    return table in tables and column in {c["name"] for c in inspector.get_columns(table)}
+
+
+def adopt(config: Config, inspector):
+    """Stamp a schema built by create_all, migrating it up to head step by step"""
+    tables = set(inspector.get_table_names())
+    command.stamp(config, BASELINE_REVISION)
+    script = ScriptDirectory.from_config(config)
+    for revision in reversed(list(script.walk_revisions(BASELINE_REVISION, "heads"))):
+        if revision.revision == BASELINE_REVISION:
+            continue
+        added = ADOPTED_BY.get(revision.revision)
+        if added is not None and _has(inspector, tables, added):
+            command.stamp(config, revision.revision)
+        else:
+            command.upgrade(config, revision.revision)
+
+
+def upgrade(url: str = SQLALCHEMY_DATABASE_URL):
+    config = alembic_config(url)
+    engine = make_engine(url)
+    try:
+        inspector = inspect(engine)
+        tables = set(inspector.get_table_names())
+        if "training_runs" in tables and "alembic_version" not in tables:
+            logger.info("[DB] Adopting a schema created without migrations")
+            adopt(config, inspector)
+    finally:
+        engine.dispose()
+    command.upgrade(config, "head")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=SQLALCHEMY_DATABASE_URL, help="database URL, defaults to DATABASE_URL")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    upgrade(args.url)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -26,10 +26,146 @@ class TrainingRun(Base):
     config = Column(JSON, default={})
     metrics = Column(JSON, default={})
     results = Column(JSON, default={})
+
+    # Canonical hash of the config, matched by the result cache
+    config_hash = Column(String, nullable=True)
     
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Filtered history listings, newest first
+    __table_args__ = (
+        Index("ix_training_runs_status_created_at", "status", "created_at"),
+        Index("ix_training_runs_environment_created_at", "environment", "created_at"),
+        # Result cache lookups, newest run first
+        Index("ix_training_runs_config_hash_created_at", "config_hash", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<TrainingRun(id={self.id}, job_id={self.job_id}, environment={self.environment}, status={self.status})>"
+
+class MetricPoint(Base):
+    __tablename__ = "metric_points"
+
+    # One row per (run, timestep), appended as training progresses
+    run_id = Column(Integer, ForeignKey("training_runs.id", ondelete="CASCADE"), primary_key=True)
+    timestep = Column(Integer, primary_key=True)
+
+    # Scalar metrics at this timestep
+    episodes = Column(Integer)
+    reward = Column(Float)
+    std_reward = Column(Float)
+    episode_length = Column(Float)
+    loss = Column(Float)
+
+    def __repr__(self):
+        return f"<MetricPoint(run_id={self.run_id}, timestep={self.timestep}, reward={self.reward})>"
+
+class Sweep(Base):
+    __tablename__ = "sweeps"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=True)
+
+    # Search: grid, random or bayes over `space`, applied on top of `base_config`
+    method = Column(String, default="grid")
+    status = Column(String, default="running", index=True)  # running, stopping, completed, stopped
+    space = Column(JSON, default={})
+    base_config = Column(JSON, default={})
+    max_trials = Column(Integer)
+    max_concurrent = Column(Integer, default=2)
+    seed = Column(Integer, nullable=True)
+
+    # Successive halving: {"reduction_factor": 3, "rungs": [timesteps, ...]}, empty when disabled
+    early_stopping = Column(JSON, default={})
+
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Sweep(id={self.id}, method={self.method}, status={self.status})>"
+
+class SweepTrial(Base):
+    __tablename__ = "sweep_trials"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sweep_id = Column(Integer, ForeignKey("sweeps.id", ondelete="CASCADE"), nullable=False)
+    trial_index = Column(Integer, nullable=False)
+
+    # The training run this trial launched
+    run_id = Column(Integer, ForeignKey("training_runs.id", ondelete="SET NULL"), nullable=True)
+    job_id = Column(String, nullable=True)
+
+    params = Column(JSON, default={})
+    status = Column(String, default="running")  # running, completed, pruned, failed, stopped
+    reward = Column(Float, nullable=True)  # latest mean_reward, final result once completed
+    timesteps = Column(Integer, default=0)
+    rung_rewards = Column(JSON, default={})  # rung timesteps -> mean_reward when it was reached
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_sweep_trials_sweep_id_trial_index", "sweep_id", "trial_index", unique=True),
+    )
+
+    def __repr__(self):
+        return f"<SweepTrial(id={self.id}, sweep_id={self.sweep_id}, status={self.status}, reward={self.reward})>"
+
+class Artifact(Base):
+    __tablename__ = "artifacts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, nullable=True)  # null for standalone uploads
+
+    kind = Column(String, default="model")  # model, checkpoint, replay, replay-index, upload
+    name = Column(String, nullable=True)
+    digest = Column(String, nullable=False, index=True)  # SHA-256 of the artifact's bytes
+    size = Column(Integer, default=0)
+
+    # How the bytes are stored: the blob is either the artifact itself or a
+    # delta against the artifact with `base_digest`
+    blob = Column(String, nullable=False, index=True)
+    stored_size = Column(Integer, default=0)
+    encoding = Column(String, default="full")  # full, xor-zlib
+    base_digest = Column(String, nullable=True)
+
+    timestep = Column(Integer, nullable=True)  # checkpoints only
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_artifacts_job_id_kind_timestep", "job_id", "kind", "timestep"),
+        Index("ix_artifacts_job_id_created_at", "job_id", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<Artifact(id={self.id}, job_id={self.job_id}, kind={self.kind}, size={self.size})>"
+
+class QueuedJob(Base):
+    __tablename__ = "queued_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Gateway job_id; the backend's own id once admitted, which differs for jobs that waited
+    job_id = Column(String, unique=True, index=True)
+    backend_job_id = Column(String, nullable=True)
+    run_id = Column(Integer, ForeignKey("training_runs.id", ondelete="SET NULL"), nullable=True)
+
+    user = Column(String, default="anonymous")
+    priority = Column(String, default="interactive")  # interactive, batch
+    backend = Column(String, default="space")
+    payload = Column(JSON, default={})  # what is sent to the backend on admission
+    config_hash = Column(String, nullable=True)
+
+    state = Column(String, default="waiting")  # waiting, running, done, failed, cancelled, lost
+    enqueued_at = Column(DateTime, default=datetime.utcnow)
+    admitted_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_queued_jobs_state", "state"),
+    )
+
     def __repr__(self):
-        return f"<TrainingRun(id={self.id}, job_id={self.job_id}, environment={self.environment}, status={self.status})>"
\ No newline at end of file
+        return f"<QueuedJob(id={self.id}, job_id={self.job_id}, user={self.user}, state={self.state})>"
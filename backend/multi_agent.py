@@ -0,0 +1,431 @@
+"""
+Multi-agent training on PettingZoo parallel-API environments.
+
+Agents are split into groups that share one policy: by default, agents whose
+names share a prefix (e.g. `adversary_*` and `agent_*` in simple_tag). On each
+step the observations of every live agent in a group, across all env copies,
+are stacked into one array, so each group's policy runs one forward pass
+instead of one per agent. Groups are trained with PPO, as independent learners
+that share parameters within a group.
+
+Only imported inside training worker processes.
+"""
+import importlib
+import os
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+from gymnasium import spaces
+from torch import nn
+from torch.distributions import Categorical, Normal
+
+from training_worker import parallel_env_modules
+
+GAMMA = 0.99
+GAE_LAMBDA = 0.95
+CLIP_RANGE = 0.2
+VALUE_COEF = 0.5
+MAX_GRAD_NORM = 0.5
+HIDDEN_SIZE = 64
+
+METRICS_INTERVAL_SECONDS = float(os.getenv("LOCAL_METRICS_INTERVAL", "1.0"))
+EVAL_EPISODES = int(os.getenv("LOCAL_EVAL_EPISODES", "5"))
+
+
+def load_parallel_env(env_name: str, env_kwargs: Optional[Dict[str, Any]] = None):
+    """Build a parallel env from a module path or a bare name, only from PETTINGZOO_PACKAGES"""
+    for name in parallel_env_modules(env_name):
+        try:
+            module = importlib.import_module(name)
+        except ModuleNotFoundError as e:
+            # Only skip candidates that don't exist, not envs with missing extras
+            if e.name and name.startswith(e.name):
+                continue
+            raise
+        if hasattr(module, "parallel_env"):
+            return module.parallel_env(**(env_kwargs or {}))
+    raise ValueError(f"No PettingZoo parallel environment named '{env_name}'")
+
+
+def policy_groups(env, sharing: str = "group") -> Dict[str, List[str]]:
+    """
+    Map policy name -> agents it controls.
+
+    "group" shares a policy per agent-name prefix, "shared" uses one policy
+    for every agent and "none" gives each agent its own.
+    """
+    groups: Dict[str, List[str]] = {}
+    for agent in env.possible_agents:
+        if sharing == "none":
+            key = agent
+        elif sharing == "shared":
+            key = "shared"
+        else:
+            key = agent.rsplit("_", 1)[0]
+        groups.setdefault(key, []).append(agent)
+
+    for members in groups.values():
+        first = members[0]
+        for agent in members[1:]:
+            if (env.observation_space(agent) != env.observation_space(first)
+                    or env.action_space(agent) != env.action_space(first)):
+                raise ValueError(f"Agents {first} and {agent} cannot share a policy, their spaces differ")
+    return groups
+
+
+def _mlp(in_dim: int, out_dim: int) -> nn.Sequential:
+    return nn.Sequential(
+        nn.Linear(in_dim, HIDDEN_SIZE), nn.Tanh(),
+        nn.Linear(HIDDEN_SIZE, HIDDEN_SIZE), nn.Tanh(),
+        nn.Linear(HIDDEN_SIZE, out_dim),
+    )
+
+
+class GroupPolicy(nn.Module):
+    """Actor-critic shared by every agent in a group"""
+
+    def __init__(self, observation_space: spaces.Space, action_space: spaces.Space):
+        super().__init__()
+        obs_dim = int(np.prod(observation_space.shape))
+        self.discrete = isinstance(action_space, spaces.Discrete)
+        act_dim = int(action_space.n) if self.discrete else int(np.prod(action_space.shape))
+        self.actor = _mlp(obs_dim, act_dim)
+        self.critic = _mlp(obs_dim, 1)
+        if not self.discrete:
+            self.log_std = nn.Parameter(torch.zeros(act_dim))
+            self.low = action_space.low
+            self.high = action_space.high
+
+    def distribution(self, obs: torch.Tensor):
+        out = self.actor(obs)
+        if self.discrete:
+            return Categorical(logits=out)
+        return Normal(out, self.log_std.exp())
+
+    def _log_prob(self, dist, actions: torch.Tensor) -> torch.Tensor:
+        log_prob = dist.log_prob(actions)
+        return log_prob if self.discrete else log_prob.sum(-1)
+
+    @torch.no_grad()
+    def act(self, obs: torch.Tensor, deterministic: bool = False):
+        """One forward pass for a whole batch of agents"""
+        dist = self.distribution(obs)
+        if deterministic:
+            actions = dist.probs.argmax(-1) if self.discrete else dist.mean
+        else:
+            actions = dist.sample()
+        return actions, self._log_prob(dist, actions), self.critic(obs).squeeze(-1)
+
+    def evaluate(self, obs: torch.Tensor, actions: torch.Tensor):
+        dist = self.distribution(obs)
+        entropy = dist.entropy() if self.discrete else dist.entropy().sum(-1)
+        return self._log_prob(dist, actions), entropy, self.critic(obs).squeeze(-1)
+
+    def to_env_actions(self, actions: torch.Tensor) -> np.ndarray:
+        actions = actions.numpy()
+        return actions if self.discrete else np.clip(actions, self.low, self.high)
+
+
+class MultiAgentRollout:
+    """
+    Steps `n_envs` copies of a parallel env with batched per-group inference.
+
+    Transitions are kept per group as one record per step, holding the
+    (env index, agent) keys that were batched together.
+    """
+
+    def __init__(self, env_fn, n_envs: int, groups: Dict[str, List[str]], policies: Dict[str, GroupPolicy],
+                 seed: Optional[int] = None):
+        self.envs = [env_fn() for _ in range(n_envs)]
+        self.groups = groups
+        self.policies = policies
+        self.group_of = {agent: group for group, agents in groups.items() for agent in agents}
+        self.obs = [env.reset(seed=None if seed is None else seed + i)[0] for i, env in enumerate(self.envs)]
+        self.returns = [dict.fromkeys(env.possible_agents, 0.0) for env in self.envs]
+        self.lengths = [0] * n_envs
+
+        self.finished_returns: deque = deque(maxlen=100)
+        self.finished_lengths: deque = deque(maxlen=100)
+        self.episodes = 0
+        self.env_steps = 0
+        self.agent_steps = 0
+        # Counts carried over from a checkpoint, excluded from the step rates
+        self.resumed_env_steps = 0
+        self.resumed_agent_steps = 0
+
+    def progress(self) -> Dict[str, Any]:
+        """Counters and recent episodes, saved with a checkpoint"""
+        return {
+            "episodes": self.episodes,
+            "env_steps": self.env_steps,
+            "agent_steps": self.agent_steps,
+            "finished_returns": list(self.finished_returns),
+            "finished_lengths": list(self.finished_lengths),
+        }
+
+    def resume(self, progress: Dict[str, Any]):
+        """Continue counting from a checkpoint's `progress()`"""
+        self.episodes = progress["episodes"]
+        self.env_steps = self.resumed_env_steps = progress["env_steps"]
+        self.agent_steps = self.resumed_agent_steps = progress["agent_steps"]
+        self.finished_returns.extend(progress["finished_returns"])
+        self.finished_lengths.extend(progress["finished_lengths"])
+
+    def _batch(self, group: str) -> Tuple[List[Tuple[int, str]], Optional[torch.Tensor]]:
+        keys = [(i, agent) for i, obs in enumerate(self.obs) for agent in obs if self.group_of[agent] == group]
+        if not keys:
+            return keys, None
+        stacked = np.stack([self.obs[i][agent] for i, agent in keys]).reshape(len(keys), -1)
+        return keys, torch.as_tensor(stacked, dtype=torch.float32)
+
+    def values(self) -> Dict[Tuple[int, str], float]:
+        """Critic estimates for every live agent, used to bootstrap unfinished trajectories"""
+        values = {}
+        for group, policy in self.policies.items():
+            keys, obs = self._batch(group)
+            if obs is not None:
+                _, _, group_values = policy.act(obs)
+                values.update(zip(keys, group_values.tolist()))
+        return values
+
+    def step(self, deterministic: bool = False) -> Dict[str, Dict[str, Any]]:
+        actions: List[Dict[str, Any]] = [{} for _ in self.envs]
+        records = {}
+        for group, policy in self.policies.items():
+            keys, obs = self._batch(group)
+            if obs is None:
+                continue
+            group_actions, log_probs, values = policy.act(obs, deterministic)
+            for (i, agent), action in zip(keys, policy.to_env_actions(group_actions)):
+                actions[i][agent] = action
+            records[group] = {
+                "keys": keys, "obs": obs, "actions": group_actions, "log_probs": log_probs, "values": values,
+            }
+
+        rewards, dones = {}, {}
+        for i, env in enumerate(self.envs):
+            obs, env_rewards, terminations, truncations, _ = env.step(actions[i])
+            for agent in actions[i]:
+                reward = float(env_rewards.get(agent, 0.0))
+                rewards[(i, agent)] = reward
+                self.returns[i][agent] += reward
+                dones[(i, agent)] = bool(terminations.get(agent) or truncations.get(agent)) or not env.agents
+            self.agent_steps += len(actions[i])
+            self.lengths[i] += 1
+
+            if not env.agents:
+                self.finished_returns.append(self.returns[i])
+                self.finished_lengths.append(self.lengths[i])
+                self.episodes += 1
+                self.returns[i] = dict.fromkeys(env.possible_agents, 0.0)
+                self.lengths[i] = 0
+                obs, _ = env.reset()
+            self.obs[i] = obs
+        self.env_steps += len(self.envs)
+
+        for record in records.values():
+            record["rewards"] = np.array([rewards[key] for key in record["keys"]], dtype=np.float32)
+            record["dones"] = np.array([dones[key] for key in record["keys"]], dtype=bool)
+        return records
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+def compute_advantages(records: List[Dict[str, Any]], bootstrap: Dict[Tuple[int, str], float]):
+    """GAE per (env, agent) trajectory, walking the group's records backwards"""
+    next_value = dict(bootstrap)
+    next_advantage: Dict[Tuple[int, str], float] = {}
+    for record in reversed(records):
+        values = record["values"].tolist()
+        advantages = np.zeros(len(values), dtype=np.float32)
+        for j, key in enumerate(record["keys"]):
+            if record["dones"][j]:
+                following_value, following_advantage = 0.0, 0.0
+            else:
+                following_value = next_value.get(key, 0.0)
+                following_advantage = next_advantage.get(key, 0.0)
+            delta = record["rewards"][j] + GAMMA * following_value - values[j]
+            advantages[j] = delta + GAMMA * GAE_LAMBDA * following_advantage
+            next_value[key] = values[j]
+            next_advantage[key] = advantages[j]
+        record["advantages"] = torch.as_tensor(advantages)
+        record["returns"] = record["advantages"] + record["values"]
+
+
+def ppo_update(policy: GroupPolicy, optimizer, records: List[Dict[str, Any]], batch_size: int, n_epochs: int) -> float:
+    obs = torch.cat([r["obs"] for r in records])
+    actions = torch.cat([r["actions"] for r in records])
+    old_log_probs = torch.cat([r["log_probs"] for r in records])
+    advantages = torch.cat([r["advantages"] for r in records])
+    returns = torch.cat([r["returns"] for r in records])
+    advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-8)
+
+    losses = []
+    for _ in range(n_epochs):
+        for batch in torch.randperm(len(obs)).split(batch_size):
+            log_probs, _, values = policy.evaluate(obs[batch], actions[batch])
+            ratio = (log_probs - old_log_probs[batch]).exp()
+            policy_loss = -torch.min(
+                ratio * advantages[batch],
+                ratio.clamp(1 - CLIP_RANGE, 1 + CLIP_RANGE) * advantages[batch],
+            ).mean()
+            value_loss = (returns[batch] - values).pow(2).mean()
+            loss = policy_loss + VALUE_COEF * value_loss
+
+            optimizer.zero_grad()
+            loss.backward()
+            nn.utils.clip_grad_norm_(policy.parameters(), MAX_GRAD_NORM)
+            optimizer.step()
+            losses.append(loss.item())
+    return float(np.mean(losses)) if losses else 0.0
+
+
+def snapshot(rollout: MultiAgentRollout, config: Dict[str, Any], groups: Dict[str, List[str]],
+             started_at: float, loss: Optional[float], logs: List[str], checkpointer=None) -> Dict[str, Any]:
+    """Metrics in the single-agent shape, plus per-agent returns"""
+    team_returns = [sum(returns.values()) for returns in rollout.finished_returns]
+    agents = list(rollout.envs[0].possible_agents)
+    elapsed = max(time.monotonic() - started_at, 1e-9)
+    metrics = {
+        "timesteps": rollout.env_steps,
+        "episodes": rollout.episodes,
+        "progress": min(100.0, 100.0 * rollout.env_steps / config["total_timesteps"]),
+        "episode_rewards": team_returns,
+        "episode_lengths": list(rollout.finished_lengths),
+        "current_episode_reward": max(sum(returns.values()) for returns in rollout.returns),
+        "mean_reward": float(np.mean(team_returns)) if team_returns else 0.0,
+        "std_reward": float(np.std(team_returns)) if team_returns else 0.0,
+        "eval_mean_reward": None,
+        "eval_std_reward": None,
+        "logs": logs[-20:],
+        "agent_rewards": {
+            agent: float(np.mean([returns[agent] for returns in rollout.finished_returns]))
+            if rollout.finished_returns else 0.0
+            for agent in agents
+        },
+        "policy_groups": groups,
+        "n_envs": len(rollout.envs),
+        "agent_steps": rollout.agent_steps,
+        "agent_steps_per_second": (rollout.agent_steps - rollout.resumed_agent_steps) / elapsed,
+        "steps_per_second": (rollout.env_steps - rollout.resumed_env_steps) / elapsed,
+    }
+    if checkpointer is not None:
+        metrics.update(checkpointer.metrics(elapsed))
+    if loss is not None:
+        metrics["loss"] = loss
+    return metrics
+
+
+def evaluate(env_fn, groups, policies, episodes: int) -> Tuple[float, float]:
+    """Mean and std of the deterministic team return"""
+    rollout = MultiAgentRollout(env_fn, 1, groups, policies)
+    try:
+        while rollout.episodes < episodes:
+            rollout.step(deterministic=True)
+        team_returns = [sum(returns.values()) for returns in rollout.finished_returns]
+        return float(np.mean(team_returns)), float(np.std(team_returns))
+    finally:
+        rollout.close()
+
+
+def run_multi_agent_job(job_id: str, config: Dict[str, Any], model_dir: str, updates, stop_event,
+                        checkpointer=None, resume_state: Optional[Dict[str, Any]] = None):
+    """Train one multi-agent job and report back, like `run_training_job`"""
+    env_fn = lambda: load_parallel_env(config["env_name"], config.get("env_kwargs"))
+    probe = env_fn()
+    groups = policy_groups(probe, config.get("policy_sharing") or "group")
+    if config.get("seed") is not None:
+        torch.manual_seed(config["seed"])
+    policies = {
+        group: GroupPolicy(probe.observation_space(agents[0]), probe.action_space(agents[0]))
+        for group, agents in groups.items()
+    }
+    probe.close()
+    optimizers = {
+        group: torch.optim.Adam(policy.parameters(), lr=config["learning_rate"])
+        for group, policy in policies.items()
+    }
+
+    rollout = MultiAgentRollout(env_fn, config.get("n_envs") or 1, groups, policies, seed=config.get("seed"))
+    logs: List[str] = []
+    if resume_state is not None:
+        if resume_state["groups"] != groups:
+            raise ValueError("Checkpoint policy groups don't match this env and policy_sharing")
+        for group in groups:
+            policies[group].load_state_dict(resume_state["policies"][group])
+            optimizers[group].load_state_dict(resume_state["optimizers"][group])
+        rollout.resume(resume_state["progress"])
+        logs = list(resume_state["progress"]["logs"])
+
+    started_at = time.monotonic()
+    last_report = 0.0
+    loss: Optional[float] = None
+    while rollout.env_steps < config["total_timesteps"] and not stop_event.is_set():
+        buffers: Dict[str, List[Dict[str, Any]]] = {group: [] for group in policies}
+        for _ in range(config["n_steps"]):
+            for group, record in rollout.step().items():
+                buffers[group].append(record)
+            if stop_event.is_set():
+                break
+            now = time.monotonic()
+            if now - last_report >= METRICS_INTERVAL_SECONDS:
+                last_report = now
+                updates.put((job_id, "metrics", snapshot(rollout, config, groups, started_at, loss, logs, checkpointer)))
+        if stop_event.is_set():
+            break
+
+        bootstrap = rollout.values()
+        group_losses = []
+        for group, records in buffers.items():
+            if records:
+                compute_advantages(records, bootstrap)
+                group_losses.append(ppo_update(
+                    policies[group], optimizers[group], records, config["batch_size"], config["n_epochs"],
+                ))
+        loss = float(np.mean(group_losses)) if group_losses else None
+        if loss is not None:
+            logs.append(f"timesteps={rollout.env_steps} loss={loss:.4f}")
+            logs = logs[-50:]
+
+        if checkpointer is not None and checkpointer.due(rollout.env_steps):
+            checkpointer.save({
+                "env_steps": rollout.env_steps,
+                "groups": groups,
+                "policies": {group: policy.state_dict() for group, policy in policies.items()},
+                "optimizers": {group: optimizer.state_dict() for group, optimizer in optimizers.items()},
+                "progress": {**rollout.progress(), "logs": logs[-50:]},
+            }, rollout.env_steps)
+    rollout.close()
+
+    metrics = snapshot(rollout, config, groups, started_at, loss, logs, checkpointer)
+    if stop_event.is_set():
+        updates.put((job_id, "metrics", metrics))
+        updates.put((job_id, "status", "stopped"))
+        return
+
+    mean_reward, std_reward = evaluate(env_fn, groups, policies, EVAL_EPISODES)
+    metrics["eval_mean_reward"] = mean_reward
+    metrics["eval_std_reward"] = std_reward
+
+    os.makedirs(model_dir, exist_ok=True)
+    model_path = os.path.join(model_dir, f"{job_id}.pt")
+    torch.save({
+        "groups": groups,
+        "policies": {group: policy.state_dict() for group, policy in policies.items()},
+    }, model_path)
+
+    updates.put((job_id, "metrics", metrics))
+    updates.put((job_id, "results", {
+        "mean_reward": mean_reward,
+        "std_reward": std_reward,
+        "total_timesteps": metrics["timesteps"],
+        "episodes": metrics["episodes"],
+        "agent_rewards": metrics["agent_rewards"],
+        "model_path": model_path,
+    }))
+    updates.put((job_id, "status", "completed"))
@@ -0,0 +1,345 @@
+"""
+State shared between gateway worker processes.
+
+A `Broker` carries three things between workers:
+
+- pub/sub channels: render frames and metric snapshots published by the
+  one worker producing them reach viewers connected to any worker
+- leases: which worker runs the single upstream relay/poller for a job,
+  and which one drives background schedulers
+- the job owner registry: which worker holds a job that only exists in its
+  memory (a local training job, a job waiting for admission), so requests
+  landing on another worker are forwarded to it
+
+`PUBSUB_URL=memory://` (the default) keeps everything in process and is
+right for a single worker. For `uvicorn --workers N` or several replicas,
+point every worker at the same Redis with `PUBSUB_URL=redis://host:6379/0`
+(needs `pip install redis`).
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+PUBSUB_URL = os.getenv("PUBSUB_URL", "memory://")
+# Messages a slow subscriber may fall behind by before the oldest are dropped
+PUBSUB_BUFFER = int(os.getenv("PUBSUB_BUFFER", "16"))
+# How long a job stays routed to the worker that took it
+JOB_OWNER_TTL = float(os.getenv("JOB_OWNER_TTL", str(24 * 3600)))
+RPC_TIMEOUT = float(os.getenv("PUBSUB_RPC_TIMEOUT", "10"))
+
+# Identifies this process in leases and the job owner registry
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+RequestFn = Callable[[str, str, str], Awaitable[Dict[str, Any]]]
+
+
+class Subscription:
+    """Messages published on one channel, newest kept when the reader falls behind"""
+
+    def __init__(self, broker: "Broker", channel: str, maxsize: int = PUBSUB_BUFFER):
+        self.broker = broker
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def deliver(self, message: bytes):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self) -> bytes:
+        return await self.queue.get()
+
+    async def close(self):
+        await self.broker._unsubscribe(self)
+
+
+class Broker(ABC):
+    """
+    Interface of the shared-state backends. `shared` is False when the
+    broker only reaches this process.
+    """
+
+    shared = False
+
+    def __init__(self):
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+
+    # ===== PUB/SUB =====
+
+    @abstractmethod
+    async def publish(self, channel: str, message: bytes) -> int:
+        """Send `message` to every subscriber of `channel`; returns how many processes received it"""
+
+    async def subscribe(self, channel: str) -> Subscription:
+        subscription = Subscription(self, channel)
+        subscribers = self._subscriptions.get(channel)
+        if subscribers is None:
+            subscribers = self._subscriptions[channel] = set()
+            await self._listen(channel)
+        subscribers.add(subscription)
+        return subscription
+
+    async def _unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscriptions.get(subscription.channel)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscriptions[subscription.channel]
+            await self._unlisten(subscription.channel)
+
+    def _dispatch(self, channel: str, message: bytes) -> int:
+        subscribers = self._subscriptions.get(channel, ())
+        for subscription in subscribers:
+            subscription.deliver(message)
+        return len(subscribers)
+
+    async def _listen(self, channel: str):
+        pass
+
+    async def _unlisten(self, channel: str):
+        pass
+
+    # ===== KEYS AND LEASES =====
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    async def claim(self, key: str, owner: str, ttl: float) -> bool:
+        """Take the lease `key` for `ttl` seconds, or renew it if `owner` already holds it"""
+
+    @abstractmethod
+    async def release(self, key: str, owner: str):
+        """Give up a lease early so another worker can take over right away"""
+
+    async def close(self):
+        pass
+
+    @property
+    def channels(self) -> int:
+        return len(self._subscriptions)
+
+
+class InMemoryBroker(Broker):
+    """Single-process broker: channels are local fan-out, keys a dict"""
+
+    def __init__(self):
+        super().__init__()
+        self._keys: Dict[str, Tuple[str, Optional[float]]] = {}
+
+    async def publish(self, channel: str, message: bytes) -> int:
+        return 1 if self._dispatch(channel, message) else 0
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._keys.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._keys[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        self._keys[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    async def claim(self, key: str, owner: str, ttl: float) -> bool:
+        holder = await self.get(key)
+        if holder is not None and holder != owner:
+            return False
+        await self.set(key, owner, ttl)
+        return True
+
+    async def release(self, key: str, owner: str):
+        if await self.get(key) == owner:
+            del self._keys[key]
+
+
+class RedisBroker(Broker):
+    """
+    Broker on Redis, or anything speaking its protocol. All of a worker's
+    channels share one subscriber connection, read by a single task.
+    """
+
+    shared = True
+
+    def __init__(self, url: str):
+        super().__init__()
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("PUBSUB_URL points at Redis but the redis package is missing, run `pip install redis`")
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._reader: Optional[asyncio.Task] = None
+
+    async def publish(self, channel: str, message: bytes) -> int:
+        return await self.client.publish(channel, message)
+
+    async def _listen(self, channel: str):
+        await self.pubsub.subscribe(channel)
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+    async def _unlisten(self, channel: str):
+        await self.pubsub.unsubscribe(channel)
+
+    async def _read(self):
+        while True:
+            try:
+                message = await self.pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[PUBSUB] Subscriber connection failed: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if message is not None and message["type"] == "message":
+                self._dispatch(message["channel"].decode(), message["data"])
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.client.get(key)
+        return value.decode() if value is not None else None
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        await self.client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def claim(self, key: str, owner: str, ttl: float) -> bool:
+        ms = int(ttl * 1000)
+        if await self.client.set(key, owner, px=ms, nx=True):
+            return True
+        if await self.get(key) == owner:
+            await self.client.pexpire(key, ms)
+            return True
+        return False
+
+    async def release(self, key: str, owner: str):
+        if await self.get(key) == owner:
+            await self.client.delete(key)
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+
+def make_broker(url: str = PUBSUB_URL) -> Broker:
+    if url.startswith("memory://"):
+        return InMemoryBroker()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBroker(url)
+    raise ValueError(f"Unknown PUBSUB_URL scheme in '{url}', expected memory:// or redis://")
+
+
+# ===== JOB OWNERS =====
+
+def owner_key(job_id: str) -> str:
+    return f"owner:{job_id}"
+
+
+class JobRouter:
+    """
+    Forwards status/metrics/stop calls for jobs held by another worker.
+
+    Each worker listens on its own channel; a call is published there with
+    a reply channel, and answered by the owner's local `handle`. When nobody
+    listens any more (the owner exited), the caller handles the job itself.
+    """
+
+    def __init__(self, broker: Broker, handle: RequestFn, worker_id: str = WORKER_ID,
+                 timeout: float = RPC_TIMEOUT):
+        self.broker = broker
+        self.handle = handle
+        self.worker_id = worker_id
+        self.timeout = timeout
+        self.forwarded = 0
+        self._inbox: Optional[Subscription] = None
+        self._task: Optional[asyncio.Task] = None
+        self._calls: Set[asyncio.Task] = set()
+
+    async def start(self):
+        self._inbox = await self.broker.subscribe(f"worker:{self.worker_id}")
+        self._task = asyncio.create_task(self._serve())
+
+    async def close(self):
+        tasks = [task for task in (self._task, *self._calls) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._inbox is not None:
+            await self._inbox.close()
+
+    async def claim(self, job_id: str):
+        """Route requests for `job_id` to this worker"""
+        if self.broker.shared:
+            await self.broker.set(owner_key(job_id), self.worker_id, ttl=JOB_OWNER_TTL)
+
+    async def owner(self, job_id: str) -> Optional[str]:
+        """The other worker holding `job_id`, None when it isn't held elsewhere"""
+        if not self.broker.shared:
+            return None
+        owner = await self.broker.get(owner_key(job_id))
+        return owner if owner != self.worker_id else None
+
+    async def alive(self, worker_id: str) -> bool:
+        """Whether `worker_id` is still listening for calls"""
+        return await self.broker.publish(f"worker:{worker_id}", b'{"ping": true}') > 0
+
+    async def call(self, owner: str, method: str, job_id: str, action: str) -> Optional[Dict[str, Any]]:
+        """Run a call on `owner`; None when it is no longer listening"""
+        reply_channel = f"reply:{uuid.uuid4().hex}"
+        replies = await self.broker.subscribe(reply_channel)
+        try:
+            request = {"method": method, "job_id": job_id, "action": action, "reply": reply_channel}
+            if not await self.broker.publish(f"worker:{owner}", json.dumps(request).encode()):
+                return None
+            self.forwarded += 1
+            try:
+                reply = json.loads(await asyncio.wait_for(replies.get(), timeout=self.timeout))
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=504, detail=f"Worker holding job {job_id} did not answer")
+        finally:
+            await replies.close()
+        if "error" in reply:
+            raise HTTPException(status_code=reply["error"], detail=reply["detail"])
+        return reply["data"]
+
+    async def _serve(self):
+        while True:
+            request = json.loads(await self._inbox.get())
+            if "reply" not in request:
+                continue
+            task = asyncio.create_task(self._answer(request))
+            self._calls.add(task)
+            task.add_done_callback(self._calls.discard)
+
+    async def _answer(self, request: Dict[str, Any]):
+        try:
+            reply = {"data": await self.handle(request["method"], request["job_id"], request["action"])}
+        except HTTPException as e:
+            reply = {"error": e.status_code, "detail": e.detail}
+        except Exception as e:
+            reply = {"error": 500, "detail": str(e)}
+        await self.broker.publish(request["reply"], json.dumps(reply).encode())
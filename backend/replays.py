@@ -0,0 +1,198 @@
+"""
+Episode replays recorded during a local job's final evaluation.
+
+Frames are stored in the render stream's binary format (`FRAME_HEADER` plus
+JPEG): a full keyframe every `REPLAY_KEYFRAME_EVERY` frames and patches of
+the changed region in between. Each replay is two artifacts, the frame file
+and a JSON index with the byte range of every frame. A player reads the
+index, then fetches the frame file with Range requests, starting at the
+keyframe before the point it wants to show.
+
+Only the best and worst evaluation episodes are kept, within a
+`REPLAY_MAX_BYTES` budget per run.
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import cv2
+import gymnasium as gym
+import numpy as np
+
+from websocket_handler import FRAME_DELTA, FRAME_HEADER, FRAME_KEY, changed_region, encode_jpeg
+
+# Configuration
+REPLAY_MAX_BYTES = int(os.getenv("REPLAY_MAX_BYTES", str(16 * 1024 * 1024)))  # per run, 0 disables recording
+REPLAY_MAX_WIDTH = int(os.getenv("REPLAY_MAX_WIDTH", "480"))
+REPLAY_JPEG_QUALITY = int(os.getenv("REPLAY_JPEG_QUALITY", "70"))
+REPLAY_KEYFRAME_EVERY = int(os.getenv("REPLAY_KEYFRAME_EVERY", "30"))
+REPLAY_DELTA_MAX_AREA = 0.5  # patches bigger than this share of the frame are sent as keyframes
+DEFAULT_REPLAY_FPS = 30
+
+
+class EpisodeEncoder:
+    """Appends one episode's frames to a file and keeps the byte range of each"""
+
+    def __init__(self, path: str, max_bytes: int, max_width: int = REPLAY_MAX_WIDTH,
+                 quality: int = REPLAY_JPEG_QUALITY, keyframe_every: int = REPLAY_KEYFRAME_EVERY):
+        self.path = path
+        self.file = open(path, "wb")
+        self.max_bytes = max_bytes
+        self.max_width = max_width
+        self.quality = quality
+        self.keyframe_every = max(1, keyframe_every)
+        self.frames: List[List[int]] = []  # [offset, size, keyframe] per frame; size 0 repeats the previous frame
+        self.size = 0
+        self.truncated = False
+        self.reward = 0.0
+        self.previous: Optional[np.ndarray] = None
+        self.since_keyframe = 0
+
+    def add(self, frame: Optional[np.ndarray]):
+        if frame is None or self.truncated:
+            return
+        if self.max_width and frame.shape[1] > self.max_width:
+            height = max(1, int(frame.shape[0] * self.max_width / frame.shape[1]))
+            frame = cv2.resize(frame, (self.max_width, height), interpolation=cv2.INTER_AREA)
+        height, width = frame.shape[:2]
+
+        region = (0, 0, width, height)
+        kind = FRAME_KEY
+        if self.previous is not None and self.since_keyframe < self.keyframe_every:
+            changed = changed_region(self.previous, frame)
+            if changed is None:
+                self.frames.append([self.size, 0, 0])
+                return
+            if changed[2] * changed[3] <= REPLAY_DELTA_MAX_AREA * width * height:
+                region, kind = changed, FRAME_DELTA
+
+        x, y, w, h = region
+        packed = FRAME_HEADER.pack(kind, len(self.frames), width, height, *region)
+        packed += encode_jpeg(np.ascontiguousarray(frame[y:y + h, x:x + w]), self.quality)
+        if self.size + len(packed) > self.max_bytes:
+            self.truncated = True
+            return
+
+        self.file.write(packed)
+        self.frames.append([self.size, len(packed), int(kind == FRAME_KEY)])
+        self.size += len(packed)
+        self.previous = frame
+        self.since_keyframe = 1 if kind == FRAME_KEY else self.since_keyframe + 1
+
+    def close(self):
+        self.file.close()
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.path)
+
+
+class ReplayRecorder(gym.Wrapper):
+    """
+    Records every episode of an `rgb_array` env and keeps the best and worst
+    by total reward. Frames are taken inside the wrapper, before a vec env
+    resets a finished episode, so each replay ends on its last frame.
+    """
+
+    def __init__(self, env: gym.Env, tmp_dir: str, max_bytes: int = REPLAY_MAX_BYTES):
+        super().__init__(env)
+        self.tmp_dir = tmp_dir
+        # The best and worst episode share the budget
+        self.episode_bytes = max_bytes // 2
+        self.fps = env.metadata.get("render_fps") or DEFAULT_REPLAY_FPS
+        self.current: Optional[EpisodeEncoder] = None
+        self.best: Optional[EpisodeEncoder] = None
+        self.worst: Optional[EpisodeEncoder] = None
+        self.episodes = 0
+
+    def reset(self, **kwargs):
+        self._finish()
+        obs, info = self.env.reset(**kwargs)
+        path = os.path.join(self.tmp_dir, f"replay-{os.getpid()}-{id(self)}-{self.episodes}")
+        self.current = EpisodeEncoder(path, self.episode_bytes)
+        self.current.add(self.env.render())
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        self.current.reward += float(reward)
+        self.current.add(self.env.render())
+        if terminated or truncated:
+            self._finish()
+        return obs, reward, terminated, truncated, info
+
+    def _finish(self):
+        episode, self.current = self.current, None
+        if episode is None:
+            return
+        episode.close()
+        self.episodes += 1
+        if not episode.frames:
+            episode.discard()
+            return
+
+        replaced = []
+        if self.best is None or episode.reward > self.best.reward:
+            replaced.append(self.best)
+            self.best = episode
+        if self.worst is None or episode.reward < self.worst.reward:
+            replaced.append(self.worst)
+            self.worst = episode
+        for old in replaced:
+            if old is not None and old is not self.best and old is not self.worst:
+                old.discard()
+        if episode is not self.best and episode is not self.worst:
+            episode.discard()
+
+    def _abandon(self):
+        """Drop the episode in progress, which is only the reset after the last finished one"""
+        if self.current is not None:
+            self.current.discard()
+            self.current = None
+
+    def close(self):
+        self._abandon()
+        super().close()
+
+    def save(self, store) -> List[Dict[str, Any]]:
+        """
+        Move the kept episodes into the artifact store and return the
+        artifact fields of each frame file and index
+        """
+        self._abandon()
+        kept = [("best", self.best)]
+        if self.worst is not self.best:
+            kept.append(("worst", self.worst))
+
+        artifacts = []
+        for label, episode in kept:
+            if episode is None:
+                continue
+            blob, size = store.put_file(episode.path)
+            os.remove(episode.path)
+            index = {
+                "label": label,
+                "reward": episode.reward,
+                "length": len(episode.frames),
+                "fps": self.fps,
+                "incomplete": episode.truncated,  # the budget ran out before the episode ended
+                "video": blob,
+                "size": size,
+                "frames": episode.frames,
+            }
+            index_blob, index_size = store.put_bytes(json.dumps(index, separators=(",", ":")).encode())
+            for kind, name, digest, nbytes in (
+                ("replay", f"replay-{label}.frames", blob, size),
+                ("replay-index", f"replay-{label}.json", index_blob, index_size),
+            ):
+                artifacts.append({
+                    "kind": kind,
+                    "name": name,
+                    "digest": digest,
+                    "size": nbytes,
+                    "blob": digest,
+                    "stored_size": nbytes,
+                    "encoding": "full",
+                })
+        self.best = self.worst = None
+        return artifacts
@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import models
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "./cache/models")
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+# Bump to invalidate every cached result, e.g. after upgrading the training code
+RESULT_CACHE_VERSION = os.getenv("RESULT_CACHE_VERSION", "1")
+
+# Seed given to cached requests that don't set one, so cached runs are reproducible
+DEFAULT_CACHE_SEED = 0
+
+# Config fields stored as floats, so 1e-3 and 0.001 or 1 and 1.0 hash the same
+FLOAT_FIELDS = ("learning_rate",)
+# Config fields that don't change what a run produces
+IGNORED_FIELDS = ("checkpoint_every",)
+
+IN_FLIGHT_STATUSES = ("queued", "training")
+
+DownloadFn = Callable[[str], Awaitable[bytes]]
+
+
+def env_version(env_name: str) -> str:
+    """Version suffix of a gymnasium (`CartPole-v1`) or PettingZoo (`simple_spread_v3`) env id"""
+    match = re.search(r"[-_](v\d+)$", env_name)
+    return match.group(1) if match else "unversioned"
+
+
+def config_hash(config: Dict[str, Any]) -> str:
+    """Canonical hash of everything that determines a run's outcome"""
+    canonical = {key: value for key, value in config.items() if value is not None and key not in IGNORED_FIELDS}
+    for field in FLOAT_FIELDS:
+        if field in canonical:
+            canonical[field] = float(canonical[field])
+    canonical["env_version"] = env_version(canonical.get("env_name", ""))
+    canonical["cache_version"] = RESULT_CACHE_VERSION
+    body = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Serves repeated training requests from earlier identical runs.
+
+    Runs are matched by `config_hash`. A completed run only counts as a hit
+    while its model artifact is in the local store; the store is bounded by
+    `max_bytes` and evicts least recently used artifacts first, after which
+    the config trains again. A matching run that is still in flight is joined
+    instead of starting a duplicate.
+    """
+
+    def __init__(self, directory: str = RESULT_CACHE_DIR, max_bytes: int = RESULT_CACHE_MAX_BYTES,
+                 download: Optional[DownloadFn] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.download = download
+        # config_hash -> (path, size), least recently used first
+        self.entries: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self.stored_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.joins = 0
+        self.evictions = 0
+
+        self._locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+        self._tracked: Dict[str, str] = {}  # job_id -> config_hash, captured on completion
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._scan()
+
+    def _scan(self):
+        """Pick up artifacts stored by a previous process, oldest access first"""
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path) and not name.endswith(".tmp"):
+                stat = os.stat(path)
+                files.append((stat.st_atime, os.path.splitext(name)[0], path, stat.st_size))
+        for _, key, path, size in sorted(files):
+            self.entries[key] = (path, size)
+            self.stored_bytes += size
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+
+    # ===== LOOKUP =====
+
+    @asynccontextmanager
+    async def launching(self, key: str):
+        """Serialize lookups and launches of one config, so duplicates join instead of racing"""
+        lock, users = self._locks.get(key, (asyncio.Lock(), 0))
+        self._locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+    async def lookup(self, db, key: str) -> Tuple[Optional[str], Optional[models.TrainingRun]]:
+        """
+        Find a run for `key`: ("hit", completed run), ("join", in-flight run)
+        or (None, None) on a miss.
+        """
+        runs = db.query(models.TrainingRun).filter(
+            models.TrainingRun.config_hash == key,
+            models.TrainingRun.status.in_(("completed",) + IN_FLIGHT_STATUSES),
+        ).order_by(models.TrainingRun.created_at.desc()).all()
+
+        for run in runs:
+            if run.status == "completed" and await self.ensure_artifact(key, run.job_id, run.results or {}):
+                self.hits += 1
+                return "hit", run
+        for run in runs:
+            if run.status in IN_FLIGHT_STATUSES:
+                self.joins += 1
+                self.track(run.job_id, key)
+                return "join", run
+
+        self.misses += 1
+        return None, None
+
+    # ===== ARTIFACT STORE =====
+
+    def artifact_path(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    async def ensure_artifact(self, key: str, job_id: str, results: Dict[str, Any]) -> bool:
+        """Make sure the run's model is in the store, fetching it if needed"""
+        if self.artifact_path(key) is not None:
+            return True
+        try:
+            model_path = results.get("model_path")
+            if model_path and os.path.exists(model_path):
+                path = await asyncio.to_thread(self._copy_file, key, model_path)
+            elif self.download is not None:
+                data = await self.download(job_id)
+                path = await asyncio.to_thread(self._write_bytes, key, data, ".zip")
+            else:
+                return False
+        except Exception as e:
+            logger.warning(f"[CACHE] Could not store model for job {job_id}: {e}")
+            return False
+        self._add(key, path)
+        return True
+
+    def _copy_file(self, key: str, source: str) -> str:
+        path = os.path.join(self.directory, key + os.path.splitext(source)[1])
+        shutil.copyfile(source, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        return path
+
+    def _write_bytes(self, key: str, data: bytes, suffix: str) -> str:
+        path = os.path.join(self.directory, key + suffix)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        return path
+
+    def _add(self, key: str, path: str):
+        size = os.path.getsize(path)
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.stored_bytes -= old[1]
+        self.entries[key] = (path, size)
+        self.stored_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self.stored_bytes > self.max_bytes and len(self.entries) > 1:
+            key, (path, size) = self.entries.popitem(last=False)
+            self.stored_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            logger.info(f"[CACHE] Evicted model {key[:12]} ({size} bytes)")
+
+    # ===== COMPLETION =====
+
+    def track(self, job_id: str, key: str):
+        """Capture this job's model as soon as it completes"""
+        self._tracked[job_id] = key
+
+    def job_update(self, job_id: str, data: Dict[str, Any]):
+        """Status/metrics payload for any job; safe to call from worker threads"""
+        if job_id not in self._tracked or data.get("status") not in ("completed", "failed", "stopped"):
+            return
+        key = self._tracked.pop(job_id)
+        if data["status"] == "completed" and self._loop is not None:
+            asyncio.run_coroutine_threadsafe(
+                self.ensure_artifact(key, job_id, data.get("results") or {}), self._loop
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.joins
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "joins": self.joins,
+            "hit_rate": (self.hits + self.joins) / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+            "stored_bytes": self.stored_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "tracked_jobs": len(self._tracked),
+        }
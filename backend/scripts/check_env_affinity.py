@@ -0,0 +1,86 @@
+"""
+Env subprocess pinning check.
+
+Builds "subproc" and "shm" vectorized envs the way a local training worker
+does, then reads back each env process's CPU affinity and exits non-zero
+unless every copy is pinned to its own core of the job's grant (round robin
+when there are more copies than cores). Also checks that the pool sizes
+the grant of subprocess jobs from their `n_envs`.
+
+    cd backend && python scripts/check_env_affinity.py
+    python scripts/check_env_affinity.py --env CartPole-v1 --n-envs 4
+"""
+import argparse
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from local_trainer import LocalJob, LocalTrainingPool, available_cores  # noqa: E402
+from vec_env import make_vec_env, resolve_vectorization  # noqa: E402
+
+
+def check_grant(pool: LocalTrainingPool, n_envs: int) -> list:
+    """Problems with the cores the pool would give a job, one line each"""
+    problems = []
+    for mode in ("subproc", "shm"):
+        job = LocalJob("check", {"env_name": "CartPole-v1", "vec_env": mode, "n_envs": n_envs})
+        wanted = pool._cores_wanted(job)
+        expected = min(max(n_envs, pool.threads_per_job), pool.total_cores)
+        if wanted != expected:
+            problems.append(f"{mode} job with n_envs={n_envs} gets {wanted} cores, expected {expected}")
+    job = LocalJob("check", {"env_name": "CartPole-v1", "vec_env": "dummy", "n_envs": n_envs})
+    if pool._cores_wanted(job) != pool.threads_per_job:
+        problems.append(f"dummy job gets {pool._cores_wanted(job)} cores, expected {pool.threads_per_job}")
+    return problems
+
+
+def check_mode(env_name: str, mode: str, n_envs: int, cores: list) -> list:
+    """Problems with the affinity of one vectorized env's processes, one line each"""
+    problems = []
+    _, default_n_envs, _ = resolve_vectorization({"env_name": env_name, "vec_env": mode, "n_steps": 2048}, len(cores))
+    if default_n_envs != len(cores):
+        problems.append(f"{mode} defaults to {default_n_envs} copies on {len(cores)} cores")
+
+    env = make_vec_env(env_name, n_envs, mode, cores)
+    try:
+        for rank, process in enumerate(env.processes):
+            affinity = sorted(os.sched_getaffinity(process.pid))
+            expected = [cores[rank % len(cores)]]
+            status = "ok  " if affinity == expected else "FAIL"
+            print(f"{status} {mode} env {rank} (pid {process.pid}): cores {affinity}, expected {expected}")
+            if affinity != expected:
+                problems.append(f"{mode} env {rank} runs on cores {affinity}")
+    finally:
+        env.close()
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--env", default="CartPole-v1")
+    parser.add_argument("--n-envs", type=int, default=4)
+    args = parser.parse_args()
+
+    if not hasattr(os, "sched_setaffinity"):
+        print("CPU affinity is not supported on this platform, nothing to check")
+        return
+
+    pool = LocalTrainingPool()
+    problems = check_grant(pool, args.n_envs)
+    cores = available_cores()[:pool._cores_wanted(LocalJob("check", {"vec_env": "subproc", "n_envs": args.n_envs}))]
+    print(f"job grant: cores {cores} for {args.n_envs} env copies")
+    for mode in ("subproc", "shm"):
+        problems += check_mode(args.env, mode, args.n_envs, cores)
+
+    for problem in problems:
+        print(f"FAIL {problem}")
+    if problems:
+        print(f"{len(problems)} check(s) failed")
+        sys.exit(1)
+    print("every env process is pinned to its core of the grant")
+
+
+if __name__ == "__main__":
+    main()
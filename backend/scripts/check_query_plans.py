@@ -0,0 +1,149 @@
+"""
+Migration smoke test.
+
+Builds a scratch database with `alembic upgrade head`, checks that the
+migrated schema matches models.py, then runs EXPLAIN on every query the
+gateway issues on its hot paths and exits non-zero if any of them needs a
+full table scan or a separate sort.
+
+    cd backend && python scripts/check_query_plans.py
+    python scripts/check_query_plans.py --url postgresql+psycopg2://...
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, func, text, tuple_
+from sqlalchemy.orm import Session
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import models  # noqa: E402
+
+Run = models.TrainingRun
+Point = models.MetricPoint
+Artifact = models.Artifact
+Queued = models.QueuedJob
+Sweep = models.Sweep
+Trial = models.SweepTrial
+
+
+def hot_queries(db: Session):
+    """The queries main.py and its helpers run per request, by name"""
+    cursor = datetime(2026, 1, 1)
+    runs = db.query(Run.id, Run.job_id, Run.status, Run.created_at)
+
+    def history(*criteria):
+        return runs.filter(*criteria).order_by(Run.created_at.desc(), Run.id.desc()).limit(101)
+
+    return {
+        "run by job_id": db.query(Run).filter(Run.job_id == "job"),
+        "run by id": db.query(Run).filter(Run.id == 1),
+        "run ids by job_ids": db.query(Run.job_id, Run.id).filter(Run.job_id.in_(["a", "b"])),
+        "update by job_id": Run.__table__.update().where(Run.job_id == "job").values(status="training"),
+        "history newest first": history(),
+        "history next page": history(tuple_(Run.created_at, Run.id) < tuple_(cursor, 10)),
+        "history by status": history(Run.status == "completed"),
+        "history by environment": history(Run.environment == "CartPole-v1"),
+        "history by agent": history(Run.agent == "PPO"),
+        "series for run": db.query(Point.timestep, Point.reward).filter(Point.run_id == 1).order_by(Point.timestep),
+        "series bounds": db.query(func.count(), func.min(Point.timestep), func.max(Point.timestep)).filter(Point.run_id == 1),
+        "delete series": db.query(Point).filter(Point.run_id == 1),
+        "result cache lookup": db.query(Run).filter(
+            Run.config_hash == "key", Run.status.in_(("completed", "queued", "training"))
+        ).order_by(Run.created_at.desc()),
+        "latest checkpoint": db.query(Artifact).filter(
+            Artifact.job_id == "job", Artifact.kind == "checkpoint"
+        ).order_by(Artifact.timestep.desc(), Artifact.id.desc()).limit(1),
+        "checkpoint base": db.query(Artifact).filter(Artifact.job_id == "job", Artifact.digest == "sha"),
+        "artifacts for run": db.query(Artifact).filter(Artifact.job_id == "job").order_by(
+            Artifact.created_at, Artifact.id),
+        "replay indexes": db.query(Artifact).filter(
+            Artifact.job_id == "job", Artifact.kind == "replay-index"
+        ).order_by(Artifact.created_at, Artifact.id),
+        "artifact by digest": db.query(Artifact).filter(Artifact.digest == "sha").limit(1),
+        "blob references": db.query(Artifact.id).filter(Artifact.blob == "blob").limit(1),
+        "queue sync": db.query(Queued.id, Queued.job_id, Queued.state).filter(
+            Queued.state.in_(("waiting", "running"))),
+        "queue lost local jobs": db.query(Queued).filter(
+            Queued.state == "running", Queued.backend == "local"
+        ).order_by(Queued.id),
+        "queue job durations": db.query(Queued).filter(
+            Queued.state == "done", Queued.admitted_at.isnot(None), Queued.finished_at.isnot(None)
+        ).order_by(Queued.id.desc()).limit(50),
+        "queued job by job_id": db.query(Queued.backend_job_id).filter(Queued.job_id == "job"),
+        "active sweeps": db.query(Sweep).filter(Sweep.status.in_(("running", "stopping"))),
+        "sweeps newest first": db.query(Sweep).order_by(Sweep.created_at.desc()).limit(50),
+        "trials of sweep": db.query(Trial).filter(Trial.sweep_id == 1),
+    }
+
+
+def compile_query(query, engine):
+    statement = getattr(query, "statement", query)
+    return str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+
+
+def plan_problems(connection, sql: str):
+    """Return the plan and what is wrong with it, per dialect"""
+    if connection.dialect.name == "sqlite":
+        rows = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+        plan = [row[-1] for row in rows]
+        problems = [
+            line for line in plan
+            if (line.startswith("SCAN") and "USING" not in line) or "TEMP B-TREE" in line
+        ]
+    else:
+        # Tables are tiny here, so make the planner show whether an index is usable at all
+        connection.execute(text("SET enable_seqscan = off"))
+        connection.execute(text("SET enable_sort = off"))
+        rows = connection.execute(text(f"EXPLAIN {sql}")).fetchall()
+        plan = [row[0] for row in rows]
+        problems = [line for line in plan if "Seq Scan" in line or line.strip().startswith("Sort")]
+    return plan, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="database to migrate (defaults to a scratch SQLite file)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url or f"sqlite:///{tmp}/check.db"
+        config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+        config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+        config.cmd_opts = argparse.Namespace(x=[f"url={url}"])
+        command.upgrade(config, "head")
+
+        engine = create_engine(url)
+        failures = 0
+        with engine.connect() as connection:
+            diff = compare_metadata(MigrationContext.configure(connection), models.Base.metadata)
+            if diff:
+                failures += 1
+                print("FAIL migrations do not match models.py:")
+                for entry in diff:
+                    print(f"    {entry}")
+
+            with Session(bind=connection) as db:
+                for name, query in hot_queries(db).items():
+                    plan, problems = plan_problems(connection, compile_query(query, engine))
+                    status = "FAIL" if problems else "ok  "
+                    failures += bool(problems)
+                    print(f"{status} {name}: {' | '.join(plan)}")
+        engine.dispose()
+
+    if failures:
+        print(f"{failures} check(s) failed")
+        sys.exit(1)
+    print("all queries use indexes")
+
+
+if __name__ == "__main__":
+    main()
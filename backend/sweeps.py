@@ -0,0 +1,451 @@
+import asyncio
+import itertools
+import logging
+import math
+import os
+import random
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+import models
+
+logger = logging.getLogger(__name__)
+
+# TrainingRequest fields a sweep may search over
+SWEEP_PARAMS = ("learning_rate", "n_steps", "batch_size", "n_epochs")
+SWEEP_METHODS = ("grid", "random", "bayes")
+
+# Trials are "done" for the scheduler once in one of these states
+FINISHED_TRIAL_STATUSES = {"completed", "pruned", "failed", "stopped"}
+# Consecutive failed metrics polls after which a running trial is marked failed;
+# a trial whose job is not found (404) is marked failed right away
+SWEEP_MAX_POLL_FAILURES = int(os.getenv("SWEEP_MAX_POLL_FAILURES", "30"))
+
+# Bayesian (TPE) search: random trials before modelling, share of trials counted as good
+TPE_STARTUP_TRIALS = 5
+TPE_GAMMA = 0.25
+TPE_CANDIDATES = 24
+
+LaunchFn = Callable[[Dict[str, Any]], Awaitable[Tuple[str, int]]]
+JobFn = Callable[[str], Awaitable[Dict[str, Any]]]
+LeaderFn = Callable[[], Awaitable[bool]]
+
+
+# ===== SEARCH SPACE =====
+
+def parse_space(space: Dict[str, Any], method: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Normalize a search space.
+
+    Each parameter is either a list of values or a range
+    `{"min": .., "max": .., "log": bool, "type": "int" | "float"}`.
+    Grid search only accepts lists.
+    """
+    if method not in SWEEP_METHODS:
+        raise HTTPException(status_code=400, detail=f"Unknown method '{method}', expected one of {list(SWEEP_METHODS)}")
+    if not space:
+        raise HTTPException(status_code=400, detail="Search space is empty")
+
+    parsed = {}
+    for name, spec in space.items():
+        if name not in SWEEP_PARAMS:
+            raise HTTPException(status_code=400, detail=f"Cannot sweep '{name}', expected any of {list(SWEEP_PARAMS)}")
+        if isinstance(spec, list):
+            if not spec:
+                raise HTTPException(status_code=400, detail=f"No values given for '{name}'")
+            parsed[name] = {"values": spec}
+        elif isinstance(spec, dict) and "min" in spec and "max" in spec:
+            if method == "grid":
+                raise HTTPException(status_code=400, detail=f"Grid search needs a list of values for '{name}'")
+            low, high = float(spec["min"]), float(spec["max"])
+            log = bool(spec.get("log", False))
+            if low >= high or (log and low <= 0):
+                raise HTTPException(status_code=400, detail=f"Invalid range for '{name}'")
+            parsed[name] = {"min": low, "max": high, "log": log, "type": spec.get("type", "float")}
+        else:
+            raise HTTPException(status_code=400, detail=f"Invalid search space for '{name}'")
+    return parsed
+
+
+def grid_size(space: Dict[str, Dict[str, Any]]) -> int:
+    return math.prod(len(spec["values"]) for spec in space.values())
+
+
+def grid_params(space: Dict[str, Dict[str, Any]], index: int) -> Dict[str, Any]:
+    names = list(space)
+    combo = next(itertools.islice(itertools.product(*(space[n]["values"] for n in names)), index, None))
+    return dict(zip(names, combo))
+
+
+def space_samples(space: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Params covering every listed value and range bound of a space, changing one
+    parameter at a time, for checking a sweep's trials before any is launched
+    """
+    first = {name: spec["values"][0] if "values" in spec else _from_unit(spec, 0.0) for name, spec in space.items()}
+    samples = [first]
+    for name, spec in space.items():
+        candidates = spec["values"][1:] if "values" in spec else [_from_unit(spec, 1.0)]
+        samples.extend({**first, name: value} for value in candidates)
+    return samples
+
+
+def launch_refused(error: HTTPException) -> bool:
+    """Whether a trial launch was refused for its config, so retrying it can't help"""
+    status = getattr(error, "upstream_status", error.status_code)
+    return 400 <= status < 500 and status != 429
+
+
+def _to_unit(spec: Dict[str, Any], value: float) -> float:
+    low, high = spec["min"], spec["max"]
+    if spec["log"]:
+        return (math.log(value) - math.log(low)) / (math.log(high) - math.log(low))
+    return (value - low) / (high - low)
+
+
+def _from_unit(spec: Dict[str, Any], u: float):
+    low, high = spec["min"], spec["max"]
+    u = min(1.0, max(0.0, u))
+    value = math.exp(math.log(low) + u * (math.log(high) - math.log(low))) if spec["log"] else low + u * (high - low)
+    return int(round(value)) if spec["type"] == "int" else value
+
+
+def random_params(space: Dict[str, Dict[str, Any]], rng: random.Random) -> Dict[str, Any]:
+    return {
+        name: rng.choice(spec["values"]) if "values" in spec else _from_unit(spec, rng.random())
+        for name, spec in space.items()
+    }
+
+
+def _parzen_log_density(u: float, points: List[float], bandwidth: float) -> float:
+    # Mixture of Gaussians around observed points plus a uniform prior component
+    total = 1.0
+    for p in points:
+        total += math.exp(-0.5 * ((u - p) / bandwidth) ** 2) / (bandwidth * math.sqrt(2 * math.pi))
+    return math.log(total / (len(points) + 1))
+
+
+def tpe_params(space: Dict[str, Dict[str, Any]], observations: List[Tuple[Dict[str, Any], float]],
+               rng: random.Random) -> Dict[str, Any]:
+    """
+    Tree-structured Parzen estimator, one parameter at a time.
+
+    Observations are split into the best `TPE_GAMMA` share and the rest; each
+    parameter takes the candidate, drawn around good values, that maximizes
+    the density ratio good/bad.
+    """
+    if len(observations) < TPE_STARTUP_TRIALS:
+        return random_params(space, rng)
+
+    ranked = sorted(observations, key=lambda item: item[1], reverse=True)
+    n_good = max(1, math.ceil(TPE_GAMMA * len(ranked)))
+    good, bad = [p for p, _ in ranked[:n_good]], [p for p, _ in ranked[n_good:]]
+
+    params = {}
+    for name, spec in space.items():
+        if "values" in spec:
+            values = spec["values"]
+            good_counts = [1 + sum(p.get(name) == v for p in good) for v in values]
+            bad_counts = [1 + sum(p.get(name) == v for p in bad) for v in values]
+            weights = [
+                (g / (len(good) + len(values))) / (b / (len(bad) + len(values)))
+                for g, b in zip(good_counts, bad_counts)
+            ]
+            params[name] = rng.choices(values, weights=weights)[0]
+            continue
+
+        good_u = [_to_unit(spec, p[name]) for p in good if name in p]
+        bad_u = [_to_unit(spec, p[name]) for p in bad if name in p]
+        bandwidth = max(0.05, len(good_u + bad_u) ** -0.2 * 0.5)
+        candidates = [
+            rng.gauss(rng.choice(good_u), bandwidth) if good_u else rng.random()
+            for _ in range(TPE_CANDIDATES)
+        ]
+        candidates = [min(1.0, max(0.0, u)) for u in candidates]
+        best = max(candidates, key=lambda u: _parzen_log_density(u, good_u, bandwidth)
+                   - _parzen_log_density(u, bad_u, bandwidth))
+        params[name] = _from_unit(spec, best)
+    return params
+
+
+# ===== SUCCESSIVE HALVING =====
+
+def asha_rungs(total_timesteps: int, reduction_factor: int, min_timesteps: Optional[int] = None) -> List[int]:
+    """Timestep milestones at which trials are compared, each `reduction_factor` times the last"""
+    rung = min_timesteps or max(1, total_timesteps // reduction_factor ** 3)
+    rungs = []
+    while rung < total_timesteps:
+        rungs.append(rung)
+        rung *= reduction_factor
+    return rungs
+
+
+def asha_keeps(reward: float, rung_rewards: List[float], reduction_factor: int) -> bool:
+    """
+    Asynchronous successive halving: a trial reaching a rung continues only
+    if it is in the top 1/reduction_factor of every trial seen at that rung.
+    Until `reduction_factor` trials have reached the rung, all continue.
+    """
+    if len(rung_rewards) < reduction_factor:
+        return True
+    keep = max(1, len(rung_rewards) // reduction_factor)
+    cutoff = sorted(rung_rewards, reverse=True)[keep - 1]
+    return reward >= cutoff
+
+
+# ===== SERIALIZATION =====
+
+def trial_config(sweep: models.Sweep, params: Dict[str, Any]) -> Dict[str, Any]:
+    return {**sweep.base_config, **params}
+
+
+def best_trial(trials: List[models.SweepTrial]) -> Optional[models.SweepTrial]:
+    completed = [t for t in trials if t.status == "completed" and t.reward is not None]
+    return max(completed, key=lambda t: t.reward) if completed else None
+
+
+def serialize_trial(trial: models.SweepTrial) -> Dict[str, Any]:
+    return {
+        "id": trial.id,
+        "trial_index": trial.trial_index,
+        "run_id": trial.run_id,
+        "job_id": trial.job_id,
+        "params": trial.params,
+        "status": trial.status,
+        "reward": trial.reward,
+        "timesteps": trial.timesteps,
+        "rung_rewards": trial.rung_rewards,
+    }
+
+
+def serialize_sweep(sweep: models.Sweep, trials: List[models.SweepTrial], include_trials: bool = True) -> Dict[str, Any]:
+    best = best_trial(trials)
+    data = {
+        "id": sweep.id,
+        "name": sweep.name,
+        "method": sweep.method,
+        "status": sweep.status,
+        "space": sweep.space,
+        "base_config": sweep.base_config,
+        "max_trials": sweep.max_trials,
+        "max_concurrent": sweep.max_concurrent,
+        "early_stopping": sweep.early_stopping,
+        "trial_counts": {
+            status: sum(1 for t in trials if t.status == status)
+            for status in ("running", "completed", "pruned", "failed", "stopped")
+        },
+        "best": None if best is None else {
+            **serialize_trial(best),
+            "config": trial_config(sweep, best.params),
+        },
+        "created_at": sweep.created_at.isoformat() if sweep.created_at else None,
+    }
+    if include_trials:
+        data["trials"] = [serialize_trial(t) for t in sorted(trials, key=lambda t: t.trial_index)]
+    return data
+
+
+# ===== SCHEDULER =====
+
+class SweepScheduler:
+    """
+    Drives every running sweep from one background task.
+
+    The scheduler is the only writer of trial state: stopping a sweep just
+    marks it "stopping" and the next tick stops its trials.
+
+    Each tick polls the metrics of running trials, prunes trials that fall
+    behind at a successive-halving rung, launches new trials up to the
+    sweep's concurrency cap and marks the sweep completed once nothing is
+    left to run. All state lives in the database, so sweeps resume after a
+    restart. With several gateway workers, only the one for which
+    `is_leader` returns True ticks.
+    """
+
+    def __init__(self, session_factory, launch: LaunchFn, fetch_metrics: JobFn, stop_job: JobFn,
+                 interval: float = 2.0, is_leader: Optional[LeaderFn] = None):
+        self.session_factory = session_factory
+        self.is_leader = is_leader
+        self.launch = launch
+        self.fetch_metrics = fetch_metrics
+        self.stop_job = stop_job
+        self.interval = interval
+        self._poll_failures: Dict[int, int] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self):
+        """Schedule a tick now, e.g. after a sweep was created"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                if self.is_leader is not None and not await self.is_leader():
+                    continue
+            except Exception as e:
+                logger.error(f"[SWEEP] Could not check the scheduler lease: {e}")
+                continue
+
+            db = self.session_factory()
+            try:
+                sweeps = db.query(models.Sweep).filter(models.Sweep.status.in_(("running", "stopping"))).all()
+                for sweep in sweeps:
+                    try:
+                        await self.tick(db, sweep)
+                        db.commit()
+                    except Exception as e:
+                        db.rollback()
+                        logger.error(f"[SWEEP] Error advancing sweep {sweep.id}: {e}")
+            finally:
+                db.close()
+
+    async def tick(self, db, sweep: models.Sweep):
+        trials = db.query(models.SweepTrial).filter(models.SweepTrial.sweep_id == sweep.id).all()
+        if sweep.status == "stopping":
+            await self._stop(sweep, trials)
+            return
+        running = [t for t in trials if t.status == "running" and t.job_id]
+
+        results = await asyncio.gather(*(self.fetch_metrics(t.job_id) for t in running), return_exceptions=True)
+        for trial, data in zip(running, results):
+            if isinstance(data, Exception):
+                self._poll_failed(db, sweep, trial, data)
+                continue
+            self._poll_failures.pop(trial.id, None)
+            await self._observe(sweep, trial, data, trials)
+
+        await self._launch_trials(db, sweep, trials)
+
+        if all(t.status in FINISHED_TRIAL_STATUSES for t in trials) and len(trials) >= sweep.max_trials:
+            sweep.status = "completed"
+            best = best_trial(trials)
+            logger.info(f"[SWEEP] Sweep {sweep.id} completed, best trial "
+                        f"{best.trial_index if best else None} ({best.reward if best else None})")
+
+    def _poll_failed(self, db, sweep: models.Sweep, trial: models.SweepTrial, error: Exception):
+        """
+        Give up on a trial whose job no longer exists, e.g. a local job lost
+        in a restart, or that couldn't be polled SWEEP_MAX_POLL_FAILURES
+        times in a row, so it stops holding a concurrency slot
+        """
+        detail = error.detail if isinstance(error, HTTPException) else error
+        failures = self._poll_failures[trial.id] = self._poll_failures.get(trial.id, 0) + 1
+        gone = isinstance(error, HTTPException) and error.status_code == 404
+        if not gone and failures < SWEEP_MAX_POLL_FAILURES:
+            logger.warning(f"[SWEEP] Could not poll trial {trial.id} ({trial.job_id}): {detail}")
+            return
+
+        self._poll_failures.pop(trial.id, None)
+        trial.status = "failed"
+        if trial.run_id is not None:
+            db.query(models.TrainingRun).filter(
+                models.TrainingRun.id == trial.run_id,
+                models.TrainingRun.status.notin_(("completed", "failed", "stopped")),
+            ).update({"status": "failed"}, synchronize_session=False)
+        reason = "its job is gone" if gone else f"{failures} failed polls"
+        logger.error(f"[SWEEP] Marking trial {trial.trial_index} of sweep {sweep.id} ({trial.job_id}) failed,"
+                     f" {reason}: {detail}")
+
+    async def _observe(self, sweep: models.Sweep, trial: models.SweepTrial, data: Dict[str, Any],
+                       trials: List[models.SweepTrial]):
+        metrics = data.get("metrics") or {}
+        status = data.get("status")
+        trial.timesteps = metrics.get("timesteps", trial.timesteps)
+        if metrics.get("mean_reward") is not None:
+            trial.reward = metrics["mean_reward"]
+
+        if status in ("completed", "failed", "stopped"):
+            results = data.get("results") or {}
+            if status == "completed" and results.get("mean_reward") is not None:
+                trial.reward = results["mean_reward"]
+            trial.status = status
+            return
+
+        if not sweep.early_stopping or trial.reward is None:
+            return
+        reduction_factor = sweep.early_stopping["reduction_factor"]
+        for rung in sweep.early_stopping["rungs"]:
+            key = str(rung)
+            if trial.timesteps < rung or key in (trial.rung_rewards or {}):
+                continue
+            trial.rung_rewards = {**(trial.rung_rewards or {}), key: trial.reward}
+            seen = [t.rung_rewards[key] for t in trials if key in (t.rung_rewards or {})]
+            if not asha_keeps(trial.reward, seen, reduction_factor):
+                logger.info(f"[SWEEP] Pruning trial {trial.trial_index} of sweep {sweep.id} at {rung} timesteps")
+                trial.status = "pruned"
+                try:
+                    await self.stop_job(trial.job_id)
+                except Exception as e:
+                    logger.warning(f"[SWEEP] Could not stop pruned trial {trial.id}: {e}")
+                return
+
+    async def _launch_trials(self, db, sweep: models.Sweep, trials: List[models.SweepTrial]):
+        running = sum(1 for t in trials if t.status == "running")
+        while running < sweep.max_concurrent and len(trials) < sweep.max_trials:
+            index = len(trials)
+            params = self.next_params(sweep, index, trials)
+            try:
+                job_id, run_id = await self.launch(trial_config(sweep, params))
+                status = "running"
+            except HTTPException as e:
+                if not launch_refused(e):
+                    # Backend busy or down; retry on the next tick
+                    logger.warning(f"[SWEEP] Could not launch trial {index} of sweep {sweep.id}: {e.detail}")
+                    return
+                logger.error(f"[SWEEP] Trial {index} of sweep {sweep.id} was refused, marking it failed: {e.detail}")
+                job_id, run_id, status = None, None, "failed"
+            trial = models.SweepTrial(
+                sweep_id=sweep.id, trial_index=index, params=params,
+                job_id=job_id, run_id=run_id, status=status, rung_rewards={},
+            )
+            db.add(trial)
+            # Commit straight away: the launched job exists whatever happens next,
+            # and the SQLite write lock must be free before the next launch
+            db.commit()
+            trials.append(trial)
+            if status == "running":
+                running += 1
+                logger.info(f"[SWEEP] Launched trial {index} of sweep {sweep.id}: {params}")
+
+    def next_params(self, sweep: models.Sweep, index: int, trials: List[models.SweepTrial]) -> Dict[str, Any]:
+        # Seeded per trial, so a restart draws the same candidates
+        rng = random.Random(f"{sweep.seed}:{sweep.id}:{index}")
+        if sweep.method == "grid":
+            return grid_params(sweep.space, index)
+        if sweep.method == "bayes":
+            observations = [
+                (t.params, t.reward) for t in trials
+                if t.reward is not None and t.status in ("completed", "pruned")
+            ]
+            return tpe_params(sweep.space, observations, rng)
+        return random_params(sweep.space, rng)
+
+    async def _stop(self, sweep: models.Sweep, trials: List[models.SweepTrial]):
+        for trial in trials:
+            if trial.status != "running":
+                continue
+            try:
+                await self.stop_job(trial.job_id)
+            except Exception as e:
+                logger.warning(f"[SWEEP] Could not stop trial {trial.id}: {e}")
+            trial.status = "stopped"
+        sweep.status = "stopped"
+        logger.info(f"[SWEEP] Stopped sweep {sweep.id}")
@@ -0,0 +1,234 @@
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+
+import models
+
+logger = logging.getLogger(__name__)
+
+# Columns of MetricPoint that can be charted
+SERIES_FIELDS = ("reward", "std_reward", "episode_length", "loss", "episodes")
+
+
+def point_from_metrics(run_id: int, metrics: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Turn a metrics payload from the Space into a MetricPoint row"""
+    timestep = metrics.get("timesteps")
+    if timestep is None:
+        return None
+
+    episode_lengths = metrics.get("episode_lengths") or []
+    episode_length = metrics.get("mean_episode_length")
+    if episode_length is None and episode_lengths:
+        episode_length = episode_lengths[-1]
+
+    loss = metrics.get("loss", metrics.get("train_loss"))
+
+    return {
+        "run_id": run_id,
+        "timestep": int(timestep),
+        "episodes": metrics.get("episodes"),
+        "reward": metrics.get("mean_reward"),
+        "std_reward": metrics.get("std_reward"),
+        "episode_length": episode_length,
+        "loss": loss,
+    }
+
+
+def insert_points(db):
+    """INSERT into metric_points that leaves an existing (run_id, timestep) alone"""
+    table = models.MetricPoint.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return table.insert()
+    return insert(table).on_conflict_do_nothing(index_elements=["run_id", "timestep"])
+
+
+class SeriesWriter:
+    """
+    Buffer metric points in memory and append them in batches.
+
+    Points are only ever inserted, never updated: a point is dropped if its
+    timestep is not newer than the last one seen for the run, so repeated
+    polls of an idle job don't grow the table. The last timestep of a run is
+    loaded from the table the first time the run is seen (`load_last`), and
+    a point that is already stored is skipped by the insert itself.
+    """
+
+    def __init__(self, session_factory, batch_size: int = 500):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self._pending: List[Dict[str, Any]] = []
+        self._last_timestep: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def append(self, run_id: int, metrics: Dict[str, Any]) -> bool:
+        """Queue a point, returning True when the buffer should be flushed"""
+        point = point_from_metrics(run_id, metrics)
+        if point is None:
+            return False
+
+        with self._lock:
+            if point["timestep"] <= self._last_timestep.get(run_id, -1):
+                return False
+            self._last_timestep[run_id] = point["timestep"]
+            self._pending.append(point)
+            return len(self._pending) >= self.batch_size
+
+    def load_last(self, db, run_ids: Iterable[int]):
+        """Seed the last recorded timestep of runs not seen since startup"""
+        with self._lock:
+            missing = [run_id for run_id in set(run_ids) if run_id not in self._last_timestep]
+        if not missing:
+            return
+        rows = db.query(models.MetricPoint.run_id, func.max(models.MetricPoint.timestep)).filter(
+            models.MetricPoint.run_id.in_(missing)
+        ).group_by(models.MetricPoint.run_id).all()
+        last = {run_id: -1 for run_id in missing}
+        last.update({run_id: timestep for run_id, timestep in rows})
+        with self._lock:
+            for run_id, timestep in last.items():
+                self._last_timestep[run_id] = max(timestep, self._last_timestep.get(run_id, -1))
+
+    def continue_after(self, run_id: int, timestep: int):
+        """Only accept points past `timestep`, e.g. for a run resumed from an earlier checkpoint"""
+        with self._lock:
+            self._last_timestep[run_id] = max(timestep, self._last_timestep.get(run_id, -1))
+
+    def take(self) -> List[Dict[str, Any]]:
+        """Hand over everything buffered so far"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        return pending
+
+    def requeue(self, points: Sequence[Dict[str, Any]]):
+        """Return points from a failed write to the front of the buffer"""
+        with self._lock:
+            self._pending[:0] = points
+
+    def write(self, db, points: Sequence[Dict[str, Any]]):
+        """Append points inside the caller's transaction, skipping any already stored"""
+        if points:
+            db.execute(insert_points(db), list(points))
+
+    def flush(self):
+        points = self.take()
+        if not points:
+            return
+        db = self.session_factory()
+        try:
+            self.write(db, points)
+            db.commit()
+            logger.debug(f"[SERIES] Appended {len(points)} metric points")
+        except IntegrityError as e:
+            # Retrying would fail the same way, e.g. the run was deleted meanwhile
+            db.rollback()
+            logger.error(f"[SERIES] Dropped {len(points)} metric points that violate a constraint: {e}")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[SERIES] Failed to append {len(points)} metric points: {e}")
+            self.requeue(points)
+        finally:
+            db.close()
+
+    def forget(self, run_id: int):
+        """Drop buffered state for a deleted run"""
+        with self._lock:
+            self._last_timestep.pop(run_id, None)
+            self._pending = [p for p in self._pending if p["run_id"] != run_id]
+
+
+# ===== DOWNSAMPLING =====
+
+def lttb(points: Sequence[Tuple[float, float]], threshold: int) -> List[Tuple[float, float]]:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last point and, for each bucket in between, the point
+    forming the largest triangle with the previously kept point and the
+    average of the next bucket.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        next_bucket = points[next_start:next_end] or [points[-1]]
+        avg_x = sum(p[0] for p in next_bucket) / len(next_bucket)
+        avg_y = sum(p[1] for p in next_bucket) / len(next_bucket)
+
+        ax, ay = points[a]
+        best_area = -1.0
+        best = start
+        for j in range(start, end):
+            bx, by = points[j]
+            area = abs((ax - avg_x) * (by - ay) - (ax - bx) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+
+        sampled.append(points[best])
+        a = best
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def query_series(db, run_id: int, field: str, max_points: int, method: str = "lttb") -> Dict[str, Any]:
+    """Load a run's series for one field, downsampled to at most `max_points`"""
+    column = getattr(models.MetricPoint, field)
+    base = db.query(models.MetricPoint).filter(
+        models.MetricPoint.run_id == run_id,
+        column.isnot(None),
+    )
+    total, first, last = base.with_entities(
+        func.count(), func.min(models.MetricPoint.timestep), func.max(models.MetricPoint.timestep)
+    ).one()
+
+    if total <= max_points or method == "lttb":
+        rows: Iterable = base.with_entities(models.MetricPoint.timestep, column).order_by(
+            models.MetricPoint.timestep
+        ).all()
+        points = [(t, v) for t, v in rows]
+        if total > max_points:
+            points = lttb(points, max_points)
+    else:
+        # Min/max buckets are computed by the database: each bucket keeps the
+        # points where its lowest and highest value occur, in timestep order
+        buckets = max(1, max_points // 2)
+        width = max(1, (last - first) // buckets + 1)
+        timestep = models.MetricPoint.timestep
+        bucket = (timestep - first) // width
+        ranked = base.with_entities(
+            timestep.label("timestep"),
+            column.label("value"),
+            func.row_number().over(partition_by=bucket, order_by=(column.asc(), timestep)).label("low"),
+            func.row_number().over(partition_by=bucket, order_by=(column.desc(), timestep)).label("high"),
+        ).subquery()
+        rows = db.query(ranked.c.timestep, ranked.c.value).filter(
+            or_(ranked.c.low == 1, ranked.c.high == 1)
+        ).order_by(ranked.c.timestep).all()
+        points = [(t, v) for t, v in rows]
+
+    return {
+        "run_id": run_id,
+        "field": field,
+        "method": method if total > max_points else "raw",
+        "total_points": total,
+        "points": [[t, v] for t, v in points],
+    }
@@ -0,0 +1,355 @@
+"""
+Training code that runs inside a local worker process.
+
+Everything heavy (torch, gymnasium, stable-baselines3) is imported here, in
+the child, so the gateway process never pays for it.
+"""
+import io
+import os
+import re
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+# How often a running job reports metrics back to the gateway
+METRICS_INTERVAL_SECONDS = float(os.getenv("LOCAL_METRICS_INTERVAL", "1.0"))
+EVAL_EPISODES = int(os.getenv("LOCAL_EVAL_EPISODES", "5"))
+# Default timesteps between checkpoints written to the artifact store, 0 to disable
+CHECKPOINT_EVERY = int(os.getenv("LOCAL_CHECKPOINT_EVERY", "50000"))
+# Frames per second of the live preview sent while someone watches a job
+LOCAL_RENDER_FPS = float(os.getenv("LOCAL_RENDER_FPS", "15"))
+# The only packages multi-agent envs are imported from; a bare env name like
+# "simple_spread_v3" is looked up in each, in order
+PETTINGZOO_PACKAGES = tuple(
+    package.strip() for package in os.getenv(
+        "PETTINGZOO_PACKAGES", "mpe2,pettingzoo.sisl,pettingzoo.butterfly,pettingzoo.classic,pettingzoo.atari"
+    ).split(",") if package.strip()
+)
+
+MODULE_PATH = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*")
+
+
+def parallel_env_modules(env_name: str) -> List[str]:
+    """
+    Modules that may hold the multi-agent env `env_name`, in search order.
+    Raises ValueError for anything outside PETTINGZOO_PACKAGES, so a request
+    can't make a worker import a module of its choosing.
+    """
+    if not MODULE_PATH.fullmatch(env_name):
+        raise ValueError(f"Invalid multi-agent env_name '{env_name}'")
+    if "." not in env_name:
+        return [f"{package}.{env_name}" for package in PETTINGZOO_PACKAGES]
+    if not any(env_name.startswith(f"{package}.") for package in PETTINGZOO_PACKAGES):
+        raise ValueError(
+            f"Multi-agent env_name '{env_name}' is not in an allowed package, expected one of {list(PETTINGZOO_PACKAGES)}"
+        )
+    return [env_name]
+
+
+def ppo_kwargs(config: Dict[str, Any]) -> Dict[str, Any]:
+    """TrainingRequest fields that map straight onto PPO constructor arguments"""
+    kwargs = {
+        "learning_rate": config["learning_rate"],
+        "n_steps": config["n_steps"],
+        "batch_size": config["batch_size"],
+        "n_epochs": config["n_epochs"],
+    }
+    if config.get("seed") is not None:
+        kwargs["seed"] = config["seed"]
+    return kwargs
+
+
+def checkpoint_bytes(state: Dict[str, Any]) -> bytes:
+    """Serialize a checkpoint state dict"""
+    import torch
+    buffer = io.BytesIO()
+    torch.save(state, buffer)
+    return buffer.getvalue()
+
+
+def load_checkpoint(store, chain: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Load a checkpoint from the artifact store, given its delta chain"""
+    import torch
+    return torch.load(io.BytesIO(store.reconstruct(chain)), weights_only=True)
+
+
+class Checkpointer:
+    """
+    Writes a job's periodic checkpoints and reports the time they cost, so
+    the checkpoint interval can be weighed against its overhead.
+    """
+
+    def __init__(self, job_id: str, config: Dict[str, Any], writer, updates, start_timestep: int = 0):
+        every = config.get("checkpoint_every")
+        self.job_id = job_id
+        self.every = CHECKPOINT_EVERY if every is None else every
+        self.writer = writer
+        self.updates = updates
+        self.last = start_timestep
+        self.count = 0
+        self.seconds = 0.0
+        self.stored_bytes = 0
+
+    def due(self, timestep: int) -> bool:
+        return self.writer is not None and self.every > 0 and timestep - self.last >= self.every
+
+    def save(self, state: Dict[str, Any], timestep: int):
+        """Write a checkpoint to the artifact store and tell the gateway about it"""
+        started = time.monotonic()
+        info = self.writer.write(checkpoint_bytes(state), timestep)
+        self.seconds += time.monotonic() - started
+        self.last = timestep
+        self.count += 1
+        self.stored_bytes += info["stored_size"]
+        self.updates.put((self.job_id, "checkpoint", info))
+
+    def metrics(self, elapsed: float) -> Dict[str, Any]:
+        return {
+            "checkpoint_every": self.every,
+            "checkpoints": self.count,
+            "checkpoint_bytes": self.stored_bytes,
+            "checkpoint_seconds": self.seconds,
+            "checkpoint_overhead": self.seconds / max(elapsed, 1e-9),
+        }
+
+
+class LivePreview:
+    """
+    Plays the current policy in a separate rendering env and sends its frames
+    as JPEGs, only while `watched` is set. Training envs are never rendered,
+    so an unwatched job pays nothing.
+    """
+
+    def __init__(self, job_id: str, env_name: str, updates, watched, fps: float = LOCAL_RENDER_FPS):
+        self.job_id = job_id
+        self.env_name = env_name
+        self.updates = updates
+        self.watched = watched
+        self.interval = 1.0 / fps
+        self.env = None
+        self.obs = None
+        self.next_frame = 0.0
+
+    def tick(self, model):
+        """Step the preview and send a frame, if one is due and someone is watching"""
+        now = time.monotonic()
+        if now < self.next_frame or not self.watched.is_set():
+            return
+        self.next_frame = now + self.interval
+
+        from vec_env import make_env
+        from websocket_handler import RENDER_JPEG_QUALITY, encode_jpeg
+        if self.env is None:
+            self.env = make_env(self.env_name, render_mode="rgb_array")
+            self.obs, _ = self.env.reset()
+        action, _ = model.predict(self.obs, deterministic=True)
+        self.obs, _, terminated, truncated, _ = self.env.step(action)
+        if terminated or truncated:
+            self.obs, _ = self.env.reset()
+        frame = self.env.render()
+        if frame is not None:
+            self.updates.put((self.job_id, "frame", encode_jpeg(frame, RENDER_JPEG_QUALITY)))
+
+    def close(self):
+        if self.env is not None:
+            self.env.close()
+            self.env = None
+
+
+def _pin_to_cores(cores: List[int]):
+    """Keep this process and torch's thread pool on the cores we were given"""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    import torch
+    torch.set_num_threads(max(1, len(cores)))
+
+
+def make_progress_callback(job_id, config, updates, stop_event, vectorization=None,
+                           checkpointer: Optional[Checkpointer] = None, resume_state: Optional[Dict[str, Any]] = None,
+                           preview: Optional[LivePreview] = None):
+    from stable_baselines3.common.callbacks import BaseCallback
+    import numpy as np
+
+    class ProgressCallback(BaseCallback):
+        """Reports metrics to the gateway and honours stop requests"""
+
+        def __init__(self):
+            super().__init__()
+            self.episode_rewards: List[float] = []
+            self.episode_lengths: List[int] = []
+            self.current_rewards = None
+            self.current_lengths = None
+            self.logs: List[str] = []
+            self.episodes_before = 0  # episodes older than the kept window, after a resume
+            self.last_report = 0.0
+            self.started_at = time.monotonic()
+            self.start_timesteps = 0
+            if resume_state is not None:
+                progress = resume_state["progress"]
+                self.episode_rewards = list(progress["episode_rewards"])
+                self.episode_lengths = list(progress["episode_lengths"])
+                self.logs = list(progress["logs"])
+                self.episodes_before = progress["episodes"] - len(self.episode_rewards)
+
+        def _on_training_start(self):
+            self.start_timesteps = self.model.num_timesteps
+            n_envs = self.training_env.num_envs
+            self.current_rewards = np.zeros(n_envs)
+            self.current_lengths = np.zeros(n_envs, dtype=int)
+
+        def _on_step(self) -> bool:
+            rewards = self.locals["rewards"]
+            dones = self.locals["dones"]
+            self.current_rewards += rewards
+            self.current_lengths += 1
+            for i in np.flatnonzero(dones):
+                self.episode_rewards.append(float(self.current_rewards[i]))
+                self.episode_lengths.append(int(self.current_lengths[i]))
+                self.current_rewards[i] = 0
+                self.current_lengths[i] = 0
+
+            now = time.monotonic()
+            if now - self.last_report >= METRICS_INTERVAL_SECONDS:
+                self.last_report = now
+                updates.put((job_id, "metrics", self.snapshot()))
+            if preview is not None:
+                preview.tick(self.model)
+
+            return not stop_event.is_set()
+
+        def _on_rollout_start(self):
+            # Runs after each policy update, so the checkpoint has its result
+            if checkpointer is not None and checkpointer.due(self.num_timesteps):
+                checkpointer.save({
+                    "num_timesteps": self.num_timesteps,
+                    "policy": self.model.policy.state_dict(),
+                    "optimizer": self.model.policy.optimizer.state_dict(),
+                    "progress": {
+                        "episodes": self.episodes_before + len(self.episode_rewards),
+                        "episode_rewards": self.episode_rewards[-100:],
+                        "episode_lengths": self.episode_lengths[-100:],
+                        "logs": self.logs[-50:],
+                    },
+                }, self.num_timesteps)
+
+        def _on_rollout_end(self):
+            loss = self.model.logger.name_to_value.get("train/loss")
+            if loss is not None:
+                self.logs.append(f"timesteps={self.num_timesteps} loss={loss:.4f}")
+                self.logs = self.logs[-50:]
+
+        def snapshot(self) -> Dict[str, Any]:
+            recent = self.episode_rewards[-100:]
+            elapsed = max(time.monotonic() - self.started_at, 1e-9)
+            metrics = {
+                "timesteps": int(self.num_timesteps),
+                "episodes": self.episodes_before + len(self.episode_rewards),
+                "progress": min(100.0, 100.0 * self.num_timesteps / config["total_timesteps"]),
+                "episode_rewards": recent,
+                "episode_lengths": self.episode_lengths[-100:],
+                "current_episode_reward": float(self.current_rewards.max()) if self.current_rewards is not None else 0.0,
+                "mean_reward": float(np.mean(recent)) if recent else 0.0,
+                "std_reward": float(np.std(recent)) if recent else 0.0,
+                "eval_mean_reward": None,
+                "eval_std_reward": None,
+                "logs": self.logs[-20:],
+                "steps_per_second": (self.num_timesteps - self.start_timesteps) / elapsed,
+                **(vectorization or {}),
+                **(checkpointer.metrics(elapsed) if checkpointer is not None else {}),
+            }
+            loss = self.model.logger.name_to_value.get("train/loss")
+            if loss is not None:
+                metrics["loss"] = float(loss)
+            return metrics
+
+    return ProgressCallback()
+
+
+def run_training_job(job_id: str, config: Dict[str, Any], cores: List[int], model_dir: str,
+                     artifact_dir: str, updates, stop_event, resume: Optional[List[Dict[str, Any]]] = None,
+                     render_event=None):
+    """
+    Entry point of a worker process: train one PPO job and report back.
+    `resume` is the delta chain of a checkpoint to continue from; while
+    `render_event` is set, the job sends live preview frames.
+    """
+    try:
+        _pin_to_cores(cores)
+        from artifacts import ArtifactStore, CheckpointWriter
+        store = ArtifactStore(artifact_dir)
+        resume_state = load_checkpoint(store, resume) if resume else None
+
+        if config.get("multi_agent"):
+            from multi_agent import run_multi_agent_job
+            updates.put((job_id, "status", "training"))
+            start = resume_state["env_steps"] if resume_state else 0
+            checkpointer = Checkpointer(job_id, config, CheckpointWriter(store), updates, start)
+            run_multi_agent_job(job_id, config, model_dir, updates, stop_event, checkpointer, resume_state)
+            return
+
+        from stable_baselines3 import PPO
+        from stable_baselines3.common.evaluation import evaluate_policy
+        from vec_env import is_image_space, make_env, make_vec_env, resolve_vectorization
+
+        updates.put((job_id, "status", "training"))
+        mode, n_envs, n_steps = resolve_vectorization(config, len(cores))
+        env = make_vec_env(config["env_name"], n_envs, mode, cores)
+        policy = "CnnPolicy" if is_image_space(env.observation_space) else "MlpPolicy"
+        model = PPO(policy, env, verbose=0, **{**ppo_kwargs(config), "n_steps": n_steps})
+        if resume_state is not None:
+            model.policy.load_state_dict(resume_state["policy"])
+            model.policy.optimizer.load_state_dict(resume_state["optimizer"])
+            model.num_timesteps = resume_state["num_timesteps"]
+        checkpointer = Checkpointer(job_id, config, CheckpointWriter(store), updates, model.num_timesteps)
+        preview = LivePreview(job_id, config["env_name"], updates, render_event) if render_event is not None else None
+        callback = make_progress_callback(job_id, config, updates, stop_event, vectorization={
+            "vec_env": mode,
+            "n_envs": n_envs,
+            "n_steps_per_env": n_steps,
+        }, checkpointer=checkpointer, resume_state=resume_state, preview=preview)
+        # Timesteps carry on from the checkpoint rather than restarting at zero
+        model.learn(
+            total_timesteps=config["total_timesteps"] - model.num_timesteps,
+            callback=callback,
+            reset_num_timesteps=resume_state is None,
+        )
+        env.close()
+        if preview is not None:
+            preview.close()
+
+        metrics = callback.snapshot()
+        if stop_event.is_set():
+            updates.put((job_id, "metrics", metrics))
+            updates.put((job_id, "status", "stopped"))
+            return
+
+        # Replays are recorded here, after training, so they only cost the evaluation rendering and encoding
+        from replays import REPLAY_MAX_BYTES, ReplayRecorder
+        record = REPLAY_MAX_BYTES > 0
+        eval_env = make_env(config["env_name"], render_mode="rgb_array" if record else None)
+        if record:
+            eval_env = ReplayRecorder(eval_env, store.tmp_dir)
+        mean_reward, std_reward = evaluate_policy(model, eval_env, n_eval_episodes=EVAL_EPISODES)
+        if record:
+            for info in eval_env.save(store):
+                updates.put((job_id, "artifact", info))
+        eval_env.close()
+        metrics["eval_mean_reward"] = float(mean_reward)
+        metrics["eval_std_reward"] = float(std_reward)
+
+        os.makedirs(model_dir, exist_ok=True)
+        model_path = os.path.join(model_dir, f"{job_id}.zip")
+        model.save(model_path)
+
+        updates.put((job_id, "metrics", metrics))
+        updates.put((job_id, "results", {
+            "mean_reward": float(mean_reward),
+            "std_reward": float(std_reward),
+            "total_timesteps": metrics["timesteps"],
+            "episodes": metrics["episodes"],
+            "model_path": model_path,
+        }))
+        updates.put((job_id, "status", "completed"))
+    except Exception as e:
+        updates.put((job_id, "error", f"{e}\n{traceback.format_exc(limit=5)}"))
+        updates.put((job_id, "status", "failed"))
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Optional, Dict, Any, AsyncIterator
+from urllib.parse import urlsplit
+
+import httpx
+from fastapi import HTTPException
+
+from instrumentation import UPSTREAM_REQUEST_DURATION, endpoint_template
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+UPSTREAM_PER_HOST_LIMIT = int(os.getenv("UPSTREAM_PER_HOST_LIMIT", "32"))
+UPSTREAM_GET_RETRIES = int(os.getenv("UPSTREAM_GET_RETRIES", "2"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.2"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "2.0"))
+
+# Responses worth retrying for idempotent requests
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+
+
+class UpstreamError(HTTPException):
+    """
+    The Space answered with an error status. Callers see a 502 either way;
+    `upstream_status` tells a refused request (4xx) from a failing Space.
+    """
+
+    def __init__(self, upstream_status: int, detail: str):
+        super().__init__(status_code=502, detail=detail)
+        self.upstream_status = upstream_status
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class UpstreamClient:
+    """
+    Shared async HTTP client for talking to the HuggingFace Space.
+
+    One instance is created at startup and reused by every request so
+    connections stay alive between polls. Concurrency per upstream host is
+    capped with a semaphore, and idempotent GETs are retried with jittered
+    exponential backoff.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float,
+        per_host_limit: int = UPSTREAM_PER_HOST_LIMIT,
+        get_retries: int = UPSTREAM_GET_RETRIES,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.per_host_limit = per_host_limit
+        self.get_retries = get_retries
+        self.http2 = transport is None and _http2_available()
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            http2=self.http2,
+            transport=transport,
+            limits=httpx.Limits(
+                max_connections=UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+                keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+            ),
+            headers={"Content-Type": "application/json"},
+        )
+
+    def _semaphore_for(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_limit)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        ceiling = min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    async def request(self, method: str, endpoint: str, data: Optional[Dict] = None,
+                      timeout: Optional[float] = None) -> Any:
+        """
+        Send a request upstream and return the decoded JSON body.
+
+        Transport errors are mapped to the same HTTP errors the gateway has
+        always returned (504 timeout, 503 unavailable, 502 anything else).
+        """
+        if method not in ("GET", "POST"):
+            raise ValueError(f"Unsupported HTTP method: {method}")
+
+        url = f"{self.base_url}{endpoint}"
+        attempts = 1 + (self.get_retries if method == "GET" else 0)
+        semaphore = self._semaphore_for(url)
+        latency = UPSTREAM_REQUEST_DURATION.labels
+        template = endpoint_template(endpoint)
+
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            started = time.perf_counter()
+            try:
+                async with semaphore:
+                    response = await self._client.request(
+                        method, url, json=data, timeout=timeout or self.timeout
+                    )
+                latency(method, template, str(response.status_code)).observe(time.perf_counter() - started)
+                if response.status_code in RETRYABLE_STATUS_CODES and not last_attempt:
+                    raise httpx.HTTPStatusError(
+                        f"Retryable status {response.status_code}",
+                        request=response.request,
+                        response=response,
+                    )
+                response.raise_for_status()
+                try:
+                    return response.json()
+                except ValueError:
+                    # e.g. an HTML page from a proxy in front of the Space
+                    logger.error(f"[PROXY] Non-JSON response from {endpoint}"
+                                 f" ({response.headers.get('content-type', 'no content type')})")
+                    raise UpstreamError(response.status_code, "Backend returned a non-JSON response")
+
+            except (httpx.TimeoutException, httpx.TransportError, httpx.HTTPStatusError) as e:
+                if not isinstance(e, httpx.HTTPStatusError):
+                    outcome = "timeout" if isinstance(e, httpx.TimeoutException) else "unavailable"
+                    latency(method, template, outcome).observe(time.perf_counter() - started)
+                retryable = not (
+                    isinstance(e, httpx.HTTPStatusError)
+                    and e.response.status_code not in RETRYABLE_STATUS_CODES
+                )
+                if retryable and not last_attempt:
+                    delay = self._backoff(attempt)
+                    logger.warning(f"[PROXY] {method} {endpoint} failed ({e!r}), retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    continue
+
+                if isinstance(e, httpx.TimeoutException):
+                    logger.error(f"[PROXY] Timeout connecting to {endpoint}")
+                    raise HTTPException(status_code=504, detail="Backend service timeout")
+                if isinstance(e, httpx.TransportError):
+                    logger.error(f"[PROXY] Connection error to {endpoint}")
+                    raise HTTPException(status_code=503, detail="Backend service unavailable")
+                logger.error(f"[PROXY] Request error: {e}")
+                raise UpstreamError(e.response.status_code, f"Backend error: {str(e)}")
+
+    async def download(self, endpoint: str, timeout: Optional[float] = None) -> bytes:
+        """GET a binary body (e.g. a model artifact) from the Space"""
+        url = f"{self.base_url}{endpoint}"
+        started = time.perf_counter()
+        outcome = "unavailable"
+        try:
+            async with self._semaphore_for(url):
+                response = await self._client.get(url, timeout=timeout or self.timeout)
+            outcome = str(response.status_code)
+            response.raise_for_status()
+            return response.content
+        except httpx.TimeoutException:
+            outcome = "timeout"
+            raise HTTPException(status_code=504, detail="Backend service timeout")
+        except httpx.TransportError:
+            raise HTTPException(status_code=503, detail="Backend service unavailable")
+        except httpx.HTTPStatusError as e:
+            raise UpstreamError(e.response.status_code, f"Backend error: {str(e)}")
+        finally:
+            UPSTREAM_REQUEST_DURATION.labels("GET", endpoint_template(endpoint), outcome).observe(time.perf_counter() - started)
+
+    async def stream(self, endpoint: str, chunk_size: int = 1024 * 1024,
+                     timeout: Optional[float] = None) -> AsyncIterator[bytes]:
+        """GET a binary body from the Space chunk by chunk, without buffering it"""
+        url = f"{self.base_url}{endpoint}"
+        started = time.perf_counter()
+        outcome = "unavailable"
+        try:
+            async with self._semaphore_for(url):
+                async with self._client.stream("GET", url, timeout=timeout or self.timeout) as response:
+                    outcome = str(response.status_code)
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes(chunk_size):
+                        yield chunk
+        except httpx.TimeoutException:
+            outcome = "timeout"
+            raise HTTPException(status_code=504, detail="Backend service timeout")
+        except httpx.TransportError:
+            raise HTTPException(status_code=503, detail="Backend service unavailable")
+        except httpx.HTTPStatusError as e:
+            raise UpstreamError(e.response.status_code, f"Backend error: {str(e)}")
+        finally:
+            UPSTREAM_REQUEST_DURATION.labels("GET", endpoint_template(endpoint), outcome).observe(time.perf_counter() - started)
+
+    async def aclose(self):
+        await self._client.aclose()
@@ -0,0 +1,231 @@
+"""
+Vectorized environments for local training jobs.
+
+Three ways to run `n_envs` copies of an environment:
+
+- "dummy": all copies step in the worker process, one after another. Best for
+  cheap envs like CartPole-v1, where inter-process traffic would cost more
+  than the step itself.
+- "subproc": one process per copy (SB3's SubprocVecEnv). Best for envs whose
+  step is expensive enough to amortise the pipe round trip.
+- "shm": like "subproc", but observations are written straight into a shared
+  memory buffer instead of being pickled through the pipe. Meant for image
+  observations, where the copy dominates.
+
+Only imported inside training worker processes.
+"""
+import functools
+import multiprocessing as mp
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import gymnasium as gym
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecEnv
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper
+
+# Envs cheaper than this per step run in-process; above it, in subprocesses
+SUBPROC_STEP_COST_US = float(os.getenv("VEC_ENV_SUBPROC_STEP_COST_US", "200"))
+# Copies used for cheap in-process envs, where extra copies mostly batch inference
+DUMMY_N_ENVS = int(os.getenv("VEC_ENV_DUMMY_N_ENVS", "8"))
+# Observations larger than this (in bytes) go through shared memory
+SHM_MIN_OBS_BYTES = int(os.getenv("VEC_ENV_SHM_MIN_OBS_BYTES", "16384"))
+
+
+def make_env(env_name: str, render_mode: Optional[str] = None) -> gym.Env:
+    return Monitor(gym.make(env_name, render_mode=render_mode))
+
+
+def is_image_space(space: spaces.Space) -> bool:
+    return isinstance(space, spaces.Box) and space.dtype == np.uint8 and len(space.shape) == 3
+
+
+def measure_step_cost(env_name: str, steps: int = 500, budget_seconds: float = 0.5) -> Tuple[float, int]:
+    """Average seconds per `env.step` with random actions, and observation size in bytes"""
+    env = gym.make(env_name)
+    try:
+        env.reset(seed=0)
+        env.action_space.seed(0)
+        obs_bytes = int(np.prod(env.observation_space.shape or (1,))) * env.observation_space.dtype.itemsize
+        taken = 0
+        start = time.perf_counter()
+        while taken < steps and time.perf_counter() - start < budget_seconds:
+            _, _, terminated, truncated, _ = env.step(env.action_space.sample())
+            taken += 1
+            if terminated or truncated:
+                env.reset()
+        return (time.perf_counter() - start) / max(taken, 1), obs_bytes
+    finally:
+        env.close()
+
+
+def choose_vectorization(env_name: str, cores: int) -> Tuple[str, int]:
+    """
+    Pick a vectorization mode and copy count from the env's measured step cost.
+
+    Subprocess modes only pay off with more than one core to spread over.
+    """
+    step_cost, obs_bytes = measure_step_cost(env_name)
+    if cores > 1 and obs_bytes >= SHM_MIN_OBS_BYTES:
+        return "shm", cores
+    if cores > 1 and step_cost * 1e6 >= SUBPROC_STEP_COST_US:
+        return "subproc", cores
+    return "dummy", DUMMY_N_ENVS
+
+
+def resolve_vectorization(config: Dict[str, Any], cores: int) -> Tuple[str, int, int]:
+    """
+    Fill in whichever of `vec_env`/`n_envs` the training request left out,
+    and return the mode, the copy count and PPO's `n_steps` per copy.
+
+    `n_steps` counts steps per copy. When the request didn't choose `n_envs`,
+    the copies split its `n_steps` between them, so an update collects as
+    many steps as the same request on the Space.
+    """
+    mode = config.get("vec_env") or "auto"
+    n_envs = config.get("n_envs")
+    n_steps = config["n_steps"]
+    if mode == "auto":
+        mode, default_n_envs = choose_vectorization(config["env_name"], cores)
+    else:
+        # One subprocess per core the job was given
+        default_n_envs = DUMMY_N_ENVS if mode == "dummy" else cores
+    if n_envs:
+        return mode, n_envs, n_steps
+    n_envs = max(1, min(default_n_envs, n_steps))
+    return mode, n_envs, n_steps // n_envs
+
+
+def make_vec_env(env_name: str, n_envs: int, mode: str, cores: Optional[List[int]] = None) -> VecEnv:
+    """
+    Build the vectorized env; PPO seeds each copy (seed + rank) itself.
+    Subprocess copies are pinned to `cores` in turn, one core each.
+    """
+    env_fns = [functools.partial(make_env, env_name) for _ in range(n_envs)]
+    if mode == "subproc":
+        env = SubprocVecEnv(env_fns)
+    elif mode == "shm":
+        env = SharedMemoryVecEnv(env_fns)
+    else:
+        return DummyVecEnv(env_fns)
+    if cores and hasattr(os, "sched_setaffinity"):
+        # Children start with the worker's whole affinity set and would all compete for it
+        for rank, process in enumerate(env.processes):
+            os.sched_setaffinity(process.pid, [cores[rank % len(cores)]])
+    return env
+
+
+# ===== SHARED MEMORY OBSERVATIONS =====
+
+def _shm_worker(remote, parent_remote, env_fn_wrapper: CloudpickleWrapper, buffer, index: int,
+                shape: Tuple[int, ...], dtype: str):
+    """SubprocVecEnv's worker loop, except step/reset write observations into `buffer`"""
+    from stable_baselines3.common.env_util import is_wrapped
+
+    parent_remote.close()
+    env = env_fn_wrapper.var()
+    obs_slot = np.frombuffer(buffer, dtype=dtype).reshape((-1, *shape))[index:index + 1].reshape(shape)
+    reset_info: Dict[str, Any] = {}
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                observation, reward, terminated, truncated, info = env.step(data)
+                done = terminated or truncated
+                info["TimeLimit.truncated"] = truncated and not terminated
+                if done:
+                    # Episode ends are rare enough to send the final frame by pipe
+                    info["terminal_observation"] = observation
+                    observation, reset_info = env.reset()
+                obs_slot[...] = observation
+                remote.send((reward, done, info, reset_info))
+            elif cmd == "reset":
+                maybe_options = {"options": data[1]} if data[1] else {}
+                observation, reset_info = env.reset(seed=data[0], **maybe_options)
+                obs_slot[...] = observation
+                remote.send(reset_info)
+            elif cmd == "render":
+                remote.send(env.render())
+            elif cmd == "close":
+                env.close()
+                remote.close()
+                break
+            elif cmd == "get_spaces":
+                remote.send((env.observation_space, env.action_space))
+            elif cmd == "env_method":
+                method = env.get_wrapper_attr(data[0])
+                remote.send(method(*data[1], **data[2]))
+            elif cmd == "get_attr":
+                remote.send(env.get_wrapper_attr(data))
+            elif cmd == "has_attr":
+                try:
+                    env.get_wrapper_attr(data)
+                    remote.send(True)
+                except AttributeError:
+                    remote.send(False)
+            elif cmd == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif cmd == "is_wrapped":
+                remote.send(is_wrapped(env, data))
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+        except (EOFError, KeyboardInterrupt):
+            break
+
+
+class SharedMemoryVecEnv(SubprocVecEnv):
+    """
+    SubprocVecEnv whose observations live in one shared buffer.
+
+    Each worker owns a slot of an (n_envs, *obs_shape) array and writes its
+    observation there; only rewards, dones and infos travel through the pipe.
+    Dict and Tuple observation spaces are not supported.
+    """
+
+    def __init__(self, env_fns: List, start_method: Optional[str] = None):
+        self.waiting = False
+        self.closed = False
+        n_envs = len(env_fns)
+
+        probe = env_fns[0]()
+        observation_space, action_space = probe.observation_space, probe.action_space
+        probe.close()
+        if isinstance(observation_space, (spaces.Dict, spaces.Tuple)):
+            raise ValueError(f"SharedMemoryVecEnv needs a fixed-shape observation space, got {observation_space}")
+
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+
+        shape, dtype = observation_space.shape, observation_space.dtype
+        self._buffer = ctx.RawArray("b", n_envs * int(np.prod(shape)) * dtype.itemsize)
+        self._obs = np.frombuffer(self._buffer, dtype=dtype).reshape((n_envs, *shape))
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for index, (work_remote, remote, env_fn) in enumerate(zip(self.work_remotes, self.remotes, env_fns)):
+            args = (work_remote, remote, CloudpickleWrapper(env_fn), self._buffer, index, shape, dtype.str)
+            process = ctx.Process(target=_shm_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        VecEnv.__init__(self, n_envs, observation_space, action_space)
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        rews, dones, infos, self.reset_infos = zip(*results)
+        # Copy out so the next step can't overwrite what the rollout buffer holds
+        return self._obs.copy(), np.stack(rews), np.stack(dones), infos
+
+    def reset(self):
+        for env_idx, remote in enumerate(self.remotes):
+            remote.send(("reset", (self._seeds[env_idx], self._options[env_idx])))
+        self.reset_infos = [remote.recv() for remote in self.remotes]
+        self._reset_seeds()
+        self._reset_options()
+        return self._obs.copy()
@@ -1,27 +1,539 @@
-from fastapi import WebSocket
+from __future__ import annotations
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
 import asyncio
 import base64
-import cv2
-import numpy as np
+import json
+import logging
+import math
+import os
+import struct
+import time
+import websockets
 from collections import deque
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Optional
+
+from instrumentation import FRAME_BYTES_SENT, FRAMES_SENT
+from pubsub import WORKER_ID, Broker, Subscription
+
+# OpenCV and numpy are only imported once frames have to be decoded or
+# re-encoded; passing Space JPEGs through untouched never needs them
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Encoder configuration
+RENDER_JPEG_QUALITY = int(os.getenv("RENDER_JPEG_QUALITY", "80"))
+# JPEGs relayed from the Space keep their own quality unless RENDER_JPEG_QUALITY is set
+RENDER_REENCODE = "RENDER_JPEG_QUALITY" in os.environ
+RENDER_MAX_WIDTH = int(os.getenv("RENDER_MAX_WIDTH", "0"))  # 0 keeps the native resolution
+RENDER_DELTA_FRAMES = os.getenv("RENDER_DELTA_FRAMES", "0") == "1"
+RENDER_DELTA_MAX_AREA = float(os.getenv("RENDER_DELTA_MAX_AREA", "0.5"))
+RENDER_UPSTREAM_FPS = float(os.getenv("RENDER_UPSTREAM_FPS", "30"))
+RENDER_DEFAULT_FPS = float(os.getenv("RENDER_DEFAULT_FPS", "20"))
+RENDER_MAX_FPS = float(os.getenv("RENDER_MAX_FPS", "60"))
+# How long a worker relaying a job's frames keeps the job after it stops renewing
+RENDER_LEASE_TTL = float(os.getenv("RENDER_LEASE_TTL", "6"))
+
+# Binary frame layout: kind, sequence, frame width/height, patch x/y/width/height,
+# followed by the JPEG bytes. A keyframe covers the whole frame; a delta patch
+# only covers the region that changed since the previous sequence number.
+FRAME_HEADER = struct.Struct("!BIHHHHHH")
+FRAME_KEY = 1
+FRAME_DELTA = 2
 
-# Store active connections and their rendering state
 active_renders = {}
 
+
+def encode_jpeg(image: np.ndarray, quality: int) -> bytes:
+    import cv2
+    ok, buffer = cv2.imencode(".jpg", cv2.cvtColor(image, cv2.COLOR_RGB2BGR),
+                              [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buffer.tobytes()
+
+
+def changed_region(previous: np.ndarray, frame: np.ndarray):
+    """Bounding box (x, y, w, h) of pixels that differ, or None if identical"""
+    import numpy as np
+    if previous.shape != frame.shape:
+        return 0, 0, frame.shape[1], frame.shape[0]
+    diff = np.any(previous != frame, axis=-1) if frame.ndim == 3 else previous != frame
+    rows = np.flatnonzero(diff.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(diff.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1)
+
+
+class EncodedFrame:
+    """One produced frame; each encoding is computed at most once and shared"""
+
+    def __init__(self, seq: int, quality: int, image: Optional[np.ndarray] = None,
+                 jpeg: Optional[bytes] = None, size=(0, 0), region=None):
+        self.seq = seq
+        self.quality = quality
+        self.image = image
+        self.width, self.height = size if image is None else (image.shape[1], image.shape[0])
+        self.region = region
+        self._jpeg = jpeg
+        self._keyframes = {}
+        self._delta = None
+
+    def _pack(self, kind: int, size, region, jpeg: bytes) -> bytes:
+        return FRAME_HEADER.pack(kind, self.seq, *size, *region) + jpeg
+
+    def _decoded(self) -> np.ndarray:
+        if self.image is None:
+            import cv2
+            import numpy as np
+            image = cv2.imdecode(np.frombuffer(self._jpeg, np.uint8), cv2.IMREAD_COLOR)
+            self.image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        return self.image
+
+    def keyframe(self, max_width: int = 0) -> bytes:
+        """Whole frame, scaled down to `max_width` if the viewer asked for less"""
+        width = max_width if max_width and max_width < self.width else self.width
+        cached = self._keyframes.get(width)
+        if cached is not None:
+            return cached
+
+        if width == self.width and self._jpeg is not None:
+            jpeg, size = self._jpeg, (self.width, self.height)
+        else:
+            import cv2
+            image = self._decoded()
+            if width != self.width:
+                height = max(1, int(self.height * width / self.width))
+                image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+            jpeg, size = encode_jpeg(image, self.quality), (image.shape[1], image.shape[0])
+
+        cached = self._keyframes[width] = self._pack(FRAME_KEY, size, (0, 0, *size), jpeg)
+        return cached
+
+    def delta(self) -> Optional[bytes]:
+        """Patch against the previous frame at native resolution, if one is worth sending"""
+        if self.region is None:
+            return None
+        if self._delta is None:
+            x, y, w, h = self.region
+            patch = self.image[y:y + h, x:x + w]
+            size = (self.width, self.height)
+            self._delta = self._pack(FRAME_DELTA, size, self.region, encode_jpeg(patch, self.quality))
+        return self._delta
+
+
 class RenderManager:
-    def __init__(self, job_id: str):
+    def __init__(self, job_id: str, quality: int = RENDER_JPEG_QUALITY, max_width: int = RENDER_MAX_WIDTH,
+                 delta_frames: bool = RENDER_DELTA_FRAMES, reencode: bool = RENDER_REENCODE):
         self.job_id = job_id
         self.frame_queue = deque(maxlen=1)  # Keep only latest frame
         self.is_recording = False
         self.env = None
-    
+
+        self.quality = quality
+        self.max_width = max_width
+        self.delta_frames = delta_frames
+        self.reencode = reencode
+        self.latest: Optional[EncodedFrame] = None
+        self.seq = 0
+        self.viewers = 0
+        self.frames_skipped = 0
+        self.last_jpeg: Optional[bytes] = None
+        self.relay_task: Optional[asyncio.Task] = None
+        self.streams = set()
+        self.unavailable: Optional[str] = None  # why no frames are coming, told to every viewer
+        self._frame_ready = asyncio.Event()
+
+    def _resize(self, frame: np.ndarray) -> np.ndarray:
+        if self.max_width and frame.shape[1] > self.max_width:
+            import cv2
+            height = int(frame.shape[0] * self.max_width / frame.shape[1])
+            frame = cv2.resize(frame, (self.max_width, height), interpolation=cv2.INTER_AREA)
+        return frame
+
+    def _publish(self, frame: EncodedFrame):
+        self.latest = frame
+        # Wake every viewer waiting for a frame newer than the one it has
+        self._frame_ready.set()
+        self._frame_ready = asyncio.Event()
+
+    async def wait_for_frame(self, last_seq: int):
+        while self.latest is None or self.latest.seq == last_seq:
+            await self._frame_ready.wait()
+
     def add_frame(self, frame: np.ndarray):
         """Add a frame to the queue"""
-        if frame is not None:
-            self.frame_queue.append(frame)
-    
+        if frame is None:
+            return
+        frame = self._resize(frame)
+
+        region = None
+        previous = self.frame_queue[-1] if self.frame_queue else None
+        if previous is not None:
+            region = changed_region(previous, frame)
+            if region is None:
+                # Identical to what viewers already have
+                self.frames_skipped += 1
+                return
+            x, y, w, h = region
+            if not self.delta_frames or w * h > RENDER_DELTA_MAX_AREA * frame.shape[0] * frame.shape[1]:
+                region = None
+
+        self.frame_queue.append(frame)
+        self.seq += 1
+        self._publish(EncodedFrame(self.seq, self.quality, image=frame, region=region))
+
+    def add_encoded_frame(self, jpeg: bytes):
+        """
+        Add an already JPEG-encoded frame. It is passed through untouched
+        unless it has to be resized, diffed or re-encoded at `quality`.
+        """
+        if jpeg == self.last_jpeg:
+            self.frames_skipped += 1
+            return
+        self.last_jpeg = jpeg
+
+        if self.max_width or self.reencode or self.delta_frames:
+            import cv2
+            import numpy as np
+            image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+            if image is not None:
+                self.add_frame(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+            return
+
+        width, height = jpeg_size(jpeg)
+        self.seq += 1
+        self._publish(EncodedFrame(self.seq, self.quality, jpeg=jpeg, size=(width, height)))
+
+    async def set_unavailable(self, reason: Optional[str]):
+        """Tell viewers why there are no frames, once per change of reason"""
+        if reason == self.unavailable:
+            return
+        self.unavailable = reason
+        if reason is None:
+            return
+        for stream in list(self.streams):
+            await stream.notify_unavailable(reason)
+
     def get_latest_frame(self) -> np.ndarray:
         """Get the latest frame"""
         if self.frame_queue:
             return self.frame_queue[-1]
-        return None
\ No newline at end of file
+        return None
+
+    def frame_for(self, last_seq: int, max_width: int = 0):
+        """Sequence number and bytes to send a viewer whose newest frame is `last_seq`"""
+        frame = self.latest
+        if frame is None or frame.seq == last_seq:
+            return last_seq, None
+        native = not max_width or max_width >= frame.width
+        if native and frame.seq == last_seq + 1:
+            delta = frame.delta()
+            if delta is not None:
+                return frame.seq, delta
+        return frame.seq, frame.keyframe(max_width)
+
+
+def jpeg_size(jpeg: bytes):
+    """Read width and height from a JPEG's SOF marker without decoding it"""
+    i = 2
+    while i + 9 < len(jpeg):
+        if jpeg[i] != 0xFF:
+            i += 1
+            continue
+        marker = jpeg[i + 1]
+        length = int.from_bytes(jpeg[i + 2:i + 4], "big")
+        if marker in (0xC0, 0xC1, 0xC2):
+            height = int.from_bytes(jpeg[i + 5:i + 7], "big")
+            width = int.from_bytes(jpeg[i + 7:i + 9], "big")
+            return width, height
+        i += 2 + length
+    return 0, 0
+
+
+def get_render_manager(job_id: str) -> RenderManager:
+    manager = active_renders.get(job_id)
+    if manager is None:
+        manager = active_renders[job_id] = RenderManager(job_id)
+    return manager
+
+
+# ===== UPSTREAM RELAY =====
+
+async def relay_upstream_frames(manager: RenderManager, upstream_url: str, broker: Broker,
+                                resolve_job_id: Optional[Callable[[str], str]] = None):
+    """
+    Pull frames for a job from the HuggingFace Space over a single WebSocket,
+    however many viewers there are. `resolve_job_id` maps the job_id viewers
+    use to the Space's, and is asked again on every reconnect.
+
+    Frames travel through the broker on `frames:{job_id}`, so with several
+    workers only the one holding the job's lease connects upstream and the
+    others fan its frames out to their own viewers.
+    """
+    base_url = upstream_url.replace("https://", "wss://").replace("http://", "ws://")
+    interval = 1.0 / RENDER_UPSTREAM_FPS
+    channel = f"frames:{manager.job_id}"
+    lease = f"lease:render:{manager.job_id}"
+
+    frames = await broker.subscribe(channel)
+    feed = asyncio.create_task(feed_frames(manager, frames))
+    try:
+        while manager.viewers > 0:
+            try:
+                if not await broker.claim(lease, WORKER_ID, ttl=RENDER_LEASE_TTL):
+                    # Another worker relays this job; take over if it stops renewing
+                    await asyncio.sleep(RENDER_LEASE_TTL / 3)
+                    continue
+                upstream_job_id = resolve_job_id(manager.job_id) if resolve_job_id else manager.job_id
+                ws_url = f"{base_url}/ws/render/{upstream_job_id}"
+                async with websockets.connect(ws_url, max_size=None) as upstream:
+                    logger.info(f"[RENDER] Relaying frames for job {manager.job_id}")
+                    renewed = time.monotonic()
+                    while manager.viewers > 0:
+                        await upstream.send("request_frame")
+                        message = json.loads(await upstream.recv())
+                        if message.get("type") == "frame" and message.get("data"):
+                            await broker.publish(channel, base64.b64decode(message["data"]))
+                        if time.monotonic() - renewed > RENDER_LEASE_TTL / 3:
+                            if not await broker.claim(lease, WORKER_ID, ttl=RENDER_LEASE_TTL):
+                                logger.warning(f"[RENDER] Lost the relay lease for job {manager.job_id}")
+                                break
+                            renewed = time.monotonic()
+                        await asyncio.sleep(interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[RENDER] Upstream render connection for job {manager.job_id} failed: {e}")
+                await asyncio.sleep(2.0)
+    finally:
+        feed.cancel()
+        await asyncio.gather(feed, return_exceptions=True)
+        await asyncio.shield(frames.close())
+        await asyncio.shield(broker.release(lease, WORKER_ID))
+
+
+async def relay_local_frames(manager: RenderManager, broker: Broker, request_frames: Callable[[], Awaitable[Any]]):
+    """
+    Frames of a job on the local backend. Its worker process renders a
+    preview while `request_frames` keeps being called, wherever the job runs,
+    and publishes the frames on `frames:{job_id}` like relayed ones.
+    """
+    frames = await broker.subscribe(f"frames:{manager.job_id}")
+    feed = asyncio.create_task(feed_frames(manager, frames))
+    try:
+        while manager.viewers > 0:
+            try:
+                await request_frames()
+                await manager.set_unavailable(None)
+            except HTTPException as e:
+                await manager.set_unavailable(f"No live render for job {manager.job_id}: {e.detail}")
+            except Exception as e:
+                logger.warning(f"[RENDER] Could not request frames for local job {manager.job_id}: {e}")
+            await asyncio.sleep(RENDER_LEASE_TTL / 3)
+    finally:
+        feed.cancel()
+        await asyncio.gather(feed, return_exceptions=True)
+        await asyncio.shield(frames.close())
+
+
+async def feed_frames(manager: RenderManager, frames: Subscription):
+    """Hand frames published by whichever worker relays the job to local viewers"""
+    while True:
+        manager.add_encoded_frame(await frames.get())
+
+
+def number_setting(name: str, value) -> float:
+    """A finite number sent by a viewer, as JSON numbers or numeric strings"""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"{name} must be a number, got {value!r}")
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {value!r}")
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be finite, got {value!r}")
+    return number
+
+
+class ViewerStream:
+    """
+    Push frames to one viewer at its negotiated rate.
+
+    At most one send is in flight per connection. When a new frame is due
+    while the previous send is still waiting on the socket, the new frame is
+    dropped instead of queued, so a slow client always gets the latest frame
+    rather than an ever-growing backlog.
+    """
+
+    def __init__(self, websocket: WebSocket, manager: RenderManager):
+        self.websocket = websocket
+        self.manager = manager
+        self.fps = RENDER_DEFAULT_FPS
+        self.max_width = 0
+        self.last_seq = 0
+        self.sending: Optional[asyncio.Task] = None
+
+        # Measurements
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.frames_dropped = 0
+        self.actual_fps = 0.0
+        self.bytes_per_sec = 0.0
+        self._window_start = time.monotonic()
+        self._window_frames = 0
+        self._window_bytes = 0
+
+    def configure(self, fps=None, max_width=None):
+        """Apply a viewer's settings; raises ValueError, changing nothing, if one isn't a number"""
+        if fps is not None:
+            fps = number_setting("fps", fps)
+        if max_width is not None:
+            max_width = number_setting("max_width", max_width)
+        if fps is not None:
+            self.fps = min(max(fps, 1.0), RENDER_MAX_FPS)
+        if max_width is not None:
+            self.max_width = max(int(max_width), 0)
+            # Force a keyframe at the new resolution
+            self.last_seq = 0
+
+    def _record(self, size: int):
+        FRAMES_SENT.inc()
+        FRAME_BYTES_SENT.inc(size)
+        self.frames_sent += 1
+        self.bytes_sent += size
+        self._window_frames += 1
+        self._window_bytes += size
+
+    def roll_window(self):
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed > 0:
+            self.actual_fps = self._window_frames / elapsed
+            self.bytes_per_sec = self._window_bytes / elapsed
+        self._window_start = now
+        self._window_frames = 0
+        self._window_bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "job_id": self.manager.job_id,
+            "target_fps": self.fps,
+            "max_width": self.max_width,
+            "actual_fps": round(self.actual_fps, 2),
+            "bytes_per_sec": round(self.bytes_per_sec, 1),
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "frames_dropped": self.frames_dropped,
+        }
+
+    async def _send(self, payload: bytes):
+        try:
+            await self.websocket.send_bytes(payload)
+        except Exception:
+            # The receive loop notices the disconnect and cleans up
+            return
+        self._record(len(payload))
+
+    async def run(self):
+        next_due = time.monotonic()
+        while True:
+            await self.manager.wait_for_frame(self.last_seq)
+
+            delay = next_due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_due = max(next_due + 1.0 / self.fps, time.monotonic())
+
+            if self.sending is not None and not self.sending.done():
+                self.frames_dropped += 1
+                continue
+
+            seq, payload = self.manager.frame_for(self.last_seq, self.max_width)
+            if payload is None:
+                continue
+            self.last_seq = seq
+            self.sending = asyncio.create_task(self._send(payload))
+
+    async def notify_unavailable(self, reason: str):
+        try:
+            await self.websocket.send_json({"type": "unavailable", "message": reason})
+        except Exception:
+            return
+
+    async def report(self):
+        """Send measurements to the client once a second"""
+        while True:
+            await asyncio.sleep(1.0)
+            self.roll_window()
+            try:
+                await self.websocket.send_json({"type": "stats", **self.stats()})
+            except Exception:
+                return
+
+
+async def handle_render_viewer(websocket: WebSocket, job_id: str, upstream_url: str, broker: Broker,
+                               resolve_job_id: Optional[Callable[[str], str]] = None,
+                               request_frames: Optional[Callable[[], Awaitable[Any]]] = None):
+    """
+    Serve one browser viewer. Frames are pushed as binary messages at the
+    viewer's target FPS; the client can send
+    {"type": "config", "fps": 15, "max_width": 480} at any time. Jobs on the
+    local backend pass `request_frames` and are never relayed from the Space.
+    """
+    await websocket.accept()
+    manager = get_render_manager(job_id)
+    manager.viewers += 1
+    if manager.relay_task is None or manager.relay_task.done():
+        if request_frames is not None:
+            relay = relay_local_frames(manager, broker, request_frames)
+        else:
+            relay = relay_upstream_frames(manager, upstream_url, broker, resolve_job_id)
+        manager.relay_task = asyncio.create_task(relay)
+
+    stream = ViewerStream(websocket, manager)
+    manager.streams.add(stream)
+    if manager.unavailable is not None:
+        await stream.notify_unavailable(manager.unavailable)
+    tasks = [asyncio.create_task(stream.run()), asyncio.create_task(stream.report())]
+    try:
+        while True:
+            message = await websocket.receive_text()
+            if message == "ping":
+                await websocket.send_json({"type": "pong"})
+                continue
+            try:
+                control = json.loads(message)
+            except ValueError:
+                continue
+            if isinstance(control, dict) and control.get("type") == "config":
+                try:
+                    stream.configure(fps=control.get("fps"), max_width=control.get("max_width"))
+                except ValueError as e:
+                    # Keep streaming with the previous settings
+                    await websocket.send_json({"type": "error", "message": str(e)})
+                    continue
+                await websocket.send_json({"type": "config", "fps": stream.fps, "max_width": stream.max_width})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks + ([stream.sending] if stream.sending else []):
+            task.cancel()
+        manager.streams.discard(stream)
+        manager.viewers -= 1
+        if manager.viewers == 0:
+            if manager.relay_task is not None:
+                manager.relay_task.cancel()
+            active_renders.pop(job_id, None)
+
+
+def render_viewers() -> int:
+    return sum(manager.viewers for manager in active_renders.values())
+
+
+def render_stats() -> list:
+    """Per-connection measurements for every active viewer"""
+    return [stream.stats() for manager in active_renders.values() for stream in manager.streams]
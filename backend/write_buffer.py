@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam
+from sqlalchemy.exc import IntegrityError
+
+import models
+
+logger = logging.getLogger(__name__)
+
+
+def job_update_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Columns of TrainingRun set by a status or metrics payload from the Space"""
+    fields: Dict[str, Any] = {}
+    metrics = data.get("metrics")
+
+    if "status" in data:
+        fields["status"] = data["status"]
+    if metrics is not None:
+        fields["metrics"] = metrics
+        if "episodes" in metrics:
+            fields["episodes"] = metrics["episodes"]
+        if "mean_reward" in metrics:
+            fields["reward"] = metrics["mean_reward"]
+    if "results" in data:
+        fields["results"] = data["results"]
+    return fields
+
+
+class RunUpdateBuffer:
+    """
+    Write-behind buffer for training run updates.
+
+    Updates are merged per job_id so only the latest value of each column is
+    written, then flushed together in a single transaction when the flush
+    interval elapses or `max_pending` jobs are waiting. Metric points for the
+    time series are appended in that same transaction.
+    """
+
+    def __init__(self, session_factory, series_writer=None,
+                 flush_interval: float = 1.0, max_pending: int = 200):
+        self.session_factory = session_factory
+        self.series_writer = series_writer
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._pending_metrics: Dict[str, List[Dict[str, Any]]] = {}
+        self._run_ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.updates_received = 0
+        self.updates_coalesced = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.flush_errors = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def put(self, job_id: str, data: Dict[str, Any]):
+        """Queue a payload from the Space for a job"""
+        fields = job_update_fields(data)
+        if not fields:
+            return
+
+        with self._lock:
+            self.updates_received += 1
+            existing = self._pending.get(job_id)
+            if existing is None:
+                self._pending[job_id] = fields
+            else:
+                self.updates_coalesced += 1
+                existing.update(fields)
+            if "metrics" in fields and self.series_writer is not None:
+                self._pending_metrics.setdefault(job_id, []).append(fields["metrics"])
+            full = len(self._pending) >= self.max_pending
+
+        # Flush right away when the queue is full or a job just finished
+        finished = fields.get("status") in ("completed", "failed", "stopped")
+        if (full or finished) and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _resolve_run_ids(self, db, job_ids: List[str]) -> Dict[str, int]:
+        missing = [job_id for job_id in job_ids if job_id not in self._run_ids]
+        if missing:
+            rows = db.query(models.TrainingRun.job_id, models.TrainingRun.id).filter(
+                models.TrainingRun.job_id.in_(missing)
+            ).all()
+            self._run_ids.update({job_id: run_id for job_id, run_id in rows})
+        return self._run_ids
+
+    def flush(self):
+        """Write everything queued so far in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                pending_metrics, self._pending_metrics = self._pending_metrics, {}
+            if not pending:
+                return
+
+            started = time.perf_counter()
+            table = models.TrainingRun.__table__
+            db = self.session_factory()
+            points = None
+            try:
+                # executemany needs identical parameter keys, so group by column set
+                groups: Dict[tuple, List[Dict[str, Any]]] = {}
+                for job_id, fields in pending.items():
+                    groups.setdefault(tuple(sorted(fields)), []).append({"b_job_id": job_id, **fields})
+                for columns, params in groups.items():
+                    statement = table.update().where(
+                        table.c.job_id == bindparam("b_job_id")
+                    ).values({column: bindparam(column) for column in columns})
+                    db.execute(statement, params)
+
+                if pending_metrics:
+                    run_ids = self._resolve_run_ids(db, list(pending_metrics))
+                    self.series_writer.load_last(
+                        db, [run_ids[job_id] for job_id in pending_metrics if job_id in run_ids]
+                    )
+                    for job_id, snapshots in pending_metrics.items():
+                        run_id = run_ids.get(job_id)
+                        if run_id is None:
+                            continue
+                        for metrics in snapshots:
+                            self.series_writer.append(run_id, metrics)
+                    points = self.series_writer.take()
+                    self.series_writer.write(db, points)
+
+                db.commit()
+                self.rows_written += len(pending)
+            except IntegrityError as e:
+                # Retrying rows that violate a constraint would fail every later
+                # flush too. Drop the metric points; keep the run updates unless
+                # they were all there was to write.
+                db.rollback()
+                self.flush_errors += 1
+                if pending_metrics:
+                    logger.error(f"[BUFFER] Dropped metric points of {len(pending_metrics)} jobs"
+                                 f" that violate a constraint: {e}")
+                    self._requeue(pending, None)
+                else:
+                    logger.error(f"[BUFFER] Dropped {len(pending)} run updates that violate a constraint: {e}")
+            except Exception as e:
+                db.rollback()
+                self.flush_errors += 1
+                logger.error(f"[BUFFER] Failed to flush {len(pending)} run updates: {e}")
+                self._requeue(pending, None if points is not None else pending_metrics)
+                if points:
+                    self.series_writer.requeue(points)
+            finally:
+                db.close()
+
+            elapsed = time.perf_counter() - started
+            self.flushes += 1
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            self.total_flush_seconds += elapsed
+
+    def _requeue(self, pending: Dict[str, Dict[str, Any]],
+                 pending_metrics: Optional[Dict[str, List[Dict[str, Any]]]]):
+        """Put back updates from a failed flush unless newer ones arrived"""
+        with self._lock:
+            for job_id, fields in pending.items():
+                self._pending[job_id] = {**fields, **self._pending.get(job_id, {})}
+            for job_id, snapshots in (pending_metrics or {}).items():
+                self._pending_metrics[job_id] = snapshots + self._pending_metrics.get(job_id, [])
+
+    def forget(self, job_id: str):
+        """Drop cached state for a deleted run"""
+        with self._lock:
+            self._pending.pop(job_id, None)
+            self._pending_metrics.pop(job_id, None)
+            self._run_ids.pop(job_id, None)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await asyncio.to_thread(self.flush)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the timer and flush whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "updates_received": self.updates_received,
+            "updates_coalesced": self.updates_coalesced,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": round(self.last_flush_seconds * 1000, 3),
+            "max_flush_ms": round(self.max_flush_seconds * 1000, 3),
+            "avg_flush_ms": round(self.total_flush_seconds / self.flushes * 1000, 3) if self.flushes else 0.0,
+        }
@@ -51,61 +51,42 @@ function App() {
     n_epochs: 10,
   });
 
-  const pollInterval = useRef(null);
+  const metricsSocket = useRef(null);
 
-  // ===== POLLING LOGIC for training status and metrics =====
+  // ===== STREAMING LOGIC for training status and metrics =====
+  // The backend polls the Space once per job and pushes updates to every viewer
   useEffect(() => {
     if (!jobId) {
       return;
     }
 
-    const pollMetrics = () => {
-      fetch(`http://127.0.0.1:8000/train/${jobId}/metrics`)
-        .then((res) => {
-          if (!res.ok) {
-            throw new Error(`HTTP ${res.status}: ${res.statusText}`);
-          }
-          return res.json();
-        })
-        .then((data) => {
-          console.log('Metrics received:', data);
-          setTrainingStatus(data.status);
-          setMetrics(data.metrics);
-          setElapsedTime(data.elapsed_time);
-          setTrainingProgress(data.metrics.progress);
-          setCurrentEpisode(data.metrics.episodes);
-
-          // Stop polling when training is done
-          if (data.status === 'completed' || data.status === 'failed' || data.status === 'stopped') {
-            clearInterval(pollInterval.current);
-            
-            // Fetch final results
-            if (data.status === 'completed') {
-              fetch(`http://127.0.0.1:8000/train/${jobId}/status`)
-                .then((res) => res.json())
-                .then((statusData) => {
-                  setTrainingResults(statusData.results);
-                  setIsTraining(false);
-                })
-                .catch((error) => console.error('Error fetching final status:', error));
-            } else {
-              setIsTraining(false);
-            }
-          }
-        })
-        .catch((error) => {
-          console.error('Error fetching metrics:', error);
-        });
+    const ws = new WebSocket(`ws://127.0.0.1:8000/ws/train/${jobId}/metrics`);
+    metricsSocket.current = ws;
+
+    ws.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      console.log('Metrics received:', data);
+      setTrainingStatus(data.status);
+      setMetrics(data.metrics);
+      setElapsedTime(data.elapsed_time);
+      setTrainingProgress(data.metrics.progress);
+      setCurrentEpisode(data.metrics.episodes);
+
+      // The hub sends the final status (with results) once training is done
+      if (data.status === 'completed' || data.status === 'failed' || data.status === 'stopped') {
+        if (data.status === 'completed') {
+          setTrainingResults(data.results);
+        }
+        setIsTraining(false);
+      }
     };
 
-    // Poll immediately on first load
-    pollMetrics();
-
-    // Then poll every 2 seconds
-    pollInterval.current = setInterval(pollMetrics, 2000);
+    ws.onerror = (error) => {
+      console.error('Error streaming metrics:', error);
+    };
 
     return () => {
-      clearInterval(pollInterval.current);
+      ws.close();
     };
   }, [jobId]);
 
@@ -184,7 +165,9 @@ function App() {
         .then((res) => res.json())
         .then((data) => {
           console.log(data.message);
-          clearInterval(pollInterval.current);
+          if (metricsSocket.current) {
+            metricsSocket.current.close();
+          }
           setJobId(null);
           setTrainingStatus('stopped');
           setIsTraining(false);
@@ -9,11 +9,17 @@ export default function EnvironmentRenderer({ jobId, isTraining, env }) {
   const [fps, setFps] = useState(0);
   const [lastFrameTime, setLastFrameTime] = useState(Date.now());
   const [debugInfo, setDebugInfo] = useState('');
+  const [targetFps, setTargetFps] = useState(20);
+  const [maxWidth, setMaxWidth] = useState(0);
+  const [streamStats, setStreamStats] = useState(null);
   
   // Frame buffering
   const frameBufferRef = useRef(null);
+  const frameDirtyRef = useRef(false);
+  const decodeChainRef = useRef(Promise.resolve());
   const fpsCounterRef = useRef({ count: 0, lastTime: Date.now() });
   const reconnectAttemptsRef = useRef(0);
+  const streamConfigRef = useRef({ fps: 20, max_width: 0 });
   const maxReconnectAttempts = 5;
 
   const addDebugLog = (msg) => {
@@ -24,6 +30,42 @@ export default function EnvironmentRenderer({ jobId, isTraining, env }) {
     });
   };
 
+  // Binary frame header: kind, sequence, frame width/height, patch x/y/width/height (big-endian)
+  const FRAME_HEADER_SIZE = 17;
+  const FRAME_KEY = 1;
+
+  const handleBinaryFrame = (buffer) => {
+    const view = new DataView(buffer);
+    const kind = view.getUint8(0);
+    const frameWidth = view.getUint16(5);
+    const frameHeight = view.getUint16(7);
+    const x = view.getUint16(9);
+    const y = view.getUint16(11);
+    const jpeg = new Blob([buffer.slice(FRAME_HEADER_SIZE)], { type: 'image/jpeg' });
+
+    // Decode in arrival order so delta patches land on the frame they were made against
+    decodeChainRef.current = decodeChainRef.current
+      .then(() => createImageBitmap(jpeg))
+      .then((bitmap) => {
+        // Keyframes replace the composed frame, delta patches are drawn over it
+        let frame = frameBufferRef.current;
+        if (kind === FRAME_KEY || !frame || frame.width !== frameWidth || frame.height !== frameHeight) {
+          frame = document.createElement('canvas');
+          frame.width = frameWidth;
+          frame.height = frameHeight;
+        }
+        frame.getContext('2d').drawImage(bitmap, x, y);
+        bitmap.close();
+        frameBufferRef.current = frame;
+        frameDirtyRef.current = true;
+        setLastFrameTime(Date.now());
+      })
+      .catch((error) => {
+        addDebugLog(`❌ Failed to decode frame: ${error.message}`);
+        console.error('[RENDER] Failed to decode frame:', error);
+      });
+  };
+
   const connectWebSocket = () => {
     if (!jobId) {
       addDebugLog('❌ No jobId provided!');
@@ -32,42 +74,44 @@ export default function EnvironmentRenderer({ jobId, isTraining, env }) {
     }
 
     addDebugLog(`🔌 Attempting connection (${reconnectAttemptsRef.current + 1}/${maxReconnectAttempts})`);
-    console.log(`[WS] Attempting to connect to HuggingFace Space (attempt ${reconnectAttemptsRef.current + 1}/${maxReconnectAttempts})`);
-
-    // Connect directly to HuggingFace Space backend
-    const huggingfaceSpaceUrl = 'https://bumie-e-marl-gym.hf.space';
-    
-    addDebugLog(`📍 Space URL: ${huggingfaceSpaceUrl}`);
-    console.log(`[WS] Space URL: ${huggingfaceSpaceUrl}`);
-    console.log(`[WS] Job ID: ${jobId}`);
+    console.log(`[WS] Attempting to connect to render relay (attempt ${reconnectAttemptsRef.current + 1}/${maxReconnectAttempts})`);
 
-    const wsProtocol = huggingfaceSpaceUrl.startsWith('https') ? 'wss' : 'ws';
-    const cleanUrl = huggingfaceSpaceUrl.replace(/^https?:\/\//, '');
-    const wsUrl = `${wsProtocol}://${cleanUrl}/ws/render/${jobId}`;
+    // Frames are relayed by our backend, which encodes each frame once for all viewers
+    const wsUrl = `ws://127.0.0.1:8000/ws/render/${jobId}`;
 
     addDebugLog(`🌐 WebSocket URL: ${wsUrl}`);
     console.log(`[WS] Connecting to: ${wsUrl}`);
 
     try {
       const ws = new WebSocket(wsUrl);
+      ws.binaryType = 'arraybuffer';
 
       ws.onopen = () => {
-        addDebugLog('✅ Connected to HuggingFace Space!');
-        console.log('[WS] Connected to HuggingFace Space successfully');
+        addDebugLog('✅ Connected to render relay!');
+        console.log('[WS] Connected to render relay successfully');
         setConnectionStatus('connected');
         reconnectAttemptsRef.current = 0;
+        // The server pushes frames at whatever rate and resolution we ask for
+        ws.send(JSON.stringify({ type: 'config', ...streamConfigRef.current }));
       };
 
       ws.onmessage = (event) => {
+        if (event.data instanceof ArrayBuffer) {
+          handleBinaryFrame(event.data);
+          return;
+        }
+
         try {
           const message = JSON.parse(event.data);
 
-          if (message.type === 'frame' && message.data) {
-            // addDebugLog(`📸 Frame received (${(message.data.length / 1024).toFixed(1)}KB)`);
-            // console.log(`[WS] Frame received: ${(message.data.length / 1024).toFixed(1)}KB`);
-            // Store frame in buffer - will be rendered on next animation frame
-            frameBufferRef.current = message.data;
-            setLastFrameTime(Date.now());
+          if (message.type === 'stats') {
+            setStreamStats(message);
+          } else if (message.type === 'config') {
+            addDebugLog(`⚙️ Streaming at ${message.fps} FPS, max width ${message.max_width || 'native'}`);
+          } else if (message.type === 'error') {
+            addDebugLog(`❌ Stream config rejected: ${message.message}`);
+          } else if (message.type === 'unavailable') {
+            addDebugLog(`⚠️ ${message.message}`);
           } else if (message.type === 'pong') {
             console.debug('[WS] Received pong');
           } else {
@@ -111,7 +155,8 @@ export default function EnvironmentRenderer({ jobId, isTraining, env }) {
 
   // Animation frame loop for rendering
   const renderFrame = () => {
-    if (frameBufferRef.current && canvasRef.current) {
+    if (frameDirtyRef.current && frameBufferRef.current && canvasRef.current) {
+      frameDirtyRef.current = false;
       const canvas = canvasRef.current;
       const ctx = canvas.getContext('2d', { willReadFrequently: false });
 
@@ -120,87 +165,67 @@ export default function EnvironmentRenderer({ jobId, isTraining, env }) {
         return;
       }
 
-      const img = new Image();
-      img.crossOrigin = 'anonymous';
-
-      img.onload = () => {
-        addDebugLog(`✏️ Drawing frame (${img.width}x${img.height})`);
-        
-        // Get canvas dimensions
-        const canvasWidth = canvas.width;
-        const canvasHeight = canvas.height;
-        const imgWidth = img.width;
-        const imgHeight = img.height;
-
-        // Calculate scale to fit image in canvas while maintaining aspect ratio
-        const scale = Math.min(canvasWidth / imgWidth, canvasHeight / imgHeight);
-        const scaledWidth = imgWidth * scale;
-        const scaledHeight = imgHeight * scale;
-
-        // Center the image
-        const x = (canvasWidth - scaledWidth) / 2;
-        const y = (canvasHeight - scaledHeight) / 2;
-
-        // Clear canvas with dark background
-        ctx.fillStyle = '#1a1a1a';
-        ctx.fillRect(0, 0, canvasWidth, canvasHeight);
-
-        // Draw border to confirm canvas is working
-        ctx.strokeStyle = '#333333';
-        ctx.lineWidth = 2;
-        ctx.strokeRect(0, 0, canvasWidth, canvasHeight);
-
-        // Draw image
-        try {
-          ctx.drawImage(img, x, y, scaledWidth, scaledHeight);
-        } catch (e) {
-          addDebugLog(`❌ Draw image error: ${e.message}`);
-          console.error('Draw image error:', e);
-        }
+      const img = frameBufferRef.current;
 
-        // Update FPS counter
-        fpsCounterRef.current.count++;
-        const now = Date.now();
-        if (now - fpsCounterRef.current.lastTime >= 1000) {
-          setFps(fpsCounterRef.current.count);
-          fpsCounterRef.current.count = 0;
-          fpsCounterRef.current.lastTime = now;
-        }
+      // Get canvas dimensions
+      const canvasWidth = canvas.width;
+      const canvasHeight = canvas.height;
+      const imgWidth = img.width;
+      const imgHeight = img.height;
 
-        setFrameCount((prev) => prev + 1);
-      };
+      // Calculate scale to fit image in canvas while maintaining aspect ratio
+      const scale = Math.min(canvasWidth / imgWidth, canvasHeight / imgHeight);
+      const scaledWidth = imgWidth * scale;
+      const scaledHeight = imgHeight * scale;
 
-      img.onerror = (e) => {
-        addDebugLog(`❌ Failed to load frame image: ${e}`);
-        console.error('[RENDER] Failed to load frame image:', e);
-        
-        // Draw error state
-        ctx.fillStyle = '#ff0000';
-        ctx.fillRect(0, 0, canvas.width, canvas.height);
-        ctx.fillStyle = '#ffffff';
-        ctx.font = '20px Arial';
-        ctx.textAlign = 'center';
-        ctx.fillText('Frame Error', canvas.width / 2, canvas.height / 2);
-      };
+      // Center the image
+      const x = (canvasWidth - scaledWidth) / 2;
+      const y = (canvasHeight - scaledHeight) / 2;
 
-      // Set image source
+      // Clear canvas with dark background
+      ctx.fillStyle = '#1a1a1a';
+      ctx.fillRect(0, 0, canvasWidth, canvasHeight);
+
+      // Draw border to confirm canvas is working
+      ctx.strokeStyle = '#333333';
+      ctx.lineWidth = 2;
+      ctx.strokeRect(0, 0, canvasWidth, canvasHeight);
+
+      // Draw image
       try {
-        img.src = `data:image/jpeg;base64,${frameBufferRef.current}`;
+        ctx.drawImage(img, x, y, scaledWidth, scaledHeight);
       } catch (e) {
-        addDebugLog(`❌ Error setting image src: ${e.message}`);
+        addDebugLog(`❌ Draw image error: ${e.message}`);
+        console.error('Draw image error:', e);
+      }
+
+      // Update FPS counter
+      fpsCounterRef.current.count++;
+      const now = Date.now();
+      if (now - fpsCounterRef.current.lastTime >= 1000) {
+        setFps(fpsCounterRef.current.count);
+        fpsCounterRef.current.count = 0;
+        fpsCounterRef.current.lastTime = now;
       }
+
+      setFrameCount((prev) => prev + 1);
     }
 
     // Continue animation loop
     animationFrameRef.current = requestAnimationFrame(renderFrame);
   };
 
+  // Renegotiate rate and resolution mid-stream
+  const updateStreamConfig = (config) => {
+    streamConfigRef.current = { ...streamConfigRef.current, ...config };
+    if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+      wsRef.current.send(JSON.stringify({ type: 'config', ...streamConfigRef.current }));
+    }
+  };
+
   // Main effect hook
   useEffect(() => {
     addDebugLog(`🎬 Training: ${isTraining}, JobId: ${jobId || 'NOT PROVIDED'}`);
-    
-    // Reference to store the interval ID so we can clear it later
-    let requestInterval = null;
 
     if (!isTraining || !jobId) {
       addDebugLog('⏹️ Stopping render loop');
@@ -218,26 +243,15 @@ export default function EnvironmentRenderer({ jobId, isTraining, env }) {
     // Connect to WebSocket
     connectWebSocket();
 
-    // 1. START ANIMATION LOOP (Handles drawing to canvas)
+    // Start animation loop (frames are pushed by the server, this only draws them)
     animationFrameRef.current = requestAnimationFrame(renderFrame);
 
-    // 2. START REQUEST LOOP (Handles asking backend for data)
-    // Request a new frame every 50ms (approx 20 FPS) to balance load
-    requestInterval = setInterval(() => {
-        if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
-            wsRef.current.send("request_frame");
-        }
-    }, 50);
-
     // Cleanup
     return () => {
       addDebugLog('🧹 Cleaning up');
       if (animationFrameRef.current) {
         cancelAnimationFrame(animationFrameRef.current);
       }
-      if (requestInterval) {
-        clearInterval(requestInterval);
-      }
       if (wsRef.current) {
         wsRef.current.close();
       }
@@ -257,9 +271,9 @@ export default function EnvironmentRenderer({ jobId, isTraining, env }) {
   }[connectionStatus];
 
   const statusMessage = {
-    connected: 'Streaming live frames from HuggingFace Space',
-    error: 'Connection error - check if HuggingFace Space is running',
-    disconnected: 'Connecting to HuggingFace Space...',
+    connected: 'Streaming live frames via the backend relay',
+    error: 'Connection error - check if the backend and HuggingFace Space are running',
+    disconnected: 'Connecting to render relay...',
   }[connectionStatus];
 
   return (
@@ -281,6 +295,34 @@ export default function EnvironmentRenderer({ jobId, isTraining, env }) {
               </span>
             </div>
 
+            {/* Stream settings */}
+            <select
+              value={targetFps}
+              onChange={(e) => {
+                const fps = Number(e.target.value);
+                setTargetFps(fps);
+                updateStreamConfig({ fps });
+              }}
+              className="text-xs font-bold text-gray-700 bg-gray-100 rounded-lg px-2 py-1"
+            >
+              {[5, 10, 20, 30, 60].map((value) => (
+                <option key={value} value={value}>{value} FPS</option>
+              ))}
+            </select>
+            <select
+              value={maxWidth}
+              onChange={(e) => {
+                const width = Number(e.target.value);
+                setMaxWidth(width);
+                updateStreamConfig({ max_width: width });
+              }}
+              className="text-xs font-bold text-gray-700 bg-gray-100 rounded-lg px-2 py-1"
+            >
+              <option value={0}>Native</option>
+              <option value={640}>640px</option>
+              <option value={320}>320px</option>
+            </select>
+
             {/* FPS Counter */}
             <div className="flex items-center space-x-2 px-3 py-1 bg-gray-100 rounded-lg">
               <span className="text-xs font-bold text-gray-600">FPS:</span>
@@ -333,10 +375,10 @@ export default function EnvironmentRenderer({ jobId, isTraining, env }) {
             <div className="mt-3 p-3 bg-red-50 border border-red-200 rounded text-xs text-red-700">
               <p className="font-semibold mb-1">Troubleshooting:</p>
               <ul className="list-disc list-inside space-y-1">
-                <li>Ensure HuggingFace Space is running</li>
+                <li>Ensure the backend and HuggingFace Space are running</li>
                 <li>Check browser console for detailed error messages</li>
                 <li>Verify job ID: {jobId || 'NOT PROVIDED'}</li>
-                <li>Check REACT_APP_HUGGINGFACE_SPACE_URL environment variable</li>
+                <li>Check HUGGINGFACE_SPACE_URL in the backend environment</li>
               </ul>
             </div>
           )}
@@ -351,7 +393,7 @@ export default function EnvironmentRenderer({ jobId, isTraining, env }) {
         </div>
 
         {/* Frame timing info */}
-        <div className="mt-4 grid grid-cols-3 gap-4 text-xs">
+        <div className="mt-4 grid grid-cols-5 gap-4 text-xs">
           <div className="bg-gray-50 p-3 rounded-lg border border-gray-200">
             <p className="text-gray-600 font-semibold mb-1">Connection</p>
             <p className="text-gray-800">{connectionStatus}</p>
@@ -366,6 +408,16 @@ export default function EnvironmentRenderer({ jobId, isTraining, env }) {
               {Math.round(Date.now() - lastFrameTime)}ms ago
             </p>
           </div>
+          <div className="bg-gray-50 p-3 rounded-lg border border-gray-200">
+            <p className="text-gray-600 font-semibold mb-1">Bandwidth</p>
+            <p className="text-gray-800">
+              {streamStats ? `${(streamStats.bytes_per_sec / 1024).toFixed(1)} KB/s` : 'N/A'}
+            </p>
+          </div>
+          <div className="bg-gray-50 p-3 rounded-lg border border-gray-200">
+            <p className="text-gray-600 font-semibold mb-1">Dropped Frames</p>
+            <p className="text-gray-800">{streamStats ? streamStats.frames_dropped : 'N/A'}</p>
+          </div>
         </div>
       </div>
     </div>
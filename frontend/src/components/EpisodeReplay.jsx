@@ -0,0 +1,190 @@
+import { useEffect, useMemo, useRef, useState } from 'react';
+import axios from 'axios';
+
+const API_URL = 'http://localhost:8000';
+
+// Same frame layout as the live render stream: kind, sequence, frame width/height,
+// patch x/y/width/height (big-endian), followed by the JPEG
+const FRAME_HEADER_SIZE = 17;
+const FRAME_KEY = 1;
+const CACHED_SEGMENTS = 8;
+const PREFETCH_FRAMES = 10;
+
+export default function EpisodeReplay({ replay }) {
+  const canvasRef = useRef(null);
+  const composedRef = useRef(null);
+  const shownRef = useRef(-1);
+  const segmentsRef = useRef(new Map());
+  const drawChainRef = useRef(Promise.resolve());
+  const [position, setPosition] = useState(0);
+  const [playing, setPlaying] = useState(false);
+  const [error, setError] = useState(null);
+
+  const frames = replay.frames;
+  const keyframes = useMemo(
+    () => frames.reduce((found, frame, index) => (frame[2] ? [...found, index] : found), []),
+    [frames]
+  );
+
+  // First frame of the keyframe segment holding `index`, and the first frame after it
+  const segmentBounds = (index) => {
+    let start = keyframes[0];
+    let end = frames.length;
+    for (const keyframe of keyframes) {
+      if (keyframe <= index) {
+        start = keyframe;
+      } else {
+        end = keyframe;
+        break;
+      }
+    }
+    return [start, end];
+  };
+
+  // Bytes from a keyframe up to the next one, fetched with a Range request
+  const fetchSegment = (start, end) => {
+    const segments = segmentsRef.current;
+    if (!segments.has(start)) {
+      const from = frames[start][0];
+      const to = end < frames.length ? frames[end][0] - 1 : replay.size - 1;
+      segments.set(start, axios.get(`${API_URL}${replay.url}`, {
+        headers: { Range: `bytes=${from}-${to}` },
+        responseType: 'arraybuffer',
+      }).then((response) => response.data).catch((err) => {
+        // Let a later attempt fetch it again
+        segments.delete(start);
+        throw err;
+      }));
+      if (segments.size > CACHED_SEGMENTS) {
+        segments.delete(segments.keys().next().value);
+      }
+    }
+    return segments.get(start);
+  };
+
+  const drawPatch = async (buffer) => {
+    const view = new DataView(buffer);
+    const kind = view.getUint8(0);
+    const frameWidth = view.getUint16(5);
+    const frameHeight = view.getUint16(7);
+    const x = view.getUint16(9);
+    const y = view.getUint16(11);
+    const bitmap = await createImageBitmap(new Blob([buffer.slice(FRAME_HEADER_SIZE)], { type: 'image/jpeg' }));
+
+    let composed = composedRef.current;
+    if (kind === FRAME_KEY || !composed || composed.width !== frameWidth || composed.height !== frameHeight) {
+      composed = document.createElement('canvas');
+      composed.width = frameWidth;
+      composed.height = frameHeight;
+      composedRef.current = composed;
+    }
+    composed.getContext('2d').drawImage(bitmap, x, y);
+    bitmap.close();
+  };
+
+  const showFrame = async (index) => {
+    if (index === shownRef.current) {
+      return;
+    }
+    const [start, end] = segmentBounds(index);
+    const data = await fetchSegment(start, end);
+    const base = frames[start][0];
+
+    // Play forward from the frame on screen when possible, otherwise from the keyframe
+    const from = shownRef.current >= start && shownRef.current < index ? shownRef.current + 1 : start;
+    for (let i = from; i <= index; i++) {
+      const [offset, size] = frames[i];
+      if (size > 0) {
+        await drawPatch(data.slice(offset - base, offset - base + size));
+      }
+    }
+    shownRef.current = index;
+
+    const canvas = canvasRef.current;
+    const composed = composedRef.current;
+    if (canvas && composed) {
+      canvas.width = composed.width;
+      canvas.height = composed.height;
+      canvas.getContext('2d').drawImage(composed, 0, 0);
+    }
+
+    if (end < frames.length && index >= end - PREFETCH_FRAMES) {
+      fetchSegment(end, segmentBounds(end)[1]);
+    }
+  };
+
+  useEffect(() => {
+    segmentsRef.current = new Map();
+    composedRef.current = null;
+    shownRef.current = -1;
+    setPlaying(false);
+    setPosition(0);
+  }, [replay]);
+
+  useEffect(() => {
+    // Draw in order, so a frame is never composed onto a later one
+    drawChainRef.current = drawChainRef.current
+      .then(() => showFrame(Math.min(position, frames.length - 1)))
+      .then(() => setError(null))
+      .catch((err) => {
+        console.error('[REPLAY] Failed to show frame:', err);
+        setError(err.message);
+        setPlaying(false);
+      });
+  }, [position, replay]);
+
+  useEffect(() => {
+    if (!playing) {
+      return undefined;
+    }
+    const timer = setInterval(() => {
+      setPosition((current) => {
+        if (current >= frames.length - 1) {
+          setPlaying(false);
+          return current;
+        }
+        return current + 1;
+      });
+    }, 1000 / replay.fps);
+    return () => clearInterval(timer);
+  }, [playing, replay]);
+
+  const togglePlaying = () => {
+    if (!playing && position >= frames.length - 1) {
+      setPosition(0);
+    }
+    setPlaying(!playing);
+  };
+
+  return (
+    <div className="space-y-3">
+      <div className="bg-gray-900 rounded-xl overflow-hidden flex items-center justify-center">
+        <canvas ref={canvasRef} className="max-w-full h-auto" />
+      </div>
+      <div className="flex items-center gap-3">
+        <button
+          onClick={togglePlaying}
+          className="px-4 py-1.5 rounded-lg bg-indigo-600 text-white text-sm font-semibold hover:bg-indigo-700"
+        >
+          {playing ? 'Pause' : 'Play'}
+        </button>
+        <input
+          type="range"
+          min={0}
+          max={frames.length - 1}
+          value={position}
+          onChange={(e) => setPosition(Number(e.target.value))}
+          className="flex-1"
+        />
+        <span className="text-sm text-gray-600 tabular-nums">
+          {position + 1}/{frames.length}
+        </span>
+      </div>
+      <div className="flex justify-between text-sm text-gray-600">
+        <span>Reward: <span className="font-semibold text-gray-800">{replay.reward.toFixed(1)}</span></span>
+        {replay.incomplete && <span className="text-amber-600">Cut short by the replay size limit</span>}
+        {error && <span className="text-red-600">{error}</span>}
+      </div>
+    </div>
+  );
+}
@@ -19,7 +19,8 @@ function Dashboard({ environments, onEnvClick, onNavClick, activeTab, setActiveT
   useEffect(() => {
     const fetchHistory = async () => {
       try {
-        const response = await fetch('http://127.0.0.1:8000/api/training-history/latest?limit=5');
+        // Only the table columns are requested; unchanged results come back as 304 from the browser cache
+        const response = await fetch('http://127.0.0.1:8000/api/training-history/latest?limit=5&fields=id,job_id,environment,agent,episodes,status,results,created_at');
         const data = await response.json();
         setTrainingHistory(data);
 
@@ -153,7 +154,7 @@ function Dashboard({ environments, onEnvClick, onNavClick, activeTab, setActiveT
                               </span>
                             </td>
                             <td className="px-6 py-4 whitespace-nowrap text-gray-700">
-                              {run.metrics.episodes}
+                              {run.episodes}
                             </td>
                             <td className="px-6 py-4 whitespace-nowrap text-gray-700">
                               {run.results?.mean_reward?.toFixed(2) || 'N/A'}
@@ -3,12 +3,15 @@ import { useParams } from 'react-router-dom';
 import axios from 'axios';
 import Sidebar from '../components/Sidebar';
 import TopBar from '../components/TopBar';
+import EpisodeReplay from '../components/EpisodeReplay';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 
 const ExperimentDetailsPage = ({ onNavClick }) => {
     const { id } = useParams();
     const [experiment, setExperiment] = useState(null);
     const [sidebarOpen, setSidebarOpen] = useState(false);
+    const [replays, setReplays] = useState([]);
+    const [replayLabel, setReplayLabel] = useState('best');
 
     useEffect(() => {
         const fetchExperiment = async () => {
@@ -20,9 +23,21 @@ const ExperimentDetailsPage = ({ onNavClick }) => {
             }
         };
 
+        const fetchReplays = async () => {
+            try {
+                const response = await axios.get(`http://localhost:8000/api/training-history/${id}/replays`);
+                setReplays(response.data);
+            } catch (error) {
+                console.error(`Error fetching replays for experiment ${id}:`, error);
+            }
+        };
+
         fetchExperiment();
+        fetchReplays();
     }, [id]);
 
+    const replay = replays.find((r) => r.label === replayLabel) || replays[0];
+
     if (!experiment) {
         return <div>Loading...</div>;
     }
@@ -54,6 +69,29 @@ const ExperimentDetailsPage = ({ onNavClick }) => {
                                         </LineChart>
                                     </ResponsiveContainer>
                                 </div>
+                                {replay && (
+                                    <div className="bg-white rounded-2xl shadow-lg p-6 border border-gray-100 mt-6">
+                                        <div className="flex items-center justify-between mb-4">
+                                            <h3 className="text-xl font-bold text-gray-800">Episode Replay</h3>
+                                            <div className="flex gap-2">
+                                                {replays.map((r) => (
+                                                    <button
+                                                        key={r.label}
+                                                        onClick={() => setReplayLabel(r.label)}
+                                                        className={`px-3 py-1 rounded-lg text-sm font-semibold capitalize ${
+                                                            r.label === replay.label
+                                                                ? 'bg-indigo-600 text-white'
+                                                                : 'bg-gray-100 text-gray-700 hover:bg-gray-200'
+                                                        }`}
+                                                    >
+                                                        {r.label}
+                                                    </button>
+                                                ))}
+                                            </div>
+                                        </div>
+                                        <EpisodeReplay replay={replay} />
+                                    </div>
+                                )}
                             </div>
                             <div className="space-y-6">
                                 <div className="bg-white rounded-2xl shadow-lg p-6 border border-gray-100">
@@ -15,7 +15,7 @@ export default function HistoryPage({ onBack, onSelectRun }) {
         setLoading(true);
         setError(null);
         console.log('Fetching training history...');
-        const response = await fetch('http://127.0.0.1:8000/api/training-history?limit=100');
+        const response = await fetch('http://127.0.0.1:8000/api/training-history?limit=100&fields=id,job_id,environment,episodes,status,results,created_at');
         
         if (!response.ok) {
           throw new Error(`HTTP ${response.status}: ${response.statusText}`);
@@ -35,6 +35,20 @@ export default function HistoryPage({ onBack, onSelectRun }) {
     fetchHistory();
   }, []);
 
+  // The list only carries summary fields, so load the full run when one is selected
+  const selectRun = async (run) => {
+    try {
+      const response = await fetch(`http://127.0.0.1:8000/api/training-history/${run.id}`);
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+      }
+      setSelectedRun(await response.json());
+    } catch (error) {
+      console.error('Error fetching run details:', error);
+      setError(error.message);
+    }
+  };
+
   // Update chart when a run is selected
   useEffect(() => {
     if (selectedRun?.metrics?.episode_rewards) {
@@ -115,7 +129,7 @@ export default function HistoryPage({ onBack, onSelectRun }) {
             history.map((run) => (
               <button
                 key={run.id}
-                onClick={() => setSelectedRun(run)}
+                onClick={() => selectRun(run)}
                 className={`w-full text-left p-4 rounded-lg border-2 transition ${
                   selectedRun?.id === run.id
                     ? 'border-indigo-600 bg-indigo-50'
@@ -133,7 +147,7 @@ export default function HistoryPage({ onBack, onSelectRun }) {
                   {run.job_id ? run.job_id.substring(0, 12) + '...' : `Run #${run.id}`}
                 </div>
                 <div className="text-sm text-gray-700">
-                  Episodes: <span className="font-bold">{run.metrics.episodes}</span>
+                  Episodes: <span className="font-bold">{run.episodes}</span>
                 </div>
                 <div className="text-sm text-gray-700">
                   Reward: <span className="font-bold">{run.results?.mean_reward?.toFixed(2) || 'N/A'}</span>
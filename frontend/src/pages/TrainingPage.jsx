@@ -45,6 +45,18 @@ function MetricsPanel({ metrics, episode, elapsedTime }) {
         <p className="text-2xl font-bold text-red-600">{metrics.std_reward?.toFixed(2) || 'N/A'}</p>
       </div>
 
+      {metrics.agent_rewards && (
+        <div className="bg-gradient-to-br from-indigo-100 to-blue-100 rounded-2xl p-4">
+          <p className="text-sm text-gray-600 mb-2">Reward per Agent (Last 100)</p>
+          {Object.entries(metrics.agent_rewards).map(([agent, reward]) => (
+            <div key={agent} className="flex justify-between text-sm">
+              <span className="text-gray-700">{agent}</span>
+              <span className="font-bold text-indigo-600">{reward.toFixed(2)}</span>
+            </div>
+          ))}
+        </div>
+      )}
+
       <div className="bg-gradient-to-br from-gray-100 to-slate-100 rounded-2xl p-4">
         <p className="text-sm text-gray-600 mb-1">Elapsed Time</p>
         <p className="text-2xl font-bold text-gray-700">{formatTime(elapsedTime)}</p>